@@ -0,0 +1,293 @@
+"""
+Benchmarks for the dip test machinery in modality.
+
+Run from the repository root with ::
+
+    python -m tableone_modified.bench_modality
+
+or, to time every stage of the dip test on each input family and store the
+timings as JSON, ::
+
+    python -m tableone_modified.bench_modality --suite --output bench.json
+
+Passing ``--baseline bench.json`` to a later run compares its timings with
+the stored ones and exits with status 1 if any of them regressed.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+
+import numpy as np
+
+import tableone_modified.modality as modality
+
+
+def time_call(func, repeat=5, number=1):
+    """
+    Best wall time in seconds of `number` calls to func, over `repeat` runs.
+    """
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def bench_dip_engines(ns=(100, 1000, 10000, 100000)):
+    """
+    Compare the dip-only engine with the closest unimodal construction.
+
+    Parameters
+    ----------
+        ns : tuple
+            Sample sizes to benchmark.
+
+    Returns
+    ----------
+        results : list
+            One dict per sample size with the timings in seconds.
+    """
+    results = []
+    for n in ns:
+        data = modality.generate_data(peaks=2, n=[n // 2, n - n // 2],
+                                      rng=0)
+        xF, yF = modality.cum_distr(data)
+        t_dip = time_call(lambda: modality.dip_from_cdf(xF, yF))
+        t_full = time_call(
+            lambda: modality.dip_and_closest_unimodal_from_cdf(xF, yF))
+        results.append({'n': n, 'dip_from_cdf': t_dip,
+                        'dip_and_closest_unimodal_from_cdf': t_full,
+                        'saving': 1 - t_dip / t_full})
+    return results
+
+
+def bench_kde(ns=(10**3, 10**4, 10**5, 10**6, 10**7), tol=1e-6,
+              exact_max_n=10**5, n_eval=512):
+    """
+    Compare exact and binned evaluation of KernelDensityDerivative on the
+    evaluation grid used by calibrated_dip_test.
+
+    Parameters
+    ----------
+        ns : tuple
+            Sample sizes to benchmark.
+        tol : float
+            Tolerance of the binned estimate.
+        exact_max_n : int
+            Largest sample size for which the exact estimate is timed.
+        n_eval : int
+            Number of evaluation points.
+
+    Returns
+    ----------
+        results : list
+            One dict per sample size with the timings in seconds and the
+            largest relative deviation of the binned estimate.
+    """
+    results = []
+    for n in ns:
+        data = modality.generate_data(peaks=2, n=[n // 2, n - n // 2],
+                                      rng=0)
+        x = np.linspace(np.min(data), np.max(data), n_eval)
+        binned = modality.KernelDensityDerivative(data, 0, tol=tol)
+        r = {'n': n, 'binned': time_call(lambda: binned.evaluate(x),
+                                         repeat=3)}
+        if n <= exact_max_n:
+            exact = modality.KernelDensityDerivative(data, 0)
+            r['exact'] = time_call(lambda: exact.evaluate(x), repeat=1)
+            f_exact = exact.evaluate(x)
+            r['rel_error'] = (np.max(np.abs(binned.evaluate(x) - f_exact)) /
+                              np.max(np.abs(f_exact)))
+        results.append(r)
+    return results
+
+
+def make_input(kind, n, rng=0):
+    """
+    Benchmark input of size n.
+
+    Parameters
+    ----------
+        kind : str
+            'unimodal', 'bimodal', 'tied' (one decimal, a few dozen
+            distinct values) or 'integer'.
+        n : int
+            Number of points.
+        rng : int or numpy.random.Generator
+            Seed of the input.
+
+    Returns
+    ----------
+        data : ndarray
+    """
+    if kind == 'unimodal':
+        return modality.generate_data(peaks=1, n=[n], mu=[0], rng=rng)
+    if kind == 'bimodal':
+        return modality.generate_data(peaks=2, n=[n // 2, n - n // 2],
+                                      mu=[0, 5], rng=rng)
+    if kind == 'tied':
+        return np.round(modality.generate_data(peaks=1, n=[n], mu=[0],
+                                               rng=rng), 1)
+    if kind == 'integer':
+        return np.round(modality.generate_data(
+            peaks=2, n=[n // 2, n - n // 2], mu=[0, 15], std=[3.0, 3.0],
+            rng=rng))
+    raise ValueError('Unknown input kind {}'.format(kind))
+
+
+INPUT_KINDS = ('unimodal', 'bimodal', 'tied', 'integer')
+SUITE_NS = (10**2, 10**3, 10**4, 10**5, 10**6, 10**7)
+
+
+def bench_suite(ns=SUITE_NS, kinds=INPUT_KINDS, calibrated_max_n=10**4,
+                N_bootstrap=100):
+    """
+    Time each stage of the dip test separately on every input family.
+
+    Parameters
+    ----------
+        ns : tuple
+            Sample sizes to benchmark.
+        kinds : tuple
+            Input families, see make_input.
+        calibrated_max_n : int
+            Largest sample size for which calibrated_dip_test is timed.
+            Its cost is N_bootstrap dip tests of the same size.
+        N_bootstrap : int
+            Number of reference samples of calibrated_dip_test.
+
+    Returns
+    ----------
+        results : dict
+            Maps '<function>/<kind>/<n>' to the best wall time in seconds.
+    """
+    results = {}
+    for kind in kinds:
+        for n in ns:
+            data = make_input(kind, n)
+            repeat = 5 if n <= 10**5 else 1
+            xF, yF = modality.cum_distr(data)
+            dip = modality.dip_from_cdf(xF, yF)
+            timings = {
+                'cum_distr': lambda: modality.cum_distr(data),
+                'least_concave_majorant_sorted':
+                    lambda: modality.least_concave_majorant_sorted(xF, yF),
+                'dip_from_cdf': lambda: modality.dip_from_cdf(xF, yF),
+                'dip_pval_tabinterpol':
+                    lambda: modality.dip_pval_tabinterpol(dip, n),
+                'hartigan_diptest': lambda: modality.hartigan_diptest(data),
+            }
+            if n <= calibrated_max_n:
+                timings['calibrated_dip_test'] = (
+                    lambda: modality.calibrated_dip_test(
+                        data, N_bootstrap=N_bootstrap, seed=0))
+            for name, func in timings.items():
+                key = '{}/{}/{}'.format(name, kind, n)
+                results[key] = time_call(
+                    func, repeat=1 if name == 'calibrated_dip_test'
+                    else repeat)
+    return results
+
+
+def save_results(results, path):
+    """
+    Write suite timings to path as JSON, together with the versions they
+    were measured with.
+    """
+    with open(path, 'w') as f:
+        json.dump({'python': platform.python_version(),
+                   'numpy': np.__version__,
+                   'timings': results}, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    """
+    Timings stored by save_results.
+    """
+    with open(path) as f:
+        return json.load(f)['timings']
+
+
+def compare_results(results, baseline, threshold=1.25, min_time=1e-4):
+    """
+    Compare suite timings with a stored baseline.
+
+    Parameters
+    ----------
+        results : dict
+            Timings from bench_suite.
+        baseline : dict
+            Timings from an earlier run, see load_results.
+        threshold : float
+            Ratio of new to baseline time above which a timing counts as
+            a regression.
+        min_time : float
+            Timings below this many seconds in both runs are too noisy to
+            compare and are never flagged.
+
+    Returns
+    ----------
+        rows : list
+            (key, baseline time, new time, ratio, regressed) for every key
+            present in both, sorted by decreasing ratio.
+    """
+    rows = []
+    for key in sorted(set(results) & set(baseline)):
+        old, new = baseline[key], results[key]
+        ratio = new / old if old > 0 else np.inf
+        regressed = ratio > threshold and max(old, new) >= min_time
+        rows.append((key, old, new, ratio, regressed))
+    rows.sort(key=lambda row: -row[3])
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmarks for the dip test machinery in modality.')
+    parser.add_argument('--suite', action='store_true',
+                        help='time every stage on every input family')
+    parser.add_argument('--max-n', type=int, default=max(SUITE_NS),
+                        help='largest sample size of the suite')
+    parser.add_argument('--output',
+                        help='write suite timings to this JSON file')
+    parser.add_argument('--baseline',
+                        help='compare suite timings with this JSON file')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio flagged as a regression')
+    args = parser.parse_args(argv)
+
+    if not (args.suite or args.baseline):
+        print('{:>8} {:>12} {:>12} {:>8}'.format('n', 'dip only', 'with curve',
+                                                 'saving'))
+        for r in bench_dip_engines():
+            print('{:>8} {:>12.6f} {:>12.6f} {:>7.1%}'.format(
+                r['n'], r['dip_from_cdf'],
+                r['dip_and_closest_unimodal_from_cdf'], r['saving']))
+
+        print('\n{:>8} {:>12} {:>12} {:>10}'.format('n', 'kde exact',
+                                                   'kde binned', 'rel error'))
+        for r in bench_kde():
+            print('{:>8} {:>12} {:>12.6f} {:>10}'.format(
+                r['n'], '{:.6f}'.format(r['exact']) if 'exact' in r else '-',
+                r['binned'],
+                '{:.1e}'.format(r['rel_error']) if 'rel_error' in r else '-'))
+        return 0
+
+    results = bench_suite(ns=[n for n in SUITE_NS if n <= args.max_n])
+    if args.output:
+        save_results(results, args.output)
+    if not args.baseline:
+        for key in sorted(results):
+            print('{:<50} {:>12.6f}'.format(key, results[key]))
+        return 0
+
+    rows = compare_results(results, load_results(args.baseline),
+                           args.threshold)
+    print('{:<50} {:>12} {:>12} {:>7}'.format('', 'baseline', 'new', 'ratio'))
+    for key, old, new, ratio, regressed in rows:
+        print('{:<50} {:>12.6f} {:>12.6f} {:>7.2f}{}'.format(
+            key, old, new, ratio, '  REGRESSION' if regressed else ''))
+    return 1 if any(row[4] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
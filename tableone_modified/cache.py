@@ -0,0 +1,173 @@
+"""
+On-disk cache of finished TableOne results, addressed by the content of the
+input columns and the arguments of the table.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+# part of every key, so that entries of an older layout are not read
+FORMAT_VERSION = 2
+
+
+def fingerprint(data, columns, arguments):
+    """
+    Fingerprint the columns of a DataFrame and the arguments of a table.
+
+    Parameters
+    ----------
+        data : pandas DataFrame
+            The input dataset.
+        columns : list
+            The columns the table reads.
+        arguments : object
+            The arguments of the table, fingerprinted by their repr.
+
+    Returns
+    ----------
+        key : str
+            Hexadecimal digest.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(repr((FORMAT_VERSION, arguments)).encode())
+    for c in columns:
+        column = data[c]
+        digest.update(repr((c, str(column.dtype), len(column))).encode())
+        digest.update(pd.util.hash_pandas_object(column, index=False)
+                      .values.tobytes())
+    return digest.hexdigest()
+
+
+def _labels(index):
+    """
+    Labels of an index as a one-dimensional array, tuples for a MultiIndex.
+    """
+    if index.nlevels == 1:
+        return index.to_numpy()
+    labels = np.empty(len(index), dtype=object)
+    labels[:] = list(index)
+    return labels
+
+
+def _index(labels, names):
+    """
+    Rebuild an index from _labels and its level names.
+    """
+    if len(names) > 1:
+        return pd.MultiIndex.from_tuples(list(labels), names=names)
+    return pd.Index(labels, name=names[0])
+
+
+class ResultCache(object):
+    """
+    Directory of cached TableOne results.
+
+    Each entry is a .npz file holding one array per column of each stored
+    table. When the entries exceed max_bytes in total, the least recently
+    used ones are removed. Entries may hold pickled labels, so only use a
+    directory written by this cache.
+
+    Parameters
+    ----------
+        directory : str, optional
+            Directory of the cache, created if missing. Defaults to
+            ~/.cache/tableone/results.
+        max_bytes : int, default 256 MiB
+            Total size of the entries kept.
+    """
+
+    def __init__(self, directory=None, max_bytes=256 * 2**20):
+        if directory is None:
+            directory = os.path.join(os.path.expanduser('~'), '.cache',
+                                     'tableone', 'results')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _file(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key):
+        """
+        Load the tables stored under a key.
+
+        Returns
+        ----------
+            frames : dict
+                The stored DataFrames by name, None if there is no entry.
+            meta : dict
+                The values stored with the tables.
+        """
+        file = self._file(key)
+        try:
+            with np.load(file, allow_pickle=True) as stored:
+                meta = stored['meta'].item()
+                frames = {}
+                for name in meta['frames']:
+                    columns = _index(stored[name + ':columns'],
+                                     stored[name + ':column_names'])
+                    frame = pd.DataFrame(
+                        dict((i, stored['{}:{}'.format(name, i)])
+                             for i in range(len(columns))),
+                        index=_index(stored[name + ':index'],
+                                     stored[name + ':index_names']))
+                    frame.columns = columns
+                    frames[name] = frame
+        except (IOError, KeyError, ValueError):
+            # missing, or written only in part
+            return None, None
+        # mark as recently used
+        os.utime(file)
+        return frames, meta
+
+    def store(self, key, frames, meta):
+        """
+        Store tables under a key, then evict entries over the size limit.
+
+        Parameters
+        ----------
+            frames : dict
+                DataFrames by name.
+            meta : dict
+                Other values to store with the tables.
+        """
+        arrays = {}
+        for name, frame in frames.items():
+            arrays[name + ':index'] = _labels(frame.index)
+            arrays[name + ':index_names'] = np.array(frame.index.names,
+                                                     dtype=object)
+            arrays[name + ':columns'] = _labels(frame.columns)
+            arrays[name + ':column_names'] = np.array(frame.columns.names,
+                                                      dtype=object)
+            for i in range(frame.shape[1]):
+                arrays['{}:{}'.format(name, i)] = frame.iloc[:, i].to_numpy()
+        arrays['meta'] = np.array(dict(meta, frames=list(frames)),
+                                  dtype=object)
+
+        # write to a temporary file first, so readers never see a part
+        fname = self._file(key)
+        tmp = fname + '.{}.tmp'.format(os.getpid())
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, fname)
+        self._evict()
+
+    def _evict(self):
+        """
+        Remove the least recently used entries over the size limit.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for mtime, size, name in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
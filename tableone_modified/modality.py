@@ -9,37 +9,88 @@
 #                                        #
 # ###################################### #
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import io
 import numpy as np 
 from scipy.special import beta as betafun
 # import matplotlib.pyplot as plt
 from scipy.optimize import brentq
+from scipy.signal import fftconvolve
 import os
 import pandas as pd
-np.random.seed(1337)
 # import pickle
 
-def generate_data(peaks=2, n=None, mu=None, std=None):
+def generate_data(peaks=2, n=None, mu=None, std=None, rng=None):
+    '''
+        Sample from a mixture of Gaussian peaks.
+
+        Input:
+            peaks   -   number of peaks.
+            n       -   list with the number of points per peak.
+            mu      -   list with the peak locations, drawn uniformly from
+                        the integers 0 to 29 if not given.
+            std     -   list with the peak standard deviations.
+            rng     -   numpy.random.Generator or anything accepted by
+                        numpy.random.default_rng.
+
+        Value:
+            data    -   the concatenated samples.
+    '''
+    rng = np.random.default_rng(rng)
     # Generate parameters if not provided
     if not n:
         n = [5000] * peaks
     if not mu:
-        mu = np.random.randint(0,30,peaks)
+        mu = rng.integers(0, 30, peaks)
     if not std:
         std = [1.0] * peaks
     # generate distributions then append
     dists = []
     for i in range(peaks):
-        tmp = np.random.normal(loc=mu[i], scale=std[i], size=n[i])
+        tmp = rng.normal(loc=mu[i], scale=std[i], size=n[i])
         dists.append(tmp)
     data = np.concatenate(dists)
     return data
 
+def spawn_seeds(seed, n):
+    '''
+        n independent seed sequences for parallel workers.
+
+        Input:
+            seed    -   None, an int, a numpy.random.SeedSequence or a
+                        numpy.random.Generator. Children of a
+                        SeedSequence or Generator are spawned from it, so
+                        repeated calls give new streams; an int gives the
+                        same streams on every call.
+            n       -   number of streams.
+
+        Value:
+            list of n numpy.random.SeedSequence, each to be passed to
+            numpy.random.default_rng in its worker.
+    '''
+    if isinstance(seed, np.random.Generator):
+        seed = seed.bit_generator.seed_seq
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+def spawn_rngs(seed, n):
+    '''
+        n independent numpy.random.Generator streams, see spawn_seeds.
+    '''
+    return [np.random.default_rng(s) for s in spawn_seeds(seed, n)]
+
 def hartigan_diptest(data):
     '''
         P-value according to Hartigan's dip test for unimodality.
-        The dip is computed using the function
-        dip_and_closest_unimodal_from_cdf. From this the p-value is
-        interpolated using a table imported from the R package diptest.
+        The dip is computed by dip_from_cdf, which searches the modal
+        interval on the greatest convex minorant and least concave
+        majorant of the empirical distribution, both built by a
+        linear-time monotone chain, and stops as soon as the dip is
+        known, without building the closest unimodal distribution. From
+        the dip the p-value is interpolated using a table imported from
+        the R package diptest.
 
         References:
             Hartigan and Hartigan (1985): The dip test of unimodality.
@@ -64,33 +115,334 @@ def pval_hartigan(data):
     dip = dip_from_cdf(xF, yF)
     return dip_pval_tabinterpol(dip, len(data))
 
+def hartigan_diptest_frame(df, groups=None, n_jobs=1):
+    '''
+        Hartigan's dip test for every column of a data frame, optionally
+        within every group.
+
+        NaN masking and sorting are done once per column: values are
+        sorted by (group, value) so that each cell is a contiguous sorted
+        slice. The dips are computed on a thread pool and all p-values are
+        interpolated in one call to dip_pval_tabinterpol_many.
+
+        Input:
+            df      -   pandas DataFrame of numeric columns.
+            groups  -   optional group labels, aligned with the rows of df.
+                        Rows with a missing label are ignored.
+            n_jobs  -   number of threads, -1 for all CPUs.
+
+        Value:
+            pandas DataFrame with one row per (variable, group) cell and
+            columns variable, group, n, dip and pval. Without groups the
+            group is 'Overall'. dip and pval are NaN where the test cannot
+            be computed.
+    '''
+    if groups is None:
+        codes = np.zeros(len(df), dtype=int)
+        levels = ['Overall']
+    else:
+        codes, levels = pd.factorize(np.asarray(groups), sort=True)
+    values = np.asarray(df, dtype=float)
+    valid = ~np.isnan(values) & (codes >= 0)[:, np.newaxis]
+
+    cells = []
+    for j, variable in enumerate(df.columns):
+        rows = np.nonzero(valid[:, j])[0]
+        col_codes = codes[rows]
+        col_values = values[rows, j]
+        order = np.lexsort((col_values, col_codes))
+        col_values = col_values[order]
+        bounds = np.searchsorted(col_codes[order], np.arange(len(levels)+1))
+        for g, level in enumerate(levels):
+            cells.append((variable, level, col_values[bounds[g]:bounds[g+1]]))
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    if n_jobs is None or n_jobs <= 1:
+        dips = [_dip_sorted(cell[2]) for cell in cells]
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            dips = list(executor.map(_dip_sorted, [cell[2] for cell in cells]))
+
+    dips = np.array(dips, dtype=float)
+    ns = np.array([len(cell[2]) for cell in cells], dtype=float)
+    return pd.DataFrame({'variable': [cell[0] for cell in cells],
+                         'group': [cell[1] for cell in cells],
+                         'n': ns.astype(int),
+                         'dip': dips,
+                         'pval': dip_pval_tabinterpol_many(dips, ns)},
+                        columns=['variable', 'group', 'n', 'dip', 'pval'])
+
+def _dip_sorted(data_sort):
+    try:
+        xF, yF = _cum_distr_sorted(data_sort,
+                                   np.ones(len(data_sort))*1./len(data_sort))
+        return dip_from_cdf(xF, yF)
+    except:
+        return np.nan
+
+def hartigan_diptest_chunks(chunks, k=65536, seed=None):
+    '''
+        Approximate p-value of Hartigan's dip test for data that arrive in
+        chunks, computed in one streaming pass through a QuantileSketch.
+        See dip_from_sketch for the error of the approximation.
+
+        Input:
+            chunks  -   iterable of one-dimensional arrays. NaNs are ignored.
+            k       -   capacity of each level of the sketch.
+            seed    -   seed for the compaction offsets of the sketch.
+
+        Value:
+            p-value for the test.
+    '''
+    sketch = QuantileSketch(k, seed)
+    for chunk in chunks:
+        sketch.update(chunk)
+    return hartigan_diptest_sketch(sketch)
+
+def hartigan_diptest_sketch(sketch):
+    '''
+        Approximate p-value of Hartigan's dip test from a QuantileSketch.
+    '''
+    try:
+        p = dip_pval_tabinterpol(dip_from_sketch(sketch), sketch.count)
+    except:
+        p = np.nan
+    return p
+
+def dip_from_sketch(sketch):
+    '''
+        Dip of the piecewise distribution function stored in a
+        QuantileSketch.
+
+        The dip is 1-Lipschitz in the sup-norm distance between
+        distribution functions, so the result differs from the dip of the
+        full data by at most sketch.rank_error_bound()/sketch.count. This
+        bound is guaranteed; the typical error is of order 1/k.
+    '''
+    values, weights = sketch.weighted_values()
+    xF, yF = cum_distr(values, weights)
+    return dip_from_cdf(xF, yF)
+
+class QuantileSketch(object):
+    '''
+        Mergeable quantile sketch built from a hierarchy of compactors
+        (Manku, Rajagopalan and Lindsay 1998; Karnin, Lang and Liberty
+        2016).
+
+        Level h holds up to k values of weight 2**h. A full level is sorted
+        and every other value, starting at a random offset, moves to level
+        h+1. Each such compaction changes the rank of any value by at most
+        2**h; the sum over all compactions is kept as a guaranteed bound
+        on the rank error. Sketches of separate shards can be merged, and
+        serialized with to_bytes.
+
+        Input:
+            k       -   capacity of each level.
+            seed    -   seed for the compaction offsets.
+    '''
+
+    def __init__(self, k=65536, seed=None):
+        self.k = k
+        self.count = 0
+        self.levels = [np.zeros(0)]
+        self._rank_error = 0
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).reshape(-1)
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        if other.k != self.k:
+            raise ValueError('Can only merge sketches with the same k')
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.zeros(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.count += other.count
+        self._rank_error += other._rank_error
+        self._compress()
+        return self
+
+    def rank_error_bound(self):
+        return self._rank_error
+
+    def weighted_values(self):
+        '''
+            Stored values and their weights.
+        '''
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.**h)
+                                  for h, level in enumerate(self.levels)])
+        return values, weights
+
+    def quantile(self, q):
+        '''
+            Quantile of the values seen, interpolated linearly between
+            ranks as numpy.percentile. Exact until the first compaction,
+            afterwards within rank_error_bound() ranks.
+
+            Input:
+                q   -   quantile, between 0 and 1.
+        '''
+        if self.count == 0:
+            return np.nan
+        values, weights = self.weighted_values()
+        order = np.argsort(values, kind='stable')
+        values = values[order]
+        cumw = np.cumsum(weights[order])
+        pos = q*(cumw[-1] - 1)
+        lo = np.floor(pos)
+        idx = np.searchsorted(cumw, [lo, lo + 1], side='right')
+        a, b = values[np.minimum(idx, len(values) - 1)]
+        t = pos - lo
+        # same interpolation formula as numpy
+        if t >= 0.5:
+            return b - (b - a)*(1 - t)
+        return a + (b - a)*t
+
+    def to_bytes(self):
+        buf = io.BytesIO()
+        levels = dict(('level{}'.format(h), level)
+                      for h, level in enumerate(self.levels))
+        np.savez(buf, meta=np.array([self.k, self.count, self._rank_error,
+                                     len(self.levels)], dtype=np.int64),
+                 **levels)
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data, seed=None):
+        stored = np.load(io.BytesIO(data))
+        k, count, rank_error, nbr_levels = stored['meta']
+        sketch = cls(int(k), seed)
+        sketch.count = int(count)
+        sketch._rank_error = int(rank_error)
+        sketch.levels = [stored['level{}'.format(h)]
+                         for h in range(nbr_levels)]
+        return sketch
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self.k:
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.zeros(0))
+                level = np.sort(level)
+                # an odd value out stays at this level
+                nbr_pairs = len(level) // 2
+                offset = self._rng.integers(2)
+                promoted = level[offset:2*nbr_pairs:2]
+                self.levels[h] = level[2*nbr_pairs:]
+                self.levels[h+1] = np.concatenate([self.levels[h+1], promoted])
+                self._rank_error += 2**h
+            h += 1
+
 def cum_distr(data, w=None):
     if w is None:
         w = np.ones(len(data))*1./len(data)
     eps = 1e-10
     data_ord = np.argsort(data)
-    data_sort = data[data_ord]
-    w_sort = w[data_ord]
+    return _cum_distr_sorted(data[data_ord], w[data_ord], eps)
+
+def _cum_distr_sorted(data_sort, w_sort, eps=1e-10):
+    n = len(data_sort)
     data_sort, indices = unique(data_sort, return_index=True, eps=eps, is_sorted=True)
-    if len(indices) < len(data_ord):
-        w_unique = np.zeros(len(indices))
-        for i in range(len(indices)-1):
-            w_unique[i] = np.sum(w_sort[indices[i]:indices[i+1]])
-        w_unique[-1] = np.sum(w_sort[indices[-1]:])
-        w_sort = w_unique
+    if len(indices) < n:
+        w_sort = np.add.reduceat(w_sort, indices)
     wcum = np.cumsum(w_sort)
     wcum /= wcum[-1]
 
     N = len(data_sort)
-    x = np.empty(2*N)
-    x[2*np.arange(N)] = data_sort
-    x[2*np.arange(N)+1] = data_sort
+    x = np.repeat(data_sort, 2)
     y = np.empty(2*N)
     y[0] = 0
-    y[2*np.arange(N)+1] = wcum
-    y[2*np.arange(N-1)+2] = wcum[:-1]
+    y[1::2] = wcum
+    y[2::2] = wcum[:-1]
     return x, y
 
+def cum_distr_many(data):
+    '''
+        Empirical distribution functions of several equally weighted samples
+        at once, as computed by cum_distr for each sample.
+
+        Input:
+            data    -   two-dimensional array with one sample per row.
+
+        Value:
+            x       -   x-coordinates, one ECDF per row.
+            y       -   y-coordinates, one ECDF per row.
+            lengths -   number of valid points in each row. Rows of samples
+                        with tied values are shorter and padded with NaN.
+    '''
+    eps = 1e-10
+    data_sort = np.sort(np.asarray(data, dtype=float), axis=1)
+    m, n = data_sort.shape
+    w = np.ones(n)*1./n
+
+    row_starts = np.arange(m)*n
+    isunique = _unique_mask_sorted(data_sort.reshape(-1), eps, row_starts)
+    if isunique.all():
+        wcum = np.cumsum(w)
+        wcum /= wcum[-1]
+        x = np.repeat(data_sort, 2, axis=1)
+        y = np.empty((m, 2*n))
+        y[:, 0] = 0
+        y[:, 1::2] = wcum
+        y[:, 2::2] = wcum[:-1]
+        return x, y, np.full(m, 2*n)
+
+    # samples with ties: sum the weights of tied values within each row
+    isunique = isunique.reshape(m, n)
+    N = isunique.sum(axis=1)
+    ind = np.nonzero(isunique.reshape(-1))[0]
+    w_unique = np.diff(np.hstack([ind, m*n]))*w[0]
+    rows = ind // n
+    pos = np.arange(len(ind)) - np.repeat(np.cumsum(N) - N, N)
+    wcum = np.zeros((m, N.max()))
+    wcum[rows, pos] = w_unique
+    wcum = np.cumsum(wcum, axis=1)
+    wcum /= wcum[np.arange(m), N-1][:, np.newaxis]
+
+    x = np.full((m, 2*N.max()), np.nan)
+    y = np.full((m, 2*N.max()), np.nan)
+    x[rows, 2*pos] = data_sort.reshape(-1)[ind]
+    x[rows, 2*pos+1] = data_sort.reshape(-1)[ind]
+    y[:, 0] = 0
+    y[rows, 2*pos+1] = wcum[rows, pos]
+    inner = pos < N[rows] - 1
+    y[rows[inner], 2*pos[inner]+2] = wcum[rows[inner], pos[inner]]
+    return x, y, 2*N
+
+def _unique_mask_sorted(data_sort, eps, row_starts=None):
+    '''
+        Mask of the values of data_sort kept by unique: a value is dropped
+        if it is less than eps above the last kept value.
+
+        row_starts are positions that always start a new sample.
+    '''
+    isunique = np.ones(len(data_sort), dtype='bool')
+    isunique[1:] = ~(data_sort[1:] - data_sort[:-1] < eps)
+    if row_starts is not None:
+        isunique[row_starts] = True
+
+    # within a run of near-duplicates spanning eps or more, the kept value
+    # has to be chained through the run
+    starts = np.nonzero(isunique)[0]
+    ends = np.hstack([starts[1:], len(data_sort)]) - 1
+    for r in np.nonzero(data_sort[ends] - data_sort[starts] >= eps)[0]:
+        j = starts[r]
+        for i in range(starts[r]+1, ends[r]+1):
+            if not data_sort[i] - data_sort[j] < eps:
+                isunique[i] = True
+                j = i
+    return isunique
+
 def unique(data, return_index, eps, is_sorted=True):
     if not is_sorted:
         ord = np.argsort(data)
@@ -98,13 +450,7 @@ def unique(data, return_index, eps, is_sorted=True):
         data_sort = data[ord]
     else:
         data_sort = data
-    isunique_sort = np.ones(len(data_sort), dtype='bool')
-    j = 0
-    for i in range(1, len(data_sort)):
-        if data_sort[i] - data_sort[j] < eps:
-            isunique_sort[i] = False
-        else:
-            j = i
+    isunique_sort = _unique_mask_sorted(data_sort, eps)
     if not is_sorted:
         isunique = isunique_sort[rank]
         data_unique = data[isunique]
@@ -120,597 +466,645 @@ def unique(data, return_index, eps, is_sorted=True):
         ind_unique = np.nonzero(isunique_sort)[0]
     return data_unique, ind_unique
 
-def dip_from_cdf(xF, yF, plotting=False, verbose=False, eps=1e-12):
-    dip, _ = dip_and_closest_unimodal_from_cdf(xF, yF, plotting, verbose, eps)
-    return dip
+def dip_from_cdf(xF, yF, plotting=False, verbose=False, eps=1e-12,
+                 closest_unimodal=False):
+    '''
+        Dip of the empirical distribution function (xF, yF).
+
+        By default only the dip is computed, which skips the construction
+        of the closest unimodal distribution function. If closest_unimodal
+        is True, (dip, (xU, yU)) is returned as by
+        dip_and_closest_unimodal_from_cdf.
+    '''
+    if closest_unimodal:
+        return dip_and_closest_unimodal_from_cdf(xF, yF, plotting, verbose, eps)
+    D, _, _ = _dip_modal_search(xF, yF, verbose, eps, track_hull=False)
+    return D/2
+
+# Tabulated quantiles of the dip statistic, imported from the R package
+# diptest. Keys are probabilities, inner keys are numbers of observations.
+qDiptab_dict = {'0': {4: 0.125,
+  5: 0.1,
+  6: 0.0833333333333333,
+  7: 0.0714285714285714,
+  8: 0.0625,
+  9: 0.0555555555555556,
+  10: 0.05,
+  15: 0.0341378172277919,
+  20: 0.033718563622065004,
+  30: 0.0262674485075642,
+  50: 0.0218544781364545,
+  100: 0.0164852597438403,
+  200: 0.0111236388849688,
+  500: 0.007554885975761959,
+  1000: 0.00541658127872122,
+  2000: 0.0039043999745055702,
+  5000: 0.00245657785440433,
+  10000: 0.00174954269199566,
+  20000: 0.00119458814106091,
+  40000: 0.000852415648011777,
+  72000: 0.000644400053256997},
+ '0.01': {4: 0.125,
+  5: 0.1,
+  6: 0.0833333333333333,
+  7: 0.0714285714285714,
+  8: 0.0625,
+  9: 0.0613018090298924,
+  10: 0.0610132555623269,
+  15: 0.0546284208048975,
+  20: 0.0474333740698401,
+  30: 0.0395871890405749,
+  50: 0.0314400501999916,
+  100: 0.022831985803043,
+  200: 0.0165017735429825,
+  500: 0.0106403461127515,
+  1000: 0.0076028674530018705,
+  2000: 0.0054166418179658294,
+  5000: 0.0034480928223332603,
+  10000: 0.00244595133885302,
+  20000: 0.00173435346896287,
+  40000: 0.00122883479310665,
+  72000: 0.000916872204484283},
+ '0.02': {4: 0.125,
+  5: 0.1,
+  6: 0.0833333333333333,
+  7: 0.0714285714285714,
+  8: 0.0656911994503283,
+  9: 0.0658615858179315,
+  10: 0.0651627333214016,
+  15: 0.0572191260231815,
+  20: 0.0490891387627092,
+  30: 0.0414574606741673,
+  50: 0.0329008160470834,
+  100: 0.0238917486442849,
+  200: 0.0172594157992489,
+  500: 0.0111255573208294,
+  1000: 0.00794987834644799,
+  2000: 0.0056617138625232296,
+  5000: 0.00360473943713036,
+  10000: 0.00255710802275612,
+  20000: 0.0018119443458468102,
+  40000: 0.0012846930445701802,
+  72000: 0.0009579329467655321},
+ '0.05': {4: 0.125,
+  5: 0.1,
+  6: 0.0833333333333333,
+  7: 0.0725717816250742,
+  8: 0.0738651136071762,
+  9: 0.0732651142535317,
+  10: 0.0718321619656165,
+  15: 0.0610087367689692,
+  20: 0.052719998201553,
+  30: 0.0444462614069956,
+  50: 0.0353023819040016,
+  100: 0.0256559537977579,
+  200: 0.0185259426032926,
+  500: 0.0119353655328931,
+  1000: 0.0085216518343594,
+  2000: 0.00607120971135229,
+  5000: 0.0038632654801084897,
+  10000: 0.00273990955227265,
+  20000: 0.00194259470485893,
+  40000: 0.0013761765052555301,
+  72000: 0.00102641863872347},
+ '0.1': {4: 0.125,
+  5: 0.1,
+  6: 0.0833333333333333,
+  7: 0.0817315478539489,
+  8: 0.0820045917762512,
+  9: 0.0803941629593475,
+  10: 0.077966212182459,
+  15: 0.0642657137330444,
+  20: 0.0567795509056742,
+  30: 0.0473998525042686,
+  50: 0.0377279973102482,
+  100: 0.0273987414570948,
+  200: 0.0197917612637521,
+  500: 0.0127411306411808,
+  1000: 0.00909775605533253,
+  2000: 0.0064762535755248,
+  5000: 0.00412089506752692,
+  10000: 0.0029225480567908,
+  20000: 0.00207173719623868,
+  40000: 0.0014675150200632301,
+  72000: 0.0010949515421800199},
+ '0.2': {4: 0.125,
+  5: 0.1,
+  6: 0.0924514470941933,
+  7: 0.0940590181922527,
+  8: 0.0922700601131892,
+  9: 0.0890432420913848,
+  10: 0.0852835359834564,
+  15: 0.0692234107989591,
+  20: 0.0620134674468181,
+  30: 0.0516677370374349,
+  50: 0.0410699984399582,
+  100: 0.0298109370830153,
+  200: 0.0215233745778454,
+  500: 0.0138524542751814,
+  1000: 0.00988924521014078,
+  2000: 0.00703573098590029,
+  5000: 0.00447640050137479,
+  10000: 0.00317374638422465,
+  20000: 0.00224993202086955,
+  40000: 0.00159376453672466,
+  72000: 0.00118904090369415},
+ '0.3': {4: 0.125,
+  5: 0.1,
+  6: 0.103913431059949,
+  7: 0.10324449080087102,
+  8: 0.0996737189599363,
+  9: 0.0950811420297928,
+  10: 0.0903204173707099,
+  15: 0.0745462114365167,
+  20: 0.0660163872069048,
+  30: 0.0551037519001622,
+  50: 0.0437704598622665,
+  100: 0.0317771496530253,
+  200: 0.0229259769870428,
+  500: 0.0147536004288476,
+  1000: 0.0105309297090482,
+  2000: 0.007494212545892991,
+  5000: 0.00476555693102276,
+  10000: 0.00338072258533527,
+  20000: 0.00239520831473419,
+  40000: 0.00169668445506151,
+  72000: 0.00126575197699874},
+ '0.4': {4: 0.125,
+  5: 0.10872059357632902,
+  6: 0.113885220640212,
+  7: 0.110964599995697,
+  8: 0.10573353180273701,
+  9: 0.0999380897811046,
+  10: 0.0943334983745117,
+  15: 0.0792030878981762,
+  20: 0.0696506075066401,
+  30: 0.058265005347492994,
+  50: 0.0462925642671299,
+  100: 0.0336073821590387,
+  200: 0.024243848341112,
+  500: 0.0155963185751048,
+  1000: 0.0111322726797384,
+  2000: 0.007920878896017329,
+  5000: 0.005037040297500721,
+  10000: 0.0035724387653598205,
+  20000: 0.00253036792824665,
+  40000: 0.0017925341833790601,
+  72000: 0.00133750966361506},
+ '0.5': {4: 0.125,
+  5: 0.12156379802641401,
+  6: 0.123071187137781,
+  7: 0.11780784650433501,
+  8: 0.11103512984770501,
+  9: 0.10415356007586801,
+  10: 0.0977817630384725,
+  15: 0.083621033469191,
+  20: 0.0733437740592714,
+  30: 0.0614510857304343,
+  50: 0.048851155289608,
+  100: 0.0354621760592113,
+  200: 0.025584358256487003,
+  500: 0.0164519238025286,
+  1000: 0.0117439009052552,
+  2000: 0.008355737247680059,
+  5000: 0.0053123924740821294,
+  10000: 0.00376734715752209,
+  20000: 0.00266863168718114,
+  40000: 0.00189061261635977,
+  72000: 0.00141049709228472},
+ '0.6': {4: 0.125,
+  5: 0.134318918697053,
+  6: 0.13186973390253,
+  7: 0.124216086833531,
+  8: 0.11592005574998801,
+  9: 0.10800780236193198,
+  10: 0.102180866696628,
+  15: 0.0881198482202905,
+  20: 0.0776460662880254,
+  30: 0.0649164408053978,
+  50: 0.0516145897865757,
+  100: 0.0374805844550272,
+  200: 0.0270252129816288,
+  500: 0.017383057902553,
+  1000: 0.012405033293814,
+  2000: 0.00882439333812351,
+  5000: 0.00560929919359959,
+  10000: 0.00397885007249132,
+  20000: 0.0028181999035216,
+  40000: 0.00199645471886179,
+  72000: 0.00148936709298802},
+ '0.7': {4: 0.13255954878268902,
+  5: 0.14729879897625198,
+  6: 0.140564796497941,
+  7: 0.130409013968317,
+  8: 0.120561479262465,
+  9: 0.112512617124951,
+  10: 0.10996094814295099,
+  15: 0.093124666680253,
+  20: 0.0824558407118372,
+  30: 0.0689178762425442,
+  50: 0.0548121932066019,
+  100: 0.0398046179116599,
+  200: 0.0286920262150517,
+  500: 0.0184503949887735,
+  1000: 0.0131684179320803,
+  2000: 0.009367858207170609,
+  5000: 0.00595352728377949,
+  10000: 0.00422430013176233,
+  20000: 0.00299137548142077,
+  40000: 0.00211929748381704,
+  72000: 0.00158027541945626},
+ '0.8': {4: 0.15749736904023498,
+  5: 0.161085025702604,
+  6: 0.14941924112913002,
+  7: 0.136639642123068,
+  8: 0.125558759034845,
+  9: 0.12291503348081699,
+  10: 0.11884476721158699,
+  15: 0.0996694393390689,
+  20: 0.08834462700173701,
+  30: 0.0739249074078291,
+  50: 0.0588230482851366,
+  100: 0.0427283846799166,
+  200: 0.0308006766341406,
+  500: 0.0198162679782071,
+  1000: 0.0141377942603047,
+  2000: 0.01005604603884,
+  5000: 0.00639092280563517,
+  10000: 0.00453437508148542,
+  20000: 0.00321024899920135,
+  40000: 0.0022745769870358102,
+  72000: 0.00169651643860074},
+ '0.9': {4: 0.18740187880755899,
+  5: 0.176811998476076,
+  6: 0.159137064572627,
+  7: 0.144240669035124,
+  8: 0.141841067033899,
+  9: 0.136412639387084,
+  10: 0.130462149644819,
+  15: 0.11008749690090598,
+  20: 0.0972346018122903,
+  30: 0.0814791379390127,
+  50: 0.0649136324046767,
+  100: 0.047152783315718,
+  200: 0.0339967814293504,
+  500: 0.0218781313182203,
+  1000: 0.0156148055023058,
+  2000: 0.0111019116837591,
+  5000: 0.00705566126234625,
+  10000: 0.00500178808402368,
+  20000: 0.00354362220314155,
+  40000: 0.00250999080890397,
+  72000: 0.0018730618472582602},
+ '0.95': {4: 0.20726978858735998,
+  5: 0.18639179602794398,
+  6: 0.164769608513302,
+  7: 0.159903395678336,
+  8: 0.153978303998561,
+  9: 0.14660378495401902,
+  10: 0.139611395137099,
+  15: 0.118760769203664,
+  20: 0.105130218270636,
+  30: 0.0881689143126666,
+  50: 0.0702737877191269,
+  100: 0.0511279442868827,
+  200: 0.0368418413878307,
+  500: 0.0237294742633411,
+  1000: 0.0169343970067564,
+  2000: 0.0120380990328341,
+  5000: 0.0076506368153935,
+  10000: 0.00542372242836395,
+  20000: 0.00384330190244679,
+  40000: 0.00272375073486223,
+  72000: 0.00203178401610555},
+ '0.98': {4: 0.22375580462922195,
+  5: 0.19361253363045,
+  6: 0.17917654739278197,
+  7: 0.17519655327122302,
+  8: 0.16597856724751,
+  9: 0.157084065653166,
+  10: 0.150961728882481,
+  15: 0.128890475210055,
+  20: 0.11430970428125302,
+  30: 0.0960564383013644,
+  50: 0.0767095886079179,
+  100: 0.0558022052195208,
+  200: 0.0402729850316397,
+  500: 0.025919578977657003,
+  1000: 0.018513067368104,
+  2000: 0.0131721010552576,
+  5000: 0.00836821687047215,
+  10000: 0.00592656681022859,
+  20000: 0.00420258799378253,
+  40000: 0.00298072958568387,
+  72000: 0.00222356097506054},
+ '0.99': {4: 0.231796258864192,
+  5: 0.19650913979884502,
+  6: 0.191862827995563,
+  7: 0.184118659121501,
+  8: 0.172988528276759,
+  9: 0.164164643657217,
+  10: 0.159684158858235,
+  15: 0.13598356863636,
+  20: 0.120624043335821,
+  30: 0.101478558893837,
+  50: 0.0811998415355918,
+  100: 0.059024132304226,
+  200: 0.0426864799777448,
+  500: 0.0274518022761997,
+  1000: 0.0196080260483234,
+  2000: 0.0139655122281969,
+  5000: 0.00886357892854914,
+  10000: 0.00628034732880374,
+  20000: 0.00445774902155711,
+  40000: 0.00315942194040388,
+  72000: 0.00235782814777627},
+ '0.995': {4: 0.23726374382677898,
+  5: 0.198159967287576,
+  6: 0.20210197104296804,
+  7: 0.19101439617430602,
+  8: 0.179010413496374,
+  9: 0.172821674582338,
+  10: 0.16719524735674,
+  15: 0.14245248368127697,
+  20: 0.126552378036739,
+  30: 0.10650487144103,
+  50: 0.0852854646662134,
+  100: 0.0620425065165146,
+  200: 0.044958959158761,
+  500: 0.0288986369564301,
+  1000: 0.0206489568587364,
+  2000: 0.0146889122204488,
+  5000: 0.00934162787186159,
+  10000: 0.00661030641550873,
+  20000: 0.00469461513212743,
+  40000: 0.0033273652798148,
+  72000: 0.00248343580127067},
+ '0.998': {4: 0.241992892688593,
+  5: 0.19924427936243302,
+  6: 0.213015781111186,
+  7: 0.198216795232182,
+  8: 0.186504388711178,
+  9: 0.182555283567818,
+  10: 0.175419540856082,
+  15: 0.15017281653074202,
+  20: 0.13360135382395,
+  30: 0.112724636524262,
+  50: 0.0904847827490294,
+  100: 0.0658016011466099,
+  200: 0.0477643873749449,
+  500: 0.0306813505050163,
+  1000: 0.0219285176765082,
+  2000: 0.0156076779647454,
+  5000: 0.009932186363240291,
+  10000: 0.00702254699967648,
+  20000: 0.004994160691291679,
+  40000: 0.00353988965698579,
+  72000: 0.00264210826339498},
+ '0.999': {4: 0.244369839049632,
+  5: 0.199617527406166,
+  6: 0.219518627282415,
+  7: 0.20234101074826102,
+  8: 0.19448404115794,
+  9: 0.188658833121906,
+  10: 0.180611195797351,
+  15: 0.15545613369632802,
+  20: 0.138569903791767,
+  30: 0.117164140184417,
+  50: 0.0940930106666244,
+  100: 0.0684479731118028,
+  200: 0.0497198001867437,
+  500: 0.0320170996823189,
+  1000: 0.0228689168972669,
+  2000: 0.0162685615996248,
+  5000: 0.0103498795291629,
+  10000: 0.0073182262815645795,
+  20000: 0.00520917757743218,
+  40000: 0.00369400045486625,
+  72000: 0.0027524322157581},
+ '0.9995': {4: 0.245966625504691,
+  5: 0.19980094149902802,
+  6: 0.22433904739444602,
+  7: 0.205377566346832,
+  8: 0.200864297005026,
+  9: 0.19408912076824603,
+  10: 0.18528641605039603,
+  15: 0.160896499106958,
+  20: 0.14336916123968,
+  30: 0.12142585990898701,
+  50: 0.0974904344916743,
+  100: 0.0709169443994193,
+  200: 0.0516114611801451,
+  500: 0.0332452747332959,
+  1000: 0.023738710122235003,
+  2000: 0.0168874937789415,
+  5000: 0.0107780907076862,
+  10000: 0.0076065423418208,
+  20000: 0.005403962359243721,
+  40000: 0.00383345715372182,
+  72000: 0.0028608570740143},
+ '0.9998': {4: 0.24743959723326198,
+  5: 0.19991708183427104,
+  6: 0.22944933215424101,
+  7: 0.208306562526874,
+  8: 0.20884999705022897,
+  9: 0.19915700809389003,
+  10: 0.19120308390504398,
+  15: 0.16697940794624802,
+  20: 0.148940116394883,
+  30: 0.126733051889401,
+  50: 0.10228420428399698,
+  100: 0.0741183486081263,
+  200: 0.0540543978864652,
+  500: 0.0348335698576168,
+  1000: 0.0248334158891432,
+  2000: 0.0176505093388153,
+  5000: 0.0113184316868283,
+  10000: 0.00795640367207482,
+  20000: 0.00564540201704594,
+  40000: 0.0040079346963469605,
+  72000: 0.00298695044508003},
+ '0.9999': {4: 0.24823065965663801,
+  5: 0.19995902909307503,
+  6: 0.232714530449602,
+  7: 0.209866047852379,
+  8: 0.212556040406219,
+  9: 0.20288159843655804,
+  10: 0.19580515933918397,
+  15: 0.17111793515551002,
+  20: 0.152832538183622,
+  30: 0.131198578897542,
+  50: 0.104680624334611,
+  100: 0.0762579402903838,
+  200: 0.0558704526182638,
+  500: 0.0359832389317461,
+  1000: 0.0256126573433596,
+  2000: 0.0181944265400504,
+  5000: 0.0117329446468571,
+  10000: 0.0082270524584354,
+  20000: 0.00580460792299214,
+  40000: 0.00414892737222885,
+  72000: 0.00309340092038059},
+ '0.99995': {4: 0.248754269146416,
+  5: 0.19997839537608197,
+  6: 0.236548128358969,
+  7: 0.21096757693345103,
+  8: 0.21714917413729898,
+  9: 0.205979795735129,
+  10: 0.20029398089673,
+  15: 0.17590050570443203,
+  20: 0.15601016361897102,
+  30: 0.133691739483444,
+  50: 0.107496694235039,
+  100: 0.0785735967934979,
+  200: 0.0573877056330228,
+  500: 0.0369051995840645,
+  1000: 0.0265491336936829,
+  2000: 0.0186226037818523,
+  5000: 0.0119995948968375,
+  10000: 0.00852240989786251,
+  20000: 0.00599774739593151,
+  40000: 0.0042839159079761,
+  72000: 0.00319932767198801},
+ '0.99998': {4: 0.24930203997425898,
+  5: 0.199993151405815,
+  6: 0.2390887911995,
+  7: 0.212233348558702,
+  8: 0.22170007640450304,
+  9: 0.21054115498898,
+  10: 0.20565108964621898,
+  15: 0.18185667601316602,
+  20: 0.16131922583934502,
+  30: 0.137831637950694,
+  50: 0.11140887547015,
+  100: 0.0813458356889133,
+  200: 0.0593365901653878,
+  500: 0.0387221159256424,
+  1000: 0.027578430100535997,
+  2000: 0.0193001796565433,
+  5000: 0.0124410052027886,
+  10000: 0.00892863905540303,
+  20000: 0.00633099254378114,
+  40000: 0.0044187010443287895,
+  72000: 0.00332688234611187},
+ '0.99999': {4: 0.24945965232322498,
+  5: 0.199995525025673,
+  6: 0.24010356643629502,
+  7: 0.21266103831250602,
+  8: 0.225000835357532,
+  9: 0.21180033095039003,
+  10: 0.209682048785853,
+  15: 0.185743454151004,
+  20: 0.165568255916749,
+  30: 0.14155750962435099,
+  50: 0.113536607717411,
+  100: 0.0832963013755522,
+  200: 0.0607646310473911,
+  500: 0.039930259057650005,
+  1000: 0.0284430733108,
+  2000: 0.0196241518040617,
+  5000: 0.0129467396733128,
+  10000: 0.009138539330002129,
+  20000: 0.00656987109386762,
+  40000: 0.00450818604569179,
+  72000: 0.00339316094477355},
+ '1': {4: 0.24974836247845,
+  5: 0.199999835639211,
+  6: 0.24467288361776798,
+  7: 0.21353618608817,
+  8: 0.23377291968768302,
+  9: 0.21537991431762502,
+  10: 0.221530282182963,
+  15: 0.19224056333056197,
+  20: 0.175834459522789,
+  30: 0.163833046059817,
+  50: 0.11788671686531199,
+  100: 0.0926780423096737,
+  200: 0.0705309107882395,
+  500: 0.0431448163617178,
+  1000: 0.0313640941982108,
+  2000: 0.0213081254074584,
+  5000: 0.014396063834027,
+  10000: 0.00952234579566773,
+  20000: 0.006858294480462271,
+  40000: 0.00513477467565583,
+  72000: 0.00376331697005859}}
+
+_diptab = None
+
+def _dip_pval_table():
+    '''
+        Precompiled, read-only version of qDiptab_dict. Built on first use
+        and shared by all later calls.
+
+        Value:
+            Ns          -   tabulated numbers of observations.
+            ps          -   tabulated probabilities.
+            dip_sqrtN   -   sqrt(N)-scaled dip quantiles, one row per N.
+    '''
+    global _diptab
+    if _diptab is None:
+        ps_keys = sorted(qDiptab_dict, key=float)
+        Ns = np.array(sorted(qDiptab_dict[ps_keys[0]]), dtype=float)
+        ps = np.array([float(p) for p in ps_keys])
+        diptable = np.array([[qDiptab_dict[p][int(N)] for p in ps_keys]
+                             for N in Ns])
+        dip_sqrtN = np.ascontiguousarray(np.sqrt(Ns)[:, np.newaxis]*diptable)
+        for arr in (Ns, ps, dip_sqrtN):
+            arr.flags.writeable = False
+        _diptab = (Ns, ps, dip_sqrtN)
+    return _diptab
 
 def dip_pval_tabinterpol(dip, N):
     '''
         dip     -   dip value computed from dip_from_cdf
         N       -   number of observations
     '''
+    return dip_pval_tabinterpol_many([dip], [N])[0]
 
-    # if qDiptab_df is None:
-    #     raise DataError("Tabulated p-values not available. See installation instructions.")
-
-    if np.isnan(N) or N < 10:
-        return np.nan
+def dip_pval_tabinterpol_many(dips, Ns):
+    '''
+        Vectorized version of dip_pval_tabinterpol.
 
-    qDiptab_dict = {'0': {4: 0.125,
-      5: 0.1,
-      6: 0.0833333333333333,
-      7: 0.0714285714285714,
-      8: 0.0625,
-      9: 0.0555555555555556,
-      10: 0.05,
-      15: 0.0341378172277919,
-      20: 0.033718563622065004,
-      30: 0.0262674485075642,
-      50: 0.0218544781364545,
-      100: 0.0164852597438403,
-      200: 0.0111236388849688,
-      500: 0.007554885975761959,
-      1000: 0.00541658127872122,
-      2000: 0.0039043999745055702,
-      5000: 0.00245657785440433,
-      10000: 0.00174954269199566,
-      20000: 0.00119458814106091,
-      40000: 0.000852415648011777,
-      72000: 0.000644400053256997},
-     '0.01': {4: 0.125,
-      5: 0.1,
-      6: 0.0833333333333333,
-      7: 0.0714285714285714,
-      8: 0.0625,
-      9: 0.0613018090298924,
-      10: 0.0610132555623269,
-      15: 0.0546284208048975,
-      20: 0.0474333740698401,
-      30: 0.0395871890405749,
-      50: 0.0314400501999916,
-      100: 0.022831985803043,
-      200: 0.0165017735429825,
-      500: 0.0106403461127515,
-      1000: 0.0076028674530018705,
-      2000: 0.0054166418179658294,
-      5000: 0.0034480928223332603,
-      10000: 0.00244595133885302,
-      20000: 0.00173435346896287,
-      40000: 0.00122883479310665,
-      72000: 0.000916872204484283},
-     '0.02': {4: 0.125,
-      5: 0.1,
-      6: 0.0833333333333333,
-      7: 0.0714285714285714,
-      8: 0.0656911994503283,
-      9: 0.0658615858179315,
-      10: 0.0651627333214016,
-      15: 0.0572191260231815,
-      20: 0.0490891387627092,
-      30: 0.0414574606741673,
-      50: 0.0329008160470834,
-      100: 0.0238917486442849,
-      200: 0.0172594157992489,
-      500: 0.0111255573208294,
-      1000: 0.00794987834644799,
-      2000: 0.0056617138625232296,
-      5000: 0.00360473943713036,
-      10000: 0.00255710802275612,
-      20000: 0.0018119443458468102,
-      40000: 0.0012846930445701802,
-      72000: 0.0009579329467655321},
-     '0.05': {4: 0.125,
-      5: 0.1,
-      6: 0.0833333333333333,
-      7: 0.0725717816250742,
-      8: 0.0738651136071762,
-      9: 0.0732651142535317,
-      10: 0.0718321619656165,
-      15: 0.0610087367689692,
-      20: 0.052719998201553,
-      30: 0.0444462614069956,
-      50: 0.0353023819040016,
-      100: 0.0256559537977579,
-      200: 0.0185259426032926,
-      500: 0.0119353655328931,
-      1000: 0.0085216518343594,
-      2000: 0.00607120971135229,
-      5000: 0.0038632654801084897,
-      10000: 0.00273990955227265,
-      20000: 0.00194259470485893,
-      40000: 0.0013761765052555301,
-      72000: 0.00102641863872347},
-     '0.1': {4: 0.125,
-      5: 0.1,
-      6: 0.0833333333333333,
-      7: 0.0817315478539489,
-      8: 0.0820045917762512,
-      9: 0.0803941629593475,
-      10: 0.077966212182459,
-      15: 0.0642657137330444,
-      20: 0.0567795509056742,
-      30: 0.0473998525042686,
-      50: 0.0377279973102482,
-      100: 0.0273987414570948,
-      200: 0.0197917612637521,
-      500: 0.0127411306411808,
-      1000: 0.00909775605533253,
-      2000: 0.0064762535755248,
-      5000: 0.00412089506752692,
-      10000: 0.0029225480567908,
-      20000: 0.00207173719623868,
-      40000: 0.0014675150200632301,
-      72000: 0.0010949515421800199},
-     '0.2': {4: 0.125,
-      5: 0.1,
-      6: 0.0924514470941933,
-      7: 0.0940590181922527,
-      8: 0.0922700601131892,
-      9: 0.0890432420913848,
-      10: 0.0852835359834564,
-      15: 0.0692234107989591,
-      20: 0.0620134674468181,
-      30: 0.0516677370374349,
-      50: 0.0410699984399582,
-      100: 0.0298109370830153,
-      200: 0.0215233745778454,
-      500: 0.0138524542751814,
-      1000: 0.00988924521014078,
-      2000: 0.00703573098590029,
-      5000: 0.00447640050137479,
-      10000: 0.00317374638422465,
-      20000: 0.00224993202086955,
-      40000: 0.00159376453672466,
-      72000: 0.00118904090369415},
-     '0.3': {4: 0.125,
-      5: 0.1,
-      6: 0.103913431059949,
-      7: 0.10324449080087102,
-      8: 0.0996737189599363,
-      9: 0.0950811420297928,
-      10: 0.0903204173707099,
-      15: 0.0745462114365167,
-      20: 0.0660163872069048,
-      30: 0.0551037519001622,
-      50: 0.0437704598622665,
-      100: 0.0317771496530253,
-      200: 0.0229259769870428,
-      500: 0.0147536004288476,
-      1000: 0.0105309297090482,
-      2000: 0.007494212545892991,
-      5000: 0.00476555693102276,
-      10000: 0.00338072258533527,
-      20000: 0.00239520831473419,
-      40000: 0.00169668445506151,
-      72000: 0.00126575197699874},
-     '0.4': {4: 0.125,
-      5: 0.10872059357632902,
-      6: 0.113885220640212,
-      7: 0.110964599995697,
-      8: 0.10573353180273701,
-      9: 0.0999380897811046,
-      10: 0.0943334983745117,
-      15: 0.0792030878981762,
-      20: 0.0696506075066401,
-      30: 0.058265005347492994,
-      50: 0.0462925642671299,
-      100: 0.0336073821590387,
-      200: 0.024243848341112,
-      500: 0.0155963185751048,
-      1000: 0.0111322726797384,
-      2000: 0.007920878896017329,
-      5000: 0.005037040297500721,
-      10000: 0.0035724387653598205,
-      20000: 0.00253036792824665,
-      40000: 0.0017925341833790601,
-      72000: 0.00133750966361506},
-     '0.5': {4: 0.125,
-      5: 0.12156379802641401,
-      6: 0.123071187137781,
-      7: 0.11780784650433501,
-      8: 0.11103512984770501,
-      9: 0.10415356007586801,
-      10: 0.0977817630384725,
-      15: 0.083621033469191,
-      20: 0.0733437740592714,
-      30: 0.0614510857304343,
-      50: 0.048851155289608,
-      100: 0.0354621760592113,
-      200: 0.025584358256487003,
-      500: 0.0164519238025286,
-      1000: 0.0117439009052552,
-      2000: 0.008355737247680059,
-      5000: 0.0053123924740821294,
-      10000: 0.00376734715752209,
-      20000: 0.00266863168718114,
-      40000: 0.00189061261635977,
-      72000: 0.00141049709228472},
-     '0.6': {4: 0.125,
-      5: 0.134318918697053,
-      6: 0.13186973390253,
-      7: 0.124216086833531,
-      8: 0.11592005574998801,
-      9: 0.10800780236193198,
-      10: 0.102180866696628,
-      15: 0.0881198482202905,
-      20: 0.0776460662880254,
-      30: 0.0649164408053978,
-      50: 0.0516145897865757,
-      100: 0.0374805844550272,
-      200: 0.0270252129816288,
-      500: 0.017383057902553,
-      1000: 0.012405033293814,
-      2000: 0.00882439333812351,
-      5000: 0.00560929919359959,
-      10000: 0.00397885007249132,
-      20000: 0.0028181999035216,
-      40000: 0.00199645471886179,
-      72000: 0.00148936709298802},
-     '0.7': {4: 0.13255954878268902,
-      5: 0.14729879897625198,
-      6: 0.140564796497941,
-      7: 0.130409013968317,
-      8: 0.120561479262465,
-      9: 0.112512617124951,
-      10: 0.10996094814295099,
-      15: 0.093124666680253,
-      20: 0.0824558407118372,
-      30: 0.0689178762425442,
-      50: 0.0548121932066019,
-      100: 0.0398046179116599,
-      200: 0.0286920262150517,
-      500: 0.0184503949887735,
-      1000: 0.0131684179320803,
-      2000: 0.009367858207170609,
-      5000: 0.00595352728377949,
-      10000: 0.00422430013176233,
-      20000: 0.00299137548142077,
-      40000: 0.00211929748381704,
-      72000: 0.00158027541945626},
-     '0.8': {4: 0.15749736904023498,
-      5: 0.161085025702604,
-      6: 0.14941924112913002,
-      7: 0.136639642123068,
-      8: 0.125558759034845,
-      9: 0.12291503348081699,
-      10: 0.11884476721158699,
-      15: 0.0996694393390689,
-      20: 0.08834462700173701,
-      30: 0.0739249074078291,
-      50: 0.0588230482851366,
-      100: 0.0427283846799166,
-      200: 0.0308006766341406,
-      500: 0.0198162679782071,
-      1000: 0.0141377942603047,
-      2000: 0.01005604603884,
-      5000: 0.00639092280563517,
-      10000: 0.00453437508148542,
-      20000: 0.00321024899920135,
-      40000: 0.0022745769870358102,
-      72000: 0.00169651643860074},
-     '0.9': {4: 0.18740187880755899,
-      5: 0.176811998476076,
-      6: 0.159137064572627,
-      7: 0.144240669035124,
-      8: 0.141841067033899,
-      9: 0.136412639387084,
-      10: 0.130462149644819,
-      15: 0.11008749690090598,
-      20: 0.0972346018122903,
-      30: 0.0814791379390127,
-      50: 0.0649136324046767,
-      100: 0.047152783315718,
-      200: 0.0339967814293504,
-      500: 0.0218781313182203,
-      1000: 0.0156148055023058,
-      2000: 0.0111019116837591,
-      5000: 0.00705566126234625,
-      10000: 0.00500178808402368,
-      20000: 0.00354362220314155,
-      40000: 0.00250999080890397,
-      72000: 0.0018730618472582602},
-     '0.95': {4: 0.20726978858735998,
-      5: 0.18639179602794398,
-      6: 0.164769608513302,
-      7: 0.159903395678336,
-      8: 0.153978303998561,
-      9: 0.14660378495401902,
-      10: 0.139611395137099,
-      15: 0.118760769203664,
-      20: 0.105130218270636,
-      30: 0.0881689143126666,
-      50: 0.0702737877191269,
-      100: 0.0511279442868827,
-      200: 0.0368418413878307,
-      500: 0.0237294742633411,
-      1000: 0.0169343970067564,
-      2000: 0.0120380990328341,
-      5000: 0.0076506368153935,
-      10000: 0.00542372242836395,
-      20000: 0.00384330190244679,
-      40000: 0.00272375073486223,
-      72000: 0.00203178401610555},
-     '0.98': {4: 0.22375580462922195,
-      5: 0.19361253363045,
-      6: 0.17917654739278197,
-      7: 0.17519655327122302,
-      8: 0.16597856724751,
-      9: 0.157084065653166,
-      10: 0.150961728882481,
-      15: 0.128890475210055,
-      20: 0.11430970428125302,
-      30: 0.0960564383013644,
-      50: 0.0767095886079179,
-      100: 0.0558022052195208,
-      200: 0.0402729850316397,
-      500: 0.025919578977657003,
-      1000: 0.018513067368104,
-      2000: 0.0131721010552576,
-      5000: 0.00836821687047215,
-      10000: 0.00592656681022859,
-      20000: 0.00420258799378253,
-      40000: 0.00298072958568387,
-      72000: 0.00222356097506054},
-     '0.99': {4: 0.231796258864192,
-      5: 0.19650913979884502,
-      6: 0.191862827995563,
-      7: 0.184118659121501,
-      8: 0.172988528276759,
-      9: 0.164164643657217,
-      10: 0.159684158858235,
-      15: 0.13598356863636,
-      20: 0.120624043335821,
-      30: 0.101478558893837,
-      50: 0.0811998415355918,
-      100: 0.059024132304226,
-      200: 0.0426864799777448,
-      500: 0.0274518022761997,
-      1000: 0.0196080260483234,
-      2000: 0.0139655122281969,
-      5000: 0.00886357892854914,
-      10000: 0.00628034732880374,
-      20000: 0.00445774902155711,
-      40000: 0.00315942194040388,
-      72000: 0.00235782814777627},
-     '0.995': {4: 0.23726374382677898,
-      5: 0.198159967287576,
-      6: 0.20210197104296804,
-      7: 0.19101439617430602,
-      8: 0.179010413496374,
-      9: 0.172821674582338,
-      10: 0.16719524735674,
-      15: 0.14245248368127697,
-      20: 0.126552378036739,
-      30: 0.10650487144103,
-      50: 0.0852854646662134,
-      100: 0.0620425065165146,
-      200: 0.044958959158761,
-      500: 0.0288986369564301,
-      1000: 0.0206489568587364,
-      2000: 0.0146889122204488,
-      5000: 0.00934162787186159,
-      10000: 0.00661030641550873,
-      20000: 0.00469461513212743,
-      40000: 0.0033273652798148,
-      72000: 0.00248343580127067},
-     '0.998': {4: 0.241992892688593,
-      5: 0.19924427936243302,
-      6: 0.213015781111186,
-      7: 0.198216795232182,
-      8: 0.186504388711178,
-      9: 0.182555283567818,
-      10: 0.175419540856082,
-      15: 0.15017281653074202,
-      20: 0.13360135382395,
-      30: 0.112724636524262,
-      50: 0.0904847827490294,
-      100: 0.0658016011466099,
-      200: 0.0477643873749449,
-      500: 0.0306813505050163,
-      1000: 0.0219285176765082,
-      2000: 0.0156076779647454,
-      5000: 0.009932186363240291,
-      10000: 0.00702254699967648,
-      20000: 0.004994160691291679,
-      40000: 0.00353988965698579,
-      72000: 0.00264210826339498},
-     '0.999': {4: 0.244369839049632,
-      5: 0.199617527406166,
-      6: 0.219518627282415,
-      7: 0.20234101074826102,
-      8: 0.19448404115794,
-      9: 0.188658833121906,
-      10: 0.180611195797351,
-      15: 0.15545613369632802,
-      20: 0.138569903791767,
-      30: 0.117164140184417,
-      50: 0.0940930106666244,
-      100: 0.0684479731118028,
-      200: 0.0497198001867437,
-      500: 0.0320170996823189,
-      1000: 0.0228689168972669,
-      2000: 0.0162685615996248,
-      5000: 0.0103498795291629,
-      10000: 0.0073182262815645795,
-      20000: 0.00520917757743218,
-      40000: 0.00369400045486625,
-      72000: 0.0027524322157581},
-     '0.9995': {4: 0.245966625504691,
-      5: 0.19980094149902802,
-      6: 0.22433904739444602,
-      7: 0.205377566346832,
-      8: 0.200864297005026,
-      9: 0.19408912076824603,
-      10: 0.18528641605039603,
-      15: 0.160896499106958,
-      20: 0.14336916123968,
-      30: 0.12142585990898701,
-      50: 0.0974904344916743,
-      100: 0.0709169443994193,
-      200: 0.0516114611801451,
-      500: 0.0332452747332959,
-      1000: 0.023738710122235003,
-      2000: 0.0168874937789415,
-      5000: 0.0107780907076862,
-      10000: 0.0076065423418208,
-      20000: 0.005403962359243721,
-      40000: 0.00383345715372182,
-      72000: 0.0028608570740143},
-     '0.9998': {4: 0.24743959723326198,
-      5: 0.19991708183427104,
-      6: 0.22944933215424101,
-      7: 0.208306562526874,
-      8: 0.20884999705022897,
-      9: 0.19915700809389003,
-      10: 0.19120308390504398,
-      15: 0.16697940794624802,
-      20: 0.148940116394883,
-      30: 0.126733051889401,
-      50: 0.10228420428399698,
-      100: 0.0741183486081263,
-      200: 0.0540543978864652,
-      500: 0.0348335698576168,
-      1000: 0.0248334158891432,
-      2000: 0.0176505093388153,
-      5000: 0.0113184316868283,
-      10000: 0.00795640367207482,
-      20000: 0.00564540201704594,
-      40000: 0.0040079346963469605,
-      72000: 0.00298695044508003},
-     '0.9999': {4: 0.24823065965663801,
-      5: 0.19995902909307503,
-      6: 0.232714530449602,
-      7: 0.209866047852379,
-      8: 0.212556040406219,
-      9: 0.20288159843655804,
-      10: 0.19580515933918397,
-      15: 0.17111793515551002,
-      20: 0.152832538183622,
-      30: 0.131198578897542,
-      50: 0.104680624334611,
-      100: 0.0762579402903838,
-      200: 0.0558704526182638,
-      500: 0.0359832389317461,
-      1000: 0.0256126573433596,
-      2000: 0.0181944265400504,
-      5000: 0.0117329446468571,
-      10000: 0.0082270524584354,
-      20000: 0.00580460792299214,
-      40000: 0.00414892737222885,
-      72000: 0.00309340092038059},
-     '0.99995': {4: 0.248754269146416,
-      5: 0.19997839537608197,
-      6: 0.236548128358969,
-      7: 0.21096757693345103,
-      8: 0.21714917413729898,
-      9: 0.205979795735129,
-      10: 0.20029398089673,
-      15: 0.17590050570443203,
-      20: 0.15601016361897102,
-      30: 0.133691739483444,
-      50: 0.107496694235039,
-      100: 0.0785735967934979,
-      200: 0.0573877056330228,
-      500: 0.0369051995840645,
-      1000: 0.0265491336936829,
-      2000: 0.0186226037818523,
-      5000: 0.0119995948968375,
-      10000: 0.00852240989786251,
-      20000: 0.00599774739593151,
-      40000: 0.0042839159079761,
-      72000: 0.00319932767198801},
-     '0.99998': {4: 0.24930203997425898,
-      5: 0.199993151405815,
-      6: 0.2390887911995,
-      7: 0.212233348558702,
-      8: 0.22170007640450304,
-      9: 0.21054115498898,
-      10: 0.20565108964621898,
-      15: 0.18185667601316602,
-      20: 0.16131922583934502,
-      30: 0.137831637950694,
-      50: 0.11140887547015,
-      100: 0.0813458356889133,
-      200: 0.0593365901653878,
-      500: 0.0387221159256424,
-      1000: 0.027578430100535997,
-      2000: 0.0193001796565433,
-      5000: 0.0124410052027886,
-      10000: 0.00892863905540303,
-      20000: 0.00633099254378114,
-      40000: 0.0044187010443287895,
-      72000: 0.00332688234611187},
-     '0.99999': {4: 0.24945965232322498,
-      5: 0.199995525025673,
-      6: 0.24010356643629502,
-      7: 0.21266103831250602,
-      8: 0.225000835357532,
-      9: 0.21180033095039003,
-      10: 0.209682048785853,
-      15: 0.185743454151004,
-      20: 0.165568255916749,
-      30: 0.14155750962435099,
-      50: 0.113536607717411,
-      100: 0.0832963013755522,
-      200: 0.0607646310473911,
-      500: 0.039930259057650005,
-      1000: 0.0284430733108,
-      2000: 0.0196241518040617,
-      5000: 0.0129467396733128,
-      10000: 0.009138539330002129,
-      20000: 0.00656987109386762,
-      40000: 0.00450818604569179,
-      72000: 0.00339316094477355},
-     '1': {4: 0.24974836247845,
-      5: 0.199999835639211,
-      6: 0.24467288361776798,
-      7: 0.21353618608817,
-      8: 0.23377291968768302,
-      9: 0.21537991431762502,
-      10: 0.221530282182963,
-      15: 0.19224056333056197,
-      20: 0.175834459522789,
-      30: 0.163833046059817,
-      50: 0.11788671686531199,
-      100: 0.0926780423096737,
-      200: 0.0705309107882395,
-      500: 0.0431448163617178,
-      1000: 0.0313640941982108,
-      2000: 0.0213081254074584,
-      5000: 0.014396063834027,
-      10000: 0.00952234579566773,
-      20000: 0.006858294480462271,
-      40000: 0.00513477467565583,
-      72000: 0.00376331697005859}}
-
-    qDiptab_df = pd.DataFrame(qDiptab_dict)
-
-    diptable = np.array(qDiptab_df)
-    ps = np.array(qDiptab_df.columns).astype(float)
-    Ns = np.array(qDiptab_df.index)
-
-    if N >= Ns[-1]:
-        dip = transform_dip_to_other_nbr_pts(dip, N, Ns[-1]-0.1)
-        N = Ns[-1]-0.1
-
-    iNlow = np.nonzero(Ns < N)[0][-1]
-    qN = (N-Ns[iNlow])/(Ns[iNlow+1]-Ns[iNlow])
-    dip_sqrtN = np.sqrt(N)*dip
-    dip_interpol_sqrtN = (
-        np.sqrt(Ns[iNlow])*diptable[iNlow, :] + qN*(
-            np.sqrt(Ns[iNlow+1])*diptable[iNlow+1, :]-np.sqrt(Ns[iNlow])*diptable[iNlow, :]))
+        dips    -   array of dip values computed from dip_from_cdf
+        Ns      -   array of numbers of observations, same length as dips
 
-    if not (dip_interpol_sqrtN < dip_sqrtN).any():
-        return 1
+        Value:
+            array of p-values, NaN where N is NaN or smaller than 10.
+    '''
+    Ntab, ps, diptab_sqrtN = _dip_pval_table()
+    dips = np.asarray(dips, dtype=float).reshape(-1)
+    N = np.asarray(Ns, dtype=float).reshape(-1)
+    pvals = np.full(len(dips), np.nan)
 
-    iplow = np.nonzero(dip_interpol_sqrtN < dip_sqrtN)[0][-1]
-    if iplow == len(dip_interpol_sqrtN) - 1:
-        return 0
+    valid = ~np.isnan(N) & (N >= 10)
+    dip = dips[valid]
+    N = N[valid]
 
-    qp = (dip_sqrtN-dip_interpol_sqrtN[iplow])/(dip_interpol_sqrtN[iplow+1]-dip_interpol_sqrtN[iplow])
-    p_interpol = ps[iplow] + qp*(ps[iplow+1]-ps[iplow])
+    large = N >= Ntab[-1]
+    dip[large] = transform_dip_to_other_nbr_pts(dip[large], N[large], Ntab[-1]-0.1)
+    N[large] = Ntab[-1]-0.1
 
-    return 1 - p_interpol
+    iNlow = np.searchsorted(Ntab, N, side='left') - 1
+    qN = (N-Ntab[iNlow])/(Ntab[iNlow+1]-Ntab[iNlow])
+    dip_sqrtN = np.sqrt(N)*dip
+    dip_interpol_sqrtN = (diptab_sqrtN[iNlow, :] + qN[:, np.newaxis]*(
+        diptab_sqrtN[iNlow+1, :]-diptab_sqrtN[iNlow, :]))
+
+    # tabulated quantiles increase with p for N >= 10
+    iplow = np.sum(dip_interpol_sqrtN < dip_sqrtN[:, np.newaxis], axis=1) - 1
+    ipcl = np.clip(iplow, 0, len(ps)-2)
+    rows = np.arange(len(dip))
+    lo = dip_interpol_sqrtN[rows, ipcl]
+    hi = dip_interpol_sqrtN[rows, ipcl+1]
+    qp = (dip_sqrtN-lo)/(hi-lo)
+    p_interpol = ps[ipcl] + qp*(ps[ipcl+1]-ps[ipcl])
+
+    res = 1 - p_interpol
+    res[iplow < 0] = 1
+    res[iplow == len(ps)-1] = 0
+    pvals[valid] = res
+    return pvals
 
 def transform_dip_to_other_nbr_pts(dip_n, n, m):
     dip_m = np.sqrt(n/m)*dip_n
@@ -734,6 +1128,88 @@ def dip_and_closest_unimodal_from_cdf(xF, yF, plotting=False, verbose=False, eps
 
     '''
 
+    D, iGfin, iHfin = _dip_modal_search(xF, yF, verbose, eps)
+
+    # if plotting:
+
+    #     # Add modal interval to figure
+    #     bax.axvline(xF[L0], ymin, ymax, color='green', linestyle='dashed')
+    #     bax.axvline(xF[U0], ymin, ymax, color='green', linestyle='dashed')
+
+    #     ## Plot unimodal function (not distribution function)
+    #     bfig = plt.figure()
+    #     bax = bfig.add_subplot(1, 1, 1)
+    #     bax.plot(xF, yF, color='red')
+    #     bax.plot(xF, yF-D/2, color='black')
+    #     bax.plot(xF, yF+D/2, color='black')
+
+    # Find string position in modal interval
+    iM = np.arange(iGfin[-1], iHfin[0]+1)
+    yM_lower = yF[iM]-D/2
+    yM_lower[0] = yF[iM[0]]+D/2
+    iMM_concave = least_concave_majorant_sorted(xF[iM], yM_lower)
+    iM_concave = iM[iMM_concave]
+    #bax.plot(xF[iM], yM_lower, color='orange')
+    #bax.plot(xF[iM_concave], yM_lower[iMM_concave], color='red')
+    lcm_ipl = np.interp(xF[iM], xF[iM_concave], yM_lower[iMM_concave])
+    try:
+        mode = iM[np.nonzero(lcm_ipl > yF[iM]+D/2)[0][-1]]
+        #bax.axvline(xF[mode], color='green', linestyle='dashed')
+    except IndexError:
+        iM_convex = np.zeros(0, dtype='i')
+    else:
+        after_mode = iM_concave > mode
+        iM_concave = iM_concave[after_mode]
+        iMM_concave = iMM_concave[after_mode]
+        iM = iM[iM <= mode]
+        iM_convex = iM[greatest_convex_minorant_sorted(xF[iM], yF[iM])]
+
+    # if plotting:
+
+    #     bax.plot(xF[np.hstack([iGfin, iM_convex, iM_concave, iHfin])],
+    #              np.hstack([yF[iGfin] + D/2, yF[iM_convex] + D/2,
+    #                         yM_lower[iMM_concave], yF[iHfin] - D/2]), color='blue')
+    #     #bax.plot(xF[iM], yM_lower, color='orange')
+
+    #     ## Plot unimodal distribution function
+    #     bfig = plt.figure()
+    #     bax = bfig.add_subplot(1, 1, 1)
+    #     bax.plot(xF, yF, color='red')
+    #     bax.plot(xF, yF-D/2, color='black')
+    #     bax.plot(xF, yF+D/2, color='black')
+
+    # Closest unimodal curve
+    xU = xF[np.hstack([iGfin[:-1], iM_convex, iM_concave, iHfin[1:]])]
+    yU = np.hstack([yF[iGfin[:-1]] + D/2, yF[iM_convex] + D/2,
+                    yM_lower[iMM_concave], yF[iHfin[1:]] - D/2])
+    # Add points so unimodal curve goes from 0 to 1
+    k_start = (yU[1]-yU[0])/(xU[1]-xU[0]+1e-5)
+    xU_start = xU[0] - yU[0]/(k_start+1e-5)
+    k_end = (yU[-1]-yU[-2])/(xU[-1]-xU[-2]+1e-5)
+    xU_end = xU[-1] + (1-yU[-1])/(k_end+1e-5)
+    xU = np.hstack([xU_start, xU, xU_end])
+    yU = np.hstack([0, yU, 1])
+
+    # if plotting:
+    #     bax.plot(xU, yU, color='blue')
+    #     #bax.plot(xF[iM], yM_lower, color='orange')
+    #     plt.show()
+
+    return D/2, (xU, yU)
+
+def _dip_modal_search(xF, yF, verbose=False, eps=1e-12, track_hull=True):
+    '''
+        Iterative search over modal intervals from Hartigan (1985). Stops
+        as soon as the dip is known.
+
+        Value:
+            D       -   twice the dip.
+            iGfin   -   indices of the final convex minorant left of the
+                        modal interval (None unless track_hull).
+            iHfin   -   indices of the final concave majorant right of the
+                        modal interval (None unless track_hull).
+    '''
+
     ## TODO! Preprocess xF and yF so that yF increasing and xF does
     ## not have more than two copies of each x-value.
 
@@ -758,15 +1234,18 @@ def dip_and_closest_unimodal_from_cdf(xF, yF, plotting=False, verbose=False, eps
     # convex minorant to (xF, yF+dip)
     # iHfin are the indices of xF where the optimal unimodal distribution is least
     # concave majorant to (xF, yF-dip)
-    iGfin = L
-    iHfin = U
+    if track_hull:
+        iGfin = L
+        iHfin = U
+    else:
+        iGfin = iHfin = None
 
     while 1:
 
         iGG = greatest_convex_minorant_sorted(xF[L:(U+1)], yF[L:(U+1)])
         iHH = least_concave_majorant_sorted(xF[L:(U+1)], yF[L:(U+1)])
-        iG = np.arange(L, U+1)[iGG]
-        iH = np.arange(L, U+1)[iHH]
+        iG = L + iGG
+        iH = L + iHH
 
         # Interpolate. First and last point are in both and does not need
         # interpolation. Might cause trouble if included due to possiblity
@@ -813,8 +1292,9 @@ def dip_and_closest_unimodal_from_cdf(xF, yF, plotting=False, verbose=False, eps
             U0 = iH[imaxdiffh]
             L0 = iG[iG <= U0][-1]
         # Add points outside the modal interval to the final GCM and LCM.
-        iGfin = np.hstack([iGfin, iG[(iG <= L0)*(iG > L)]])
-        iHfin = np.hstack([iH[(iH >= U0)*(iH < U)], iHfin])
+        if track_hull:
+            iGfin = np.hstack([iGfin, iG[(iG <= L0)*(iG > L)]])
+            iHfin = np.hstack([iH[(iH >= U0)*(iH < U)], iHfin])
 
         # # Plot new modal interval
         # if plotting:
@@ -853,123 +1333,91 @@ def dip_and_closest_unimodal_from_cdf(xF, yF, plotting=False, verbose=False, eps
                 print("Difference in modal interval smaller than new dip")
             break
 
-    # if plotting:
-
-    #     # Add modal interval to figure
-    #     bax.axvline(xF[L0], ymin, ymax, color='green', linestyle='dashed')
-    #     bax.axvline(xF[U0], ymin, ymax, color='green', linestyle='dashed')
-
-    #     ## Plot unimodal function (not distribution function)
-    #     bfig = plt.figure()
-    #     bax = bfig.add_subplot(1, 1, 1)
-    #     bax.plot(xF, yF, color='red')
-    #     bax.plot(xF, yF-D/2, color='black')
-    #     bax.plot(xF, yF+D/2, color='black')
-
-    # Find string position in modal interval
-    iM = np.arange(iGfin[-1], iHfin[0]+1)
-    yM_lower = yF[iM]-D/2
-    yM_lower[0] = yF[iM[0]]+D/2
-    iMM_concave = least_concave_majorant_sorted(xF[iM], yM_lower)
-    iM_concave = iM[iMM_concave]
-    #bax.plot(xF[iM], yM_lower, color='orange')
-    #bax.plot(xF[iM_concave], yM_lower[iMM_concave], color='red')
-    lcm_ipl = np.interp(xF[iM], xF[iM_concave], yM_lower[iMM_concave])
-    try:
-        mode = iM[np.nonzero(lcm_ipl > yF[iM]+D/2)[0][-1]]
-        #bax.axvline(xF[mode], color='green', linestyle='dashed')
-    except IndexError:
-        iM_convex = np.zeros(0, dtype='i')
-    else:
-        after_mode = iM_concave > mode
-        iM_concave = iM_concave[after_mode]
-        iMM_concave = iMM_concave[after_mode]
-        iM = iM[iM <= mode]
-        iM_convex = iM[greatest_convex_minorant_sorted(xF[iM], yF[iM])]
-
-    # if plotting:
-
-    #     bax.plot(xF[np.hstack([iGfin, iM_convex, iM_concave, iHfin])],
-    #              np.hstack([yF[iGfin] + D/2, yF[iM_convex] + D/2,
-    #                         yM_lower[iMM_concave], yF[iHfin] - D/2]), color='blue')
-    #     #bax.plot(xF[iM], yM_lower, color='orange')
-
-    #     ## Plot unimodal distribution function
-    #     bfig = plt.figure()
-    #     bax = bfig.add_subplot(1, 1, 1)
-    #     bax.plot(xF, yF, color='red')
-    #     bax.plot(xF, yF-D/2, color='black')
-    #     bax.plot(xF, yF+D/2, color='black')
-
-    # Find string position in modal interval
-    iM = np.arange(iGfin[-1], iHfin[0]+1)
-    yM_lower = yF[iM]-D/2
-    yM_lower[0] = yF[iM[0]]+D/2
-    iMM_concave = least_concave_majorant_sorted(xF[iM], yM_lower)
-    iM_concave = iM[iMM_concave]
-    #bax.plot(xF[iM], yM_lower, color='orange')
-    #bax.plot(xF[iM_concave], yM_lower[iMM_concave], color='red')
-    lcm_ipl = np.interp(xF[iM], xF[iM_concave], yM_lower[iMM_concave])
-    try:
-        mode = iM[np.nonzero(lcm_ipl > yF[iM]+D/2)[0][-1]]
-        #bax.axvline(xF[mode], color='green', linestyle='dashed')
-    except IndexError:
-        iM_convex = np.zeros(0, dtype='i')
-    else:
-        after_mode = iM_concave > mode
-        iM_concave = iM_concave[after_mode]
-        iMM_concave = iMM_concave[after_mode]
-        iM = iM[iM <= mode]
-        iM_convex = iM[greatest_convex_minorant_sorted(xF[iM], yF[iM])]
-
-    # Closest unimodal curve
-    xU = xF[np.hstack([iGfin[:-1], iM_convex, iM_concave, iHfin[1:]])]
-    yU = np.hstack([yF[iGfin[:-1]] + D/2, yF[iM_convex] + D/2,
-                    yM_lower[iMM_concave], yF[iHfin[1:]] - D/2])
-    # Add points so unimodal curve goes from 0 to 1
-    k_start = (yU[1]-yU[0])/(xU[1]-xU[0]+1e-5)
-    xU_start = xU[0] - yU[0]/(k_start+1e-5)
-    k_end = (yU[-1]-yU[-2])/(xU[-1]-xU[-2]+1e-5)
-    xU_end = xU[-1] + (1-yU[-1])/(k_end+1e-5)
-    xU = np.hstack([xU_start, xU, xU_end])
-    yU = np.hstack([0, yU, 1])
-
-    # if plotting:
-    #     bax.plot(xU, yU, color='blue')
-    #     #bax.plot(xF[iM], yM_lower, color='orange')
-    #     plt.show()
-
-    return D/2, (xU, yU)
+    return D, iGfin, iHfin
 
 def greatest_convex_minorant_sorted(x, y):
     i = least_concave_majorant_sorted(x, -y)
     return i
 
 def least_concave_majorant_sorted(x, y, eps=1e-12):
-    i = [0]
-    icurr = 0
-    while icurr < len(x) - 1:
-        if np.abs(x[icurr+1]-x[icurr]) > eps:
-            q = (y[(icurr+1):]-y[icurr])/(x[(icurr+1):]-x[icurr])
-            icurr += 1 + np.argmax(q)
-            i.append(icurr)
-        elif y[icurr+1] > y[icurr] or icurr == len(x)-2:
-            icurr += 1
-            i.append(icurr)
-        elif np.abs(x[icurr+2]-x[icurr]) > eps:
-            q = (y[(icurr+2):]-y[icurr])/(x[(icurr+2):]-x[icurr])
-            icurr += 2 + np.argmax(q)
-            i.append(icurr)
-        else:
-            print("x[icurr] = {}, x[icurr+1] = {}, x[icurr+2] = {}".format(x[icurr], 
-              x[icurr+1], x[icurr+2]))
-            raise ValueError('Maximum two copies of each x-value allowed')
+    '''
+        Indices of the points of (x, y) that lie on the least concave
+        majorant, computed with Andrew's monotone chain algorithm in linear
+        time. Collinear points on the majorant are included.
 
-    return np.array(i)
+        x   -   sorted x-coordinates, each value occurring at most twice
+        y   -   y-coordinates
+
+        Of two points sharing an x-value only the higher one can lie on the
+        majorant, except that the majorant may start with a vertical step up
+        and end with a vertical step down.
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n < 3:
+        return np.arange(n)
+    if (np.abs(x[2:]-x[:-2]) <= eps).any():
+        raise ValueError('Maximum two copies of each x-value allowed')
+
+    # drop the lower point of each duplicated x-value (the later on ties)
+    keep = np.ones(n, dtype='bool')
+    idup = np.nonzero(np.abs(x[1:]-x[:-1]) <= eps)[0]
+    second_lower = y[idup+1] <= y[idup]
+    keep[idup[second_lower]+1] = False
+    keep[idup[~second_lower]] = False
+    keep[0] = True
+    keep[-1] = True
+    ind = np.nonzero(keep)[0]
+    xk = x[ind]
+    yk = y[ind]
+
+    # points strictly below the chord between their neighbours are not on
+    # the majorant; removing them in vectorized passes leaves few points
+    # for the sequential scan
+    while len(ind) > 64:
+        below = ((xk[1:-1]-xk[:-2])*(yk[2:]-yk[:-2]) -
+                 (yk[1:-1]-yk[:-2])*(xk[2:]-xk[:-2]) > 0)
+        nbr_below = np.count_nonzero(below)
+        if nbr_below == 0:
+            break
+        remaining = np.hstack([True, ~below, True])
+        ind, xk, yk = ind[remaining], xk[remaining], yk[remaining]
+        if nbr_below < len(ind)//8:
+            break
+
+    # monotone chain over the remaining points
+    xs = xk.tolist()
+    ys = yk.tolist()
+    hull = []
+    for k in range(len(ind)):
+        xc, yc = xs[k], ys[k]
+        while len(hull) >= 2:
+            a, b = hull[-2], hull[-1]
+            if (xs[b]-xs[a])*(yc-ys[a]) - (ys[b]-ys[a])*(xc-xs[a]) > 0:
+                hull.pop()
+            else:
+                break
+        hull.append(k)
+
+    return ind[hull]
 
 class KernelDensityDerivative(object):
+    '''
+        Gaussian kernel density estimate (deriv_order 0) or estimate of its
+        second derivative (deriv_order 2).
+
+        If tol is None the estimate is evaluated exactly, summing the kernel
+        over all data points. Otherwise the data are linearly binned onto a
+        grid with spacing h*sqrt(tol), convolved with the kernel by FFT and
+        interpolated at the evaluation points, which gives a relative error
+        of order tol at O(n + M log M) cost for M grid points. Grids larger
+        than max_grid_size fall back to exact evaluation.
+    '''
 
-    def __init__(self, data, deriv_order):
+    max_grid_size = 2**22
+
+    def __init__(self, data, deriv_order, tol=None):
 
         if deriv_order == 0:
             self.kernel = lambda u: np.exp(-u**2/2)
@@ -980,9 +1428,17 @@ class KernelDensityDerivative(object):
         self.deriv_order = deriv_order
         self.h = silverman_bandwidth(data, deriv_order)
         self.datah = data/self.h
+        self.tol = tol
 
     def evaluate(self, x):
         xh = np.array(x).reshape(-1)/self.h
+        if self.tol is not None:
+            res = self._evaluate_binned(xh)
+        else:
+            res = self._evaluate_exact(xh)
+        return res*1./(np.sqrt(2*np.pi)*self.h**(1+self.deriv_order)*len(self.datah))
+
+    def _evaluate_exact(self, xh):
         res = np.zeros(len(xh))
         if len(xh) > len(self.datah):  # loop over data
             for data_ in self.datah:
@@ -990,7 +1446,29 @@ class KernelDensityDerivative(object):
         else:  # loop over x
             for i, x_ in enumerate(xh):
                 res[i] = np.sum(self.kernel(self.datah-x_))
-        return res*1./(np.sqrt(2*np.pi)*self.h**(1+self.deriv_order)*len(self.datah))
+        return res
+
+    def _evaluate_binned(self, xh):
+        delta = np.sqrt(self.tol)
+        lo = min(np.min(self.datah), np.min(xh))
+        hi = max(np.max(self.datah), np.max(xh))
+        M = int(np.ceil((hi-lo)/delta)) + 2
+        if M > self.max_grid_size:
+            # extreme outliers relative to the bandwidth
+            return self._evaluate_exact(xh)
+
+        # linear binning of the data onto the grid lo + delta*arange(M)
+        pos = (self.datah-lo)/delta
+        ipos = np.floor(pos).astype(int)
+        frac = pos - ipos
+        counts = (np.bincount(ipos, 1-frac, minlength=M) +
+                  np.bincount(ipos+1, frac, minlength=M))[:M]
+
+        # kernel truncated where it is below tol relative to its maximum
+        L = min(M-1, int(np.ceil((np.sqrt(-2*np.log(self.tol))+2)/delta)))
+        kern = self.kernel(delta*np.arange(-L, L+1))
+        grid_vals = fftconvolve(counts, kern, mode='same')
+        return np.interp(xh, lo + delta*np.arange(M), grid_vals)
 
     def score_samples(self, x):
         return self.evaluate(x)
@@ -1020,24 +1498,217 @@ def bandwidth_factor(nbr_data_pts, deriv_order=0):
 
     raise ValueError('Not implemented for derivative of order {}'.format(deriv_order))
 
-def calibrated_dip_test(data, N_bootstrap=1000):
+def calibrated_dip_test(data, N_bootstrap=1000, seed=None, n_jobs=1,
+                        chunk_size=100, cache=None, kde_tol=None):
+    '''
+        P-value for the calibrated dip test of unimodality.
+
+        References:
+            Cheng and Hall (1998): Calibrating the excess mass and dip tests
+            of modality. Journal of the Royal Statistical Society, Series B.
+            60(3).
+
+        Input:
+            data        -   one-dimensional data set.
+            N_bootstrap -   number of reference samples.
+            seed        -   seed for the reference samples, anything
+                            accepted by spawn_seeds.
+            n_jobs      -   number of worker processes for the reference
+                            dips, -1 for all CPUs.
+            chunk_size  -   number of reference samples per task.
+            cache       -   optional DipNullCache. If given, the reference
+                            dips are looked up (or simulated once and
+                            stored) for the quantized reference
+                            distribution instead of simulated per call.
+            kde_tol     -   tolerance of the binned kernel density estimate
+                            used to find the mode. None (default)
+                            evaluates it exactly; a tolerance such as
+                            1e-6 is faster for large samples.
+
+        Value:
+            p-value for the test.
+    '''
     xF, yF = cum_distr(data)
     dip = dip_from_cdf(xF, yF)
     n_eval = 512
-    f_hat = KernelDensityDerivative(data, 0)
-    f_bis_hat = KernelDensityDerivative(data, 2)
+    f_hat = KernelDensityDerivative(data, 0, tol=kde_tol)
+    f_bis_hat = KernelDensityDerivative(data, 2, tol=kde_tol)
     x = np.linspace(np.min(data), np.max(data), n_eval)
     f_hat_eval = f_hat.evaluate(x)
     ind_x0_hat = np.argmax(f_hat_eval)
     d_hat = np.abs(f_bis_hat.evaluate(x[ind_x0_hat]))/f_hat_eval[ind_x0_hat]**3
     ref_distr = select_calibration_distribution(d_hat)
-    ref_dips = np.zeros(N_bootstrap)
-    for i in range(N_bootstrap):
-        samp = ref_distr.sample(len(data))
-        xF, yF = cum_distr(samp)
-        ref_dips[i] = dip_from_cdf(xF, yF)
+    if cache is not None:
+        return cache.pval(dip, ref_distr, len(data), N_bootstrap, seed,
+                          n_jobs, chunk_size)
+    ref_dips = bootstrap_ref_dips(ref_distr, len(data), N_bootstrap, seed,
+                                  n_jobs, chunk_size)
     return np.mean(ref_dips > dip)
 
+def bootstrap_ref_dips(ref_distr, n, N_bootstrap=1000, seed=None, n_jobs=1,
+                       chunk_size=100):
+    '''
+        Dips of N_bootstrap samples of size n from ref_distr.
+
+        The samples are split into chunks of chunk_size, each drawn as one
+        matrix from its own stream spawned from seed by spawn_seeds. The
+        result for a given seed is therefore the same for any n_jobs.
+    '''
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    sizes = [chunk_size]*(N_bootstrap // chunk_size)
+    if N_bootstrap % chunk_size:
+        sizes.append(N_bootstrap % chunk_size)
+    seeds = spawn_seeds(seed, len(sizes))
+
+    if n_jobs is None or n_jobs <= 1 or len(sizes) == 1:
+        dips = [_ref_dips_chunk(ref_distr, n, size, s)
+                for size, s in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            dips = list(executor.map(_ref_dips_chunk, [ref_distr]*len(sizes),
+                                     [n]*len(sizes), sizes, seeds))
+    return np.concatenate(dips) if dips else np.zeros(0)
+
+def _ref_dips_chunk(ref_distr, n, size, seed):
+    rng = np.random.default_rng(seed)
+    samp = ref_distr.sample((size, n), rng=rng)
+    xF, yF, lengths = cum_distr_many(samp)
+    return np.array([dip_from_cdf(xF[i, :lengths[i]], yF[i, :lengths[i]])
+                     for i in range(size)])
+
+class DipNullCache(object):
+    '''
+        Disk-backed cache of reference dip distributions for
+        calibrated_dip_test.
+
+        The null distribution only depends on the reference family, its
+        beta parameter and the sample size n. Entries are keyed on the
+        family, beta rounded on a logarithmic grid and n rounded to a
+        power of two; dips simulated at the bucket size n_ref are rescaled
+        to n with transform_dip_to_other_nbr_pts, since the dip scales as
+        1/sqrt(n). Each entry is a sorted array of reference dips stored
+        as .npy and opened memory-mapped. When more than max_entries are
+        stored, the least recently used are removed.
+
+        Input:
+            directory       -   cache directory (created if missing).
+            max_entries     -   maximum number of stored entries.
+            beta_resolution -   number of grid points per unit of log(beta).
+    '''
+
+    def __init__(self, directory=None, max_entries=256, beta_resolution=20):
+        if directory is None:
+            directory = os.path.join(os.path.expanduser('~'), '.cache',
+                                     'tableone', 'dip_null')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.max_entries = max_entries
+        self.beta_resolution = beta_resolution
+        self._loaded = OrderedDict()
+
+    def key(self, ref_distr, n):
+        '''
+            (family, quantized beta, bucketed n) for a reference distribution.
+        '''
+        if isinstance(ref_distr, RefGaussian):
+            family, beta = 'gaussian', 0.
+        elif isinstance(ref_distr, RefBeta):
+            family, beta = 'beta', ref_distr.beta
+        elif isinstance(ref_distr, RefStudentt):
+            family, beta = 'studentt', ref_distr.beta
+        else:
+            raise ValueError('Unknown reference distribution {}'.format(ref_distr))
+        if beta > 0:
+            beta = np.exp(np.round(np.log(beta)*self.beta_resolution) /
+                          self.beta_resolution)
+        n_ref = int(2**np.round(np.log2(max(n, 2))))
+        return family, float(beta), n_ref
+
+    def ref_dips(self, ref_distr, n, N_bootstrap=1000, seed=None, n_jobs=1,
+                 chunk_size=100):
+        '''
+            Sorted reference dips for samples of size n, simulated and
+            stored on the first request for their key. Rescaling to n
+            copies the stored dips; pval compares against them in place.
+        '''
+        dips, n_ref = self._stored_dips(ref_distr, n, N_bootstrap, seed,
+                                        n_jobs, chunk_size)
+        return transform_dip_to_other_nbr_pts(dips, n_ref, n)
+
+    def pval(self, dip, ref_distr, n, N_bootstrap=1000, seed=None, n_jobs=1,
+             chunk_size=100):
+        '''
+            Fraction of reference dips larger than dip.
+        '''
+        dips, n_ref = self._stored_dips(ref_distr, n, N_bootstrap, seed,
+                                        n_jobs, chunk_size)
+        # rescale the dip to n_ref rather than the memory-mapped dips to n
+        dip = transform_dip_to_other_nbr_pts(dip, n, n_ref)
+        return (len(dips) - np.searchsorted(dips, dip, side='right'))*1./len(dips)
+
+    def clear(self):
+        self._loaded.clear()
+        for fname in self._entries():
+            os.remove(fname)
+
+    def _stored_dips(self, ref_distr, n, N_bootstrap, seed, n_jobs,
+                     chunk_size):
+        '''
+            Sorted reference dips of the bucket of n, memory-mapped, and the
+            bucket size n_ref.
+        '''
+        family, beta, n_ref = self.key(ref_distr, n)
+        fname = os.path.join(self.directory, '{}_{:.6g}_{}_{}.npy'.format(
+            family, beta, n_ref, N_bootstrap))
+        dips = self._loaded.get(fname)
+        if dips is None:
+            try:
+                dips = np.load(fname, mmap_mode='r')
+            except FileNotFoundError:
+                ref = {'gaussian': RefGaussian, 'beta': RefBeta,
+                       'studentt': RefStudentt}[family]
+                ref = ref() if family == 'gaussian' else ref(beta)
+                dips = np.sort(bootstrap_ref_dips(ref, n_ref, N_bootstrap,
+                                                  seed, n_jobs, chunk_size))
+                tmp = fname + '.{}.tmp'.format(os.getpid())
+                with open(tmp, 'wb') as f:
+                    np.save(f, dips)
+                os.replace(tmp, fname)
+                self._evict()
+        self._touch(fname, dips)
+        return dips, n_ref
+
+    def _entries(self):
+        return [os.path.join(self.directory, f)
+                for f in os.listdir(self.directory) if f.endswith('.npy')]
+
+    def _touch(self, fname, dips):
+        self._loaded[fname] = dips
+        self._loaded.move_to_end(fname)
+        while len(self._loaded) > self.max_entries:
+            self._loaded.popitem(last=False)
+        try:
+            os.utime(fname)
+        except FileNotFoundError:
+            # evicted by another process; the loaded dips stay valid
+            pass
+
+    def _evict(self):
+        '''
+            Remove the least recently used entries over max_entries.
+        '''
+        entries = self._entries()
+        if len(entries) > self.max_entries:
+            entries.sort(key=os.path.getmtime)
+            for old in entries[:len(entries)-self.max_entries]:
+                self._loaded.pop(old, None)
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    pass
+
 
 def select_calibration_distribution(d_hat):
     # data_dir = os.path.join('.', 'data')
@@ -1144,20 +1815,23 @@ def select_calibration_distribution(d_hat):
     return RefStudentt(beta)
 
 class RefGaussian(object):
-    def sample(self, n):
-        return np.random.randn(n)
+    def sample(self, n, rng=None):
+        rng = np.random.default_rng(rng)
+        return rng.standard_normal(n)
 
 class RefBeta(object):
     def __init__(self, beta):
         self.beta = beta
 
-    def sample(self, n):
-        return np.random.beta(self.beta, self.beta, n)
+    def sample(self, n, rng=None):
+        rng = np.random.default_rng(rng)
+        return rng.beta(self.beta, self.beta, n)
 
 class RefStudentt(object):
     def __init__(self, beta):
         self.beta = beta
 
-    def sample(self, n):
+    def sample(self, n, rng=None):
+        rng = np.random.default_rng(rng)
         dof = 2*self.beta-1
-        return 1./np.sqrt(dof)*np.random.standard_t(dof, n)
+        return 1./np.sqrt(dof)*rng.standard_t(dof, n)
@@ -6,14 +6,25 @@ research papers.
 __author__ = "Tom Pollard <tpollard@mit.edu>, Alistair Johnson, Jesse Raffa"
 __version__ = "0.6.6"
 
+import ast
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+import io
+import math
+import operator
+import os
+import re
+import tokenize
+from types import MappingProxyType
 import warnings
 
 import numpy as np
 import pandas as pd
-from scipy import stats
+from scipy import special, stats
 from statsmodels.stats import multitest
 from tabulate import tabulate
 
+from tableone_modified.cache import ResultCache, fingerprint
 import tableone_modified.modality as modality
 
 # display deprecation warnings
@@ -27,6 +38,178 @@ class InputError(Exception):
     pass
 
 
+class _GroupStats(object):
+    """
+    Mergeable summary of the rows of one group, accumulated chunk by chunk.
+
+    Continuous columns keep their count, mean, sum of squared deviations
+    from the mean, extrema and a quantile sketch, or all their values if
+    exact. The reported mean is read from a compensated sum of the values,
+    so it does not depend on how the rows were split into chunks.
+    Categorical columns keep the count of each label and of nulls.
+    """
+
+    def __init__(self, n_cont, n_cat, sketch_size, exact=False):
+        self.size = 0
+        self.count = np.zeros(n_cont, dtype=np.int64)
+        self.mean = np.zeros(n_cont)
+        self.m2 = np.zeros(n_cont)
+        # running sum and its rounding error, as in Neumaier's summation
+        self.sum = np.zeros(n_cont)
+        self.sum_err = np.zeros(n_cont)
+        self.min = np.full(n_cont, np.nan)
+        self.max = np.full(n_cont, np.nan)
+        if exact:
+            self.sketches = None
+            self.blocks = [np.zeros((0, n_cont))]
+        else:
+            self.sketches = [modality.QuantileSketch(sketch_size, seed=0)
+                             for i in range(n_cont)]
+        self.labels = [{} for i in range(n_cat)]
+        self.nulls = np.zeros(n_cat, dtype=np.int64)
+
+    def update_cont(self, block):
+        """
+        Add the rows of a block of continuous data, one column per variable.
+        """
+        nan = np.isnan(block)
+        n = np.sum(~nan, axis=0)
+        # reductions over the non-null values, without the warnings of the
+        # nan-aware reductions on empty columns
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(n > 0, np.where(nan, 0, block).sum(axis=0) / n, 0)
+        m2 = np.sum(np.where(nan, 0, block - mean) ** 2, axis=0)
+        self.min = np.fmin(self.min,
+                           np.fmin.reduce(block, axis=0, initial=np.nan))
+        self.max = np.fmax(self.max,
+                           np.fmax.reduce(block, axis=0, initial=np.nan))
+        # pairwise update of Chan, Golub and LeVeque
+        total = self.count + n
+        delta = mean - self.mean
+        frac = np.divide(n, total, out=np.zeros(len(n)), where=total > 0)
+        self.mean = self.mean + delta * frac
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * frac
+        self.count = total
+        chunk_sum = np.array([math.fsum(column[~isnan])
+                              for column, isnan in zip(block.T, nan.T)])
+        running = self.sum + chunk_sum
+        self.sum_err += np.where(
+            np.abs(self.sum) >= np.abs(chunk_sum),
+            (self.sum - running) + chunk_sum,
+            (chunk_sum - running) + self.sum)
+        self.sum = running
+        if self.sketches is None:
+            self.blocks.append(block)
+        else:
+            for sketch, column in zip(self.sketches, block.T):
+                sketch.update(column)
+
+    def values(self):
+        """
+        All continuous values kept, in the order they were added.
+        """
+        if len(self.blocks) > 1:
+            self.blocks = [np.concatenate(self.blocks)]
+        return self.blocks[0]
+
+    def update_cat(self, j, codes, labels):
+        """
+        Add the codes of categorical variable j, -1 for nulls.
+        """
+        freq = np.bincount(codes + 1, minlength=len(labels) + 1)
+        self.nulls[j] += freq[0]
+        counts = self.labels[j]
+        for label, f in zip(labels, freq[1:]):
+            if f:
+                counts[label] = counts.get(label, 0) + f
+
+    def describe(self, ddof):
+        """
+        Summarise each continuous column, as TableOne._describe_block.
+        """
+        n = self.count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(np.where(n > ddof, self.m2 / (n - ddof), np.nan))
+            var = np.where(n > 1, self.m2 / (n - 1), np.nan)
+            mean = np.where(n > 0, (self.sum + self.sum_err) / n, np.nan)
+        return {'count': n,
+                'mean': mean,
+                'var': var,
+                'median': np.array([s.quantile(0.5) for s in self.sketches]),
+                'std': std,
+                'q25': np.array([s.quantile(0.25) for s in self.sketches]),
+                'q75': np.array([s.quantile(0.75) for s in self.sketches]),
+                'min': self.min,
+                'max': self.max}
+
+
+def _frozen(value):
+    """
+    Read-only copy of a dict argument, with the lists in it made tuples.
+    Other values are returned unchanged.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType(dict(
+            (k, tuple(v) if isinstance(v, list) else v)
+            for k, v in value.items()))
+    return value
+
+
+def _thawed(value):
+    """
+    Private, changeable copy of a value made by _frozen.
+    """
+    if isinstance(value, MappingProxyType):
+        return dict((k, list(v) if isinstance(v, tuple) else v)
+                    for k, v in value.items())
+    return value
+
+
+def _describe_columns(task):
+    """
+    Describe a block of continuous columns in a worker process.
+
+    The values of all continuous columns, in group order, are read from
+    shared memory. Returns the summary of each group and the
+    Kruskal-Wallis P-Values of the requested columns of the block.
+    """
+    name, shape, columns, bounds, ddof, ranked = task
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        values = np.ndarray(shape, dtype=float, buffer=shm.buf)[:, columns]
+    finally:
+        shm.close()
+    table = TableOne.__new__(TableOne)
+    table._ddof = ddof
+    nan = np.isnan(values)
+    describe = [table._describe_block(values[lo:hi], nan[lo:hi])
+                for lo, hi in zip(bounds[:-1], bounds[1:])]
+    codes = np.repeat(np.arange(-1, len(bounds) - 1), np.diff(bounds,
+                                                              prepend=0))
+    kruskal = {}
+    for j in ranked:
+        n = np.array([d['count'][j] for d in describe])
+        if n.min() > 0:
+            kruskal[j] = table._kruskal(values[:, j], codes, n)
+    return describe, kruskal
+
+
+def _count_columns(task):
+    """
+    Count the levels of a block of categorical columns in a worker process.
+
+    The group code of each row is read from shared memory.
+    """
+    name, n_rows, data, n_groups = task
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        group_codes = np.ndarray(n_rows, dtype=np.intp, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+    table = TableOne.__new__(TableOne)
+    return table._count_levels(data, group_codes, n_groups)
+
+
 class TableOne(object):
     """
 
@@ -86,8 +269,9 @@ class TableOne(object):
         Specify an order for categorical variables. Key is the variable, value
         is a list of values in order.  {e.g. 'sex': ['f', 'm', 'other']}
     remarks : bool, optional
-        Add remarks on the appropriateness of the summary measures and the
-        statistical tests (default: True).
+        Add the diagnostics columns to cont_describe (default: True). The
+        printed table always ends with remarks on the appropriateness of
+        the summary measures and the statistical tests.
     label_suffix : bool, optional
         Append summary type (e.g. "mean (SD); median [Q1,Q3], n (%); ") to the
         row label (default: False).
@@ -98,55 +282,515 @@ class TableOne(object):
         variables. For continuous variables, applies to all summary statistics
         (e.g. mean and standard deviation). For categorical variables, applies
         to percentage only.
+    n_jobs : int, optional
+        Number of worker processes that summarise and test blocks of columns
+        in parallel, -1 for one per CPU (default: 1, no workers).
+    cache : bool, str or ResultCache, optional
+        On-disk cache of finished tables: True for the default directory, or
+        a directory (default: None, no cache). A table of the same columns
+        and arguments is read from the cache instead of being computed.
 
     Attributes
     ----------
     tableone : dataframe
         Summary of the data (i.e., the "Table 1").
+    diagnostics : dataframe
+        Dip test, outlier counts and normality test for each continuous
+        variable and group. Computed on first access, including by printing
+        the table or, with remarks=True, by reading cont_describe.
     """
 
+    # number of Fisher's exact tests above which they run in worker processes
+    _exact_pool_min = 64
+
     def __init__(self, data, columns=None, categorical=None, groupby=None,
                  nonnormal=None, pval=False, pval_adjust=None, isnull=None,
                  missing=True, ddof=1, labels=None, rename=None, sort=False,
                  limit=None, order=None, remarks=True, label_suffix=False,
-                 decimals=1,reverse_missing=False):
+                 decimals=1,reverse_missing=False, n_jobs=1, cache=None):
+
+        options = dict(columns=columns, categorical=categorical,
+                       groupby=groupby, nonnormal=nonnormal, pval=pval,
+                       pval_adjust=pval_adjust, isnull=isnull,
+                       missing=missing, ddof=ddof, labels=labels,
+                       rename=rename, sort=sort, limit=limit, order=order,
+                       remarks=remarks, label_suffix=label_suffix,
+                       decimals=decimals, reverse_missing=reverse_missing)
+
+        if cache is True:
+            cache = ResultCache()
+        elif cache is not None and not isinstance(cache, ResultCache):
+            cache = ResultCache(cache)
+        if cache is not None:
+            key = self._cache_key(data, options)
+            frames, meta = cache.load(key)
+            if frames is not None:
+                self._load_cached(data, options, frames, meta)
+                return
+
+        self._set_options(data, n_jobs=n_jobs, **options)
+        self._create(data)
+
+        if cache is not None:
+            cache.store(key, self._cached_frames(),
+                        {'categorical': self._categorical,
+                         'groupbylvls': self._groupbylvls})
+
+    def _create(self, data):
+        """
+        Create the tables from the data, once the arguments are set.
+        """
+        if self._groupby:
+            self._groupbylvls = self._group_levels(data[self._groupby])
+        else:
+            self._groupbylvls = ['Overall']
+        self._check_group_levels()
 
-        # labels is now rename
-        if labels is not None and rename is not None:
-            raise TypeError("TableOne received both labels and rename.")
-        elif labels is not None:
-            warnings.warn("The labels argument is deprecated; use " +
-                          "rename instead.", DeprecationWarning)
-            self._alt_labels = labels
+        # numeric data shared by all the tables below
+        self._create_numeric_block(data)
+        self._create_tables()
+
+    def _cache_key(self, data, options):
+        """
+        Fingerprint the columns the table reads and the arguments.
+        """
+        columns = options['columns']
+        columns = list(columns) if columns else list(data.columns)
+        groupby = options['groupby']
+        if isinstance(groupby, list):
+            groupby = groupby[0] if groupby else None
+        if groupby and groupby not in columns:
+            columns.append(groupby)
+        arguments = dict(options, columns=columns, version=__version__)
+        return fingerprint(data, columns, sorted(arguments.items()))
+
+    def _cached_frames(self):
+        """
+        The finished tables, by attribute name.
+        """
+        names = ['tableone', '_cont_describe', 'cat_describe', 'cont_table',
+                 'cat_table', '_significance_table']
+        frames = dict((name, getattr(self, name)) for name in names
+                      if hasattr(self, name))
+        # the remarks of a cached table need its diagnostics
+        if self._continuous and self._cont_values is not None:
+            frames['_diagnostics'] = self.diagnostics
+        return frames
+
+    def _load_cached(self, data, options, frames, meta):
+        """
+        Set the finished tables from the cache, without computing them.
+        """
+        options = dict(options, categorical=meta['categorical'])
+        self._set_options(data, **options)
+        self._groupbylvls = meta['groupbylvls']
+        self._cont_values = None
+        self._diagnostics = None
+        self._cont_describe_full = None
+        for name, frame in frames.items():
+            setattr(self, name, frame)
+        self._wrap_dataframe_methods()
+
+    @classmethod
+    def from_chunks(cls, chunks, columns=None, categorical=None, groupby=None,
+                    nonnormal=None, pval=False, pval_adjust=None,
+                    isnull=None, missing=True, ddof=1, labels=None,
+                    rename=None, sort=False, limit=None, order=None,
+                    label_suffix=False, decimals=1, reverse_missing=False,
+                    quantiles='sketch', sketch_size=65536):
+        """
+        Create TableOne from a sequence of DataFrames, such as the chunks of
+        pd.read_csv(..., chunksize=n), holding one chunk in memory at a time.
+        More rows can be added later with update.
+
+        Counts, means, standard deviations, extrema and the frequencies of
+        categorical levels are merged exactly across chunks, and the
+        P-Values are computed from these. With quantiles='sketch', medians
+        and quartiles come from a mergeable quantile sketch per variable
+        and group; they are exact while there are at most sketch_size
+        values. The Kruskal-Wallis test and the diagnostics need all values
+        at once and are not available. With quantiles='exact', the
+        continuous values are kept and the order statistics, the
+        Kruskal-Wallis test and the diagnostics are recomputed from them.
+        If categorical is not specified, it is detected from the first
+        chunk.
+
+        Parameters
+        ----------
+            chunks : iterable of pandas DataFrame
+                The input dataset, in chunks with the same columns.
+            quantiles : str, default 'sketch'
+                How medians and quartiles are kept, 'sketch' or 'exact'.
+            sketch_size : int, default 65536
+                Capacity of each level of the quantile sketches.
+
+        The other parameters are as for TableOne.
+
+        Returns
+        ----------
+            table : TableOne
+                The table, laid out as for the data in a single DataFrame.
+        """
+        if quantiles not in ['sketch', 'exact']:
+            raise InputError("quantiles must be 'sketch' or 'exact'.")
+        chunks = iter(chunks)
+        first = next(chunks, None)
+        if first is None:
+            raise InputError('No chunks of data were given.')
+
+        self = cls.__new__(cls)
+        self._set_options(first, columns=columns, categorical=categorical,
+                          groupby=groupby, nonnormal=nonnormal, pval=pval,
+                          pval_adjust=pval_adjust, isnull=isnull,
+                          missing=missing, ddof=ddof, labels=labels,
+                          rename=rename, sort=sort, limit=limit, order=order,
+                          remarks=False, label_suffix=label_suffix,
+                          decimals=decimals, reverse_missing=reverse_missing)
+
+        # values to order by, before they are checked against the table
+        self._chunk_order = self._order and dict(
+            (k, list(v)) for k, v in self._order.items())
+        self._chunk_exact = quantiles == 'exact'
+        self._chunk_sketch_size = sketch_size
+        self._chunk_stats = {}
+        self._chunk_categories = None
+        self._n_rows = 0
+        self._missing = pd.Series(0, index=pd.Index(
+            self._continuous + self._categorical, name='variable'))
+        self._value_counts = dict((k, pd.Series(dtype=np.int64))
+                                  for k in self._categorical)
+        self._update_chunk(first)
+        for data in chunks:
+            self._update_chunk(data)
+        self._finish_chunks()
+        self._create_tables()
+        return self
+
+    def update(self, data):
+        """
+        Add rows to a table created with from_chunks, and refresh tableone,
+        cont_describe and cat_describe.
+
+        Only the new rows are summarised; the tables and P-Values are
+        recreated from the merged summaries. With quantiles='exact' the
+        order statistics are recomputed from all values kept.
+
+        Parameters
+        ----------
+            data : pandas DataFrame
+                The new rows, with the same columns as the earlier chunks.
+
+        Returns
+        ----------
+            table : TableOne
+                The updated table.
+        """
+        if getattr(self, '_chunk_stats', None) is None:
+            raise InputError('Only a table created with ' +
+                             'TableOne.from_chunks can be updated.')
+        self._update_chunk(data)
+        self._finish_chunks()
+        if self._chunk_order:
+            self._order = dict((k, list(v))
+                               for k, v in self._chunk_order.items())
+        self._create_tables()
+        return self
+
+    @classmethod
+    def stratified(cls, data, groupby, columns=None, categorical=None,
+                   nonnormal=None, pval=False, pval_adjust=None, isnull=None,
+                   missing=True, ddof=1, labels=None, rename=None, sort=False,
+                   limit=None, order=None, remarks=True, label_suffix=False,
+                   decimals=1, reverse_missing=False, combine=False):
+        """
+        Create TableOne for several stratifications of the same data.
+
+        The data is encoded once: continuous columns are coerced, null
+        values counted, and the levels of the categorical columns counted
+        in each cell of the finest cross-classification of all the groupby
+        columns. The group sizes and level counts of each stratification
+        are merged from those of its cells; its continuous summaries are
+        computed from the rows of its cells in the shared numeric block.
+
+        Parameters
+        ----------
+            data : pandas DataFrame
+                The input dataset.
+            groupby : list
+                The stratifications: None for the overall table, a column,
+                or a tuple of columns for their crossing.
+            combine : bool, default False
+                Return the tables side by side in a single DataFrame.
+
+        The other parameters are as for TableOne. P-Values are not computed
+        for the overall table.
+
+        Returns
+        ----------
+            tables : dict or pandas DataFrame
+                The TableOne of each stratification, keyed as in groupby,
+                or the combined table if combine is True.
+        """
+        strata = [() if s is None else (s,) if isinstance(s, str)
+                  else tuple(s) for s in groupby]
+        by = list(dict.fromkeys(c for s in strata for c in s))
+        options = dict(columns=columns, categorical=categorical,
+                       nonnormal=nonnormal, pval_adjust=pval_adjust,
+                       isnull=isnull, missing=missing, ddof=ddof,
+                       labels=labels, rename=rename, sort=sort, limit=limit,
+                       remarks=remarks, label_suffix=label_suffix,
+                       decimals=decimals, reverse_missing=reverse_missing)
+        if not by and pval:
+            raise InputError("If pval=True then groupby must be specified.")
+
+        # variables of the overall table, a superset of each stratification
+        shared = cls.__new__(cls)
+        shared._set_options(data, order=order, **options)
+        continuous = [c for c in shared._continuous
+                      if any(c not in s for s in strata)]
+        categorical = shared._categorical
+        values = shared._coerce_continuous(data, continuous)
+        null_counts = data[continuous + categorical].isnull().sum()
+        null_counts.index = null_counts.index.rename('variable')
+        if limit:
+            value_counts = dict(
+                (k, data[k].value_counts().sort_values(ascending=False))
+                for k in categorical)
+
+        # cells of the finest cross-classification, -1 codes for nulls
+        levels = [shared._group_levels(data[c]) for c in by]
+        codes = np.array([pd.Categorical(data[c], categories=lv).codes
+                          for c, lv in zip(by, levels)], dtype=np.intp)
+        cell = np.ravel_multi_index(codes + 1, [len(lv) + 1 for lv in levels])
+        cells, cell_ids = np.unique(cell, return_inverse=True)
+        cell_codes = np.array(np.unravel_index(
+            cells, [len(lv) + 1 for lv in levels]), dtype=np.intp) - 1
+        variables = sorted(categorical)
+        slot_var, slot_label, cell_counts = shared._count_levels(
+            data[variables], cell_ids, len(cells))
+
+        tables = {}
+        for key, stratum in zip(groupby, strata):
+            table = cls.__new__(cls)
+            table._set_options(data, groupby=stratum and stratum[0],
+                               pval=pval and bool(stratum),
+                               order=order and dict((k, list(v))
+                                                    for k, v in order.items()),
+                               **options)
+            table._groupby = ', '.join(stratum)
+            table._continuous = [c for c in continuous if c not in stratum]
+
+            # group of each cell, -1 if any of its columns is null
+            if stratum:
+                parts = cell_codes[[by.index(c) for c in stratum]]
+                valid = (parts >= 0).all(axis=0)
+                cell_group = np.full(len(cells), -1, dtype=np.intp)
+                if len(stratum) == 1:
+                    table._groupbylvls = levels[by.index(stratum[0])]
+                    cell_group[valid] = parts[0, valid]
+                else:
+                    # observed combinations, labelled e.g. 'F, yes'
+                    combos, inverse = np.unique(parts[:, valid].T, axis=0,
+                                                return_inverse=True)
+                    names = [', '.join('{}'.format(levels[by.index(c)][i])
+                                       for c, i in zip(stratum, combo))
+                             for combo in combos]
+                    table._groupbylvls = sorted(names)
+                    rank = np.array([table._groupbylvls.index(name)
+                                     for name in names], dtype=np.intp)
+                    cell_group[valid] = rank[inverse.reshape(-1)]
+            else:
+                table._groupbylvls = ['Overall']
+                cell_group = np.zeros(len(cells), dtype=np.intp)
+            table._check_group_levels()
+
+            # merge the cells of each group
+            n_groups = len(table._groupbylvls)
+            merge = np.zeros((n_groups, len(cells)), dtype=np.int64)
+            merge[cell_group[cell_group >= 0],
+                  np.flatnonzero(cell_group >= 0)] = 1
+            table._encode_groups(cell_group[cell_ids])
+            table._cont_values = np.ascontiguousarray(
+                values[:, [continuous.index(c) for c in table._continuous]]
+                [table._group_order])
+            table._cont_nan = np.isnan(table._cont_values)
+            table._missing = null_counts[table._continuous + categorical]
+            table._n_rows = len(data)
+            table._cont_kruskal = {}
+            table._cont_stats = [table._describe_block(block, nan)
+                                 for block, nan in table._group_blocks()]
+            table._cat_counts = (variables, slot_var, slot_label,
+                                 merge @ cell_counts)
+            if limit:
+                table._value_counts = value_counts
+            table._create_tables()
+            tables[key] = table
+
+        if not combine:
+            return tables
+        frames = []
+        for table in tables.values():
+            frame = table.tableone
+            if frame.columns.nlevels == 1:
+                frame = pd.concat({'Overall': frame}, axis=1)
+            frames.append(frame)
+        return pd.concat(frames, axis=1).fillna('')
+
+    def _update_chunk(self, data):
+        """
+        Add a chunk of data to the summaries of each group.
+
+        Parameters
+        ----------
+            data : pandas DataFrame
+                A chunk of the input dataset.
+        """
+        if self._groupby:
+            groupby = data[self._groupby]
+            if isinstance(groupby.dtype, pd.CategoricalDtype):
+                if self._chunk_categories is None:
+                    self._chunk_categories = set()
+                if self._chunk_categories is not False:
+                    self._chunk_categories.update(groupby.cat.categories)
+            else:
+                self._chunk_categories = False
+            codes, keys = pd.factorize(groupby)
+            keys = list(keys) + [None]
         else:
-            self._alt_labels = rename
+            codes, keys = np.zeros(len(data), dtype=np.intp), ['Overall']
 
-        # isnull is now missing
-        if isnull is not None:
-            warnings.warn("The isnull argument is deprecated; use " +
-                          "missing instead.", DeprecationWarning)
-            self._isnull = isnull
+        # coerce continuous data to numeric
+        cont_data = data[self._continuous].apply(pd.to_numeric,
+                                                 errors='coerce')
+        # check all data in each continuous column is numeric
+        bad_cols = cont_data.count() != data[self._continuous].count()
+        bad_cols = cont_data.columns[bad_cols]
+        if len(bad_cols) > 0:
+            raise InputError("The following continuous column(s) have " +
+                             "non-numeric values: {}. Either specify the " +
+                             "column(s) as categorical or remove the " +
+                             "non-numeric values.""".format(bad_cols.values))
+        values = cont_data.to_numpy(dtype=float)
+        cat_codes = [self._factorize_cat(data[v].values)
+                     for v in self._categorical]
+
+        for i, key in enumerate(keys):
+            # rows without a group have code -1, the last key
+            rows = codes == (i if key is not None else -1)
+            if not rows.any():
+                continue
+            if key not in self._chunk_stats:
+                self._chunk_stats[key] = _GroupStats(
+                    len(self._continuous), len(self._categorical),
+                    self._chunk_sketch_size, self._chunk_exact)
+            group = self._chunk_stats[key]
+            group.size += np.count_nonzero(rows)
+            group.update_cont(values[rows])
+            for j, (c, labels) in enumerate(cat_codes):
+                group.update_cat(j, c[rows], labels)
+
+        self._n_rows += len(data)
+        columns = self._continuous + self._categorical
+        self._missing += data[columns].isnull().sum().values
+        if self._limit:
+            for k in self._categorical:
+                self._value_counts[k] = self._value_counts[k].add(
+                    data[k].value_counts(), fill_value=0).astype(np.int64)
+
+    def _finish_chunks(self):
+        """
+        Set the group levels and the summaries the tables are created from,
+        as _create_numeric_block does for data in memory.
+        """
+        stats = self._chunk_stats
+        if not self._groupby:
+            self._groupbylvls = ['Overall']
+        elif self._chunk_categories:
+            # unused categories are kept as (empty) levels
+            self._groupbylvls = sorted(self._chunk_categories)
         else:
-            self._isnull = missing
+            self._groupbylvls = sorted(k for k in stats if k is not None)
+        self._check_group_levels()
 
-        # groupby should be a string
-        if not groupby:
-            groupby = ''
-        elif groupby and type(groupby) == list:
-            groupby = groupby[0]
+        # check for coerced column containing all NaN to warn user
+        for column in self._continuous:
+            if self._missing[column] == self._n_rows:
+                self._non_continuous_warning(column)
+
+        empty = _GroupStats(len(self._continuous), len(self._categorical), 1,
+                            self._chunk_exact)
+        groups = [stats.get(g, empty) for g in self._groupbylvls]
+        self._group_sizes = np.array([g.size for g in groups])
+        self._cont_kruskal = {}
+        if self._chunk_exact:
+            # the kept values, as the numeric block of data in memory
+            self._group_codes = np.repeat(np.arange(len(groups)),
+                                          self._group_sizes)
+            self._group_order = np.arange(len(self._group_codes))
+            self._group_bounds = np.r_[0, np.cumsum(self._group_sizes)]
+            self._cont_values = np.ascontiguousarray(
+                np.concatenate([g.values() for g in groups]))
+            self._cont_nan = np.isnan(self._cont_values)
+            self._cont_stats = [self._describe_block(block, nan)
+                                for block, nan in self._group_blocks()]
+        else:
+            self._cont_values = None
+            self._cont_stats = [g.describe(self._ddof) for g in groups]
+
+        # one slot per level of each variable, plus one for nulls
+        variables = sorted(self._categorical)
+        slot_var, slot_label = [np.zeros(0, dtype=int)], [np.zeros(0, object)]
+        columns = [np.zeros((len(groups), 0), dtype=np.int64)]
+        for v in variables:
+            j = self._categorical.index(v)
+            labels = sorted(set().union(*[s.labels[j] for s in stats.values()]))
+            slot_var.append(np.full(len(labels) + 1, variables.index(v)))
+            slot_label.append(np.array(labels + [None], dtype=object))
+            columns.append(np.array(
+                [[g.labels[j].get(label, 0) for label in labels] + [g.nulls[j]]
+                 for g in groups], dtype=np.int64).reshape(len(groups), -1))
+        self._cat_counts = (variables, np.concatenate(slot_var),
+                            np.concatenate(slot_label),
+                            np.concatenate(columns, axis=1))
 
-        # nonnormal should be a string
-        if not nonnormal:
-            nonnormal = []
-        elif nonnormal and type(nonnormal) == str:
-            nonnormal = [nonnormal]
+        if self._limit:
+            self._value_counts = dict(
+                (k, c.sort_values(ascending=False))
+                for k, c in self._value_counts.items())
+
+    def _set_options(self, data, **options):
+        """
+        Check the arguments of TableOne against the data and store them.
 
+        Parameters
+        ----------
+            data : pandas DataFrame
+                The input dataset, or its first chunk.
+
+        The other parameters are as for TableOneSpec.
+        """
+        self._apply_spec(data, TableOneSpec(**options))
+
+    def _apply_spec(self, data, spec):
+        """
+        Check a compiled TableOneSpec against the data and store a private
+        copy of its arguments, which the table may then change.
+
+        Parameters
+        ----------
+            data : pandas DataFrame
+                The input dataset, or its first chunk.
+            spec : TableOneSpec
+                The compiled arguments.
+        """
         # if the input dataframe is empty, raise error
         if data.empty:
             raise InputError('The input dataframe is empty.')
 
         # if columns are not specified, use all columns
-        if not columns:
+        if spec.columns:
+            columns = list(spec.columns)
+        else:
             columns = data.columns.values
 
         # check that the columns exist in the dataframe
@@ -162,34 +806,32 @@ class TableOne(object):
                              "columns: {}".format(dups))
 
         # if categorical not specified, try to identify categorical
-        if not categorical and type(categorical) != list:
+        if spec.categorical is None:
             categorical = self._detect_categorical_columns(data[columns])
+        else:
+            categorical = list(spec.categorical)
 
-        # ensure that values to order are strings
-        if order:
-            for k in order:
-                order[k] = ["{}".format(v) for v in order[k]]
-
-        if pval and not groupby:
-            raise InputError("If pval=True then groupby must be specified.")
-
+        groupby = spec.groupby
         self._columns = list(columns)
         self._continuous = [c for c in columns if c not in categorical + [groupby]]
         self._categorical = categorical
-        self._nonnormal = nonnormal
-        self._pval = pval
-        self._pval_adjust = pval_adjust
-        self._sort = sort
+        self._nonnormal = list(spec.nonnormal)
+        self._alt_labels = _thawed(spec.rename)
+        self._isnull = spec.missing
+        self._pval = spec.pval
+        self._pval_adjust = spec.pval_adjust
+        self._sort = spec.sort
         self._groupby = groupby
         # degrees of freedom for standard deviation
-        self._ddof = ddof
-        self._limit = limit
-        self._order = order
-        self._remarks = remarks
-        self._label_suffix = label_suffix
-        self._decimals = decimals
+        self._ddof = spec.ddof
+        self._limit = _thawed(spec.limit)
+        self._order = _thawed(spec.order)
+        self._remarks = spec.remarks
+        self._label_suffix = spec.label_suffix
+        self._decimals = _thawed(spec.decimals)
+        self._n_jobs = spec.n_jobs
         
-        self._reverse_missing = reverse_missing
+        self._reverse_missing = spec.reverse_missing
         
         if self._reverse_missing:
             self._missing_string = 'Count'
@@ -199,19 +841,33 @@ class TableOne(object):
         # output column names that cannot be contained in a groupby
         self._reserved_columns = [self._missing_string, 'P-Value', 'Test',
                                   'P-Value (adjusted)']
-        if self._groupby:
-            self._groupbylvls = sorted(data.groupby(groupby).groups.keys())
-            # check that the group levels do not include reserved words
-            for level in self._groupbylvls:
-                if level in self._reserved_columns:
-                    raise InputError('Group level contains "{}", a reserved' +
-                                     ' keyword.'.format(level))
-        else:
-            self._groupbylvls = ['Overall']
 
+    def _group_levels(self, groupby):
+        """
+        Sorted levels of a groupby column. Unused categories of a
+        categorical column are kept as (empty) levels.
+        """
+        if isinstance(groupby.dtype, pd.CategoricalDtype):
+            return sorted(groupby.cat.categories)
+        return sorted(groupby.dropna().unique())
+
+    def _check_group_levels(self):
+        """
+        Check that the group levels do not include reserved words.
+        """
+        for level in self._groupbylvls:
+            if level in self._reserved_columns:
+                raise InputError('Group level contains "{}", a reserved' +
+                                 ' keyword.'.format(level))
+
+    def _create_tables(self):
+        """
+        Create the significance, descriptive and display tables from the
+        summaries of the data.
+        """
         # forgive me jraffa
         if self._pval:
-            self._significance_table = self._create_significance_table(data)
+            self._significance_table = self._create_significance_table()
 
         # correct for multiple testing
         if self._pval and self._pval_adjust:
@@ -222,21 +878,61 @@ class TableOne(object):
             self._significance_table['P-Value (adjusted)'] = adjusted[1]
             self._significance_table['adjust method'] = self._pval_adjust
 
+        self._diagnostics = None
+        self._cont_describe_full = None
+        self._render_tables()
+
+    def _render_tables(self):
+        """
+        Create the descriptive and display tables from the numeric results.
+        """
         # create descriptive tables
         if self._categorical:
-            self.cat_describe = self._create_cat_describe(data)
-            self.cat_table = self._create_cat_table(data)
+            self.cat_describe = self._create_cat_describe()
+            self.cat_table = self._create_cat_table()
 
         # create continuous tables
         if self._continuous:
-            self.cont_describe = self._create_cont_describe(data)
-            self.cont_table = self._create_cont_table(data)
+            self.cont_describe = self._create_cont_describe()
+            self.cont_table = self._create_cont_table()
 
         # combine continuous variables and categorical variables into table 1
-        self.tableone = self._create_tableone(data)
+        self.tableone = self._create_tableone()
         # self._remarks_str = self._generate_remark_str()
+        self._wrap_dataframe_methods()
 
-        # wrap dataframe methods
+    def render(self, decimals=None, label_suffix=None):
+        """
+        Display the table with other options, reusing the computed
+        statistics and tests.
+
+        Parameters
+        ----------
+            decimals : int or dict, optional
+                Number of decimal places to display, as for TableOne.
+            label_suffix : bool, optional
+                Append the summary type to the row labels.
+
+        Returns
+        ----------
+            table : TableOne
+                The table, with tableone, cont_describe and cat_describe
+                rendered again.
+        """
+        if getattr(self, '_cont_stats', None) is None:
+            raise InputError('A table read from the cache keeps no ' +
+                             'statistics to render again.')
+        if decimals is not None:
+            self._decimals = decimals
+        if label_suffix is not None:
+            self._label_suffix = label_suffix
+        self._render_tables()
+        return self
+
+    def _wrap_dataframe_methods(self):
+        """
+        Expose the output methods of the tableone DataFrame.
+        """
         self.head = self.tableone.head
         self.tail = self.tableone.tail
         self.to_csv = self.tableone.to_csv
@@ -289,6 +985,47 @@ class TableOne(object):
 
         return tabulate(df, headers=headers, tablefmt=tablefmt, **kwargs)
 
+    @property
+    def cont_describe(self):
+        """
+        Summary of the continuous variables. With remarks, the diagnostics
+        columns are appended, computed on first access.
+
+        The frame is built once and the same frame is returned by later
+        reads, so it can be changed in place. Setting cont_describe, or
+        rendering the table again, replaces it.
+        """
+        if self._cont_describe_full is None:
+            full = self._cont_describe
+            if self._remarks and self.diagnostics is not None:
+                # a summary set with the diagnostics already in it keeps them
+                diagnostics = self.diagnostics.loc[
+                    :, ~self.diagnostics.columns.isin(full.columns)]
+                full = pd.concat([full, diagnostics], axis=1)
+            self._cont_describe_full = full
+        return self._cont_describe_full
+
+    @cont_describe.setter
+    def cont_describe(self, value):
+        self._cont_describe = value
+        self._cont_describe_full = None
+
+    @property
+    def diagnostics(self):
+        """
+        Diagnostics of the continuous variables, computed once on demand.
+
+        Returns
+        ----------
+            df_diag : pandas DataFrame
+                Hartigan's dip test, counts of outliers and far outliers by
+                Tukey's rule, and the normality test, laid out like
+                cont_describe. None if there are no continuous variables.
+        """
+        if self._diagnostics is None and self._continuous:
+            self._diagnostics = self._create_diagnostics()
+        return self._diagnostics
+
     def _generate_remark_str(self, end_of_line='\n'):
         """
         Generate a series of remarks that the user should consider
@@ -297,27 +1034,30 @@ class TableOne(object):
         warnings = {}
         msg = '{}'.format(end_of_line)
 
-        # generate warnings for continuous variables
-        if self._continuous:
+        # generate warnings for continuous variables, if the table keeps
+        # what the diagnostics are computed from
+        if self._continuous and (self._diagnostics is not None or
+                                 self._cont_values is not None):
+            diagnostics = self.diagnostics
             # highlight far outliers
-            outlier_mask = self.cont_describe.far_outliers > 1
-            outlier_vars = list(self.cont_describe.far_outliers[outlier_mask].dropna(how='all').index)
+            outlier_mask = diagnostics.far_outliers > 1
+            outlier_vars = list(diagnostics.far_outliers[outlier_mask].dropna(how='all').index)
             if outlier_vars:
                 warnings["Warning, Tukey test indicates far " +
                          "outliers in"] = outlier_vars
 
             # highlight possible multimodal distributions using hartigan's dip
             # test -1 values indicate NaN
-            modal_mask = (self.cont_describe.diptest >= 0) & (self.cont_describe.diptest <= 0.05)
-            modal_vars = list(self.cont_describe.diptest[modal_mask].dropna(how='all').index)
+            modal_mask = (diagnostics.diptest >= 0) & (diagnostics.diptest <= 0.05)
+            modal_vars = list(diagnostics.diptest[modal_mask].dropna(how='all').index)
             if modal_vars:
                 warnings["Warning, Hartigan's Dip Test reports possible " +
                          "multimodal distributions for"] = modal_vars
 
             # highlight non normal distributions
             # -1 values indicate NaN
-            modal_mask = (self.cont_describe.normaltest >= 0) & (self.cont_describe.normaltest <= 0.001)
-            modal_vars = list(self.cont_describe.normaltest[modal_mask].dropna(how='all').index)
+            modal_mask = (diagnostics.normaltest >= 0) & (diagnostics.normaltest <= 0.001)
+            modal_vars = list(diagnostics.normaltest[modal_mask].dropna(how='all').index)
             if modal_vars:
                 warnings["Warning, test for normality reports " +
                          "non-normal distributions for"] = modal_vars
@@ -355,56 +1095,222 @@ class TableOne(object):
                 likely_cat.append(var)
         return likely_cat
 
-    def _q25(self, x):
+    def _create_numeric_block(self, data):
+        """
+        Encode the data once for all later phases.
+
+        Sets the group code of each row, the rows of each group as
+        contiguous blocks, a float64 matrix of the continuous columns in
+        that row order with its NaN mask, and the null count of each
+        column. From these it computes the summaries the tables are
+        created from: the statistics of each continuous column and the
+        level counts of each categorical column, per group.
+
+        Parameters
+        ----------
+            data : pandas DataFrame
+                The input dataset.
         """
-        Compute percentile (25th)
+        if self._groupby:
+            self._encode_groups(pd.Categorical(
+                data[self._groupby], categories=self._groupbylvls).codes)
+        else:
+            self._encode_groups(np.zeros(len(data), dtype=np.int8))
+
+        values = self._coerce_continuous(data, self._continuous)
+        self._cont_values = np.ascontiguousarray(values[self._group_order])
+        self._cont_nan = np.isnan(self._cont_values)
+
+        columns = self._continuous + self._categorical
+        self._missing = data[columns].isnull().sum()
+        self._missing.index = self._missing.index.rename('variable')
+        self._n_rows = len(data)
+
+        # summaries read by the tables
+        self._cont_kruskal = {}
+        if self._n_jobs > 1:
+            self._summarise_parallel(data)
+        else:
+            self._cont_stats = [self._describe_block(block, nan)
+                                for block, nan in self._group_blocks()]
+            self._cat_counts = self._count_categorical(data)
+        if self._limit:
+            self._value_counts = {
+                k: data[k].value_counts().sort_values(ascending=False)
+                for k in self._categorical}
+
+    def _encode_groups(self, group_codes):
         """
-        return np.nanpercentile(x.values, 25)
+        Set the group code of each row, and the row order and bounds that
+        make the rows of each group a contiguous block.
 
-    def _q75(self, x):
+        Parameters
+        ----------
+            group_codes : numpy array
+                Index of the group level of each row, -1 if missing.
         """
-        Compute percentile (75th)
+        self._group_codes = group_codes
+        # rows without a group come first, then each group in its original
+        # row order
+        self._group_order = np.argsort(group_codes, kind='stable')
+        self._group_bounds = np.searchsorted(
+            group_codes[self._group_order],
+            np.arange(len(self._groupbylvls) + 1))
+        self._group_sizes = np.diff(self._group_bounds)
+
+    def _coerce_continuous(self, data, columns):
         """
-        return np.nanpercentile(x.values, 75)
+        Coerce continuous columns to a float64 matrix, in row order.
+
+        Parameters
+        ----------
+            data : pandas DataFrame
+                The input dataset.
+            columns : list
+                The continuous columns.
 
-    def _std(self, x):
+        Returns
+        ----------
+            values : numpy array
+                Values of the columns, NaN where null.
         """
-        Compute standard deviation with ddof degrees of freedom
+        # coerce continuous data to numeric
+        cont_data = data[columns].apply(pd.to_numeric, errors='coerce')
+        # check all data in each continuous column is numeric
+        bad_cols = cont_data.count() != data[columns].count()
+        bad_cols = cont_data.columns[bad_cols]
+        if len(bad_cols) > 0:
+            raise InputError("The following continuous column(s) have " +
+                             "non-numeric values: {}. Either specify the " +
+                             "column(s) as categorical or remove the " +
+                             "non-numeric values.""".format(bad_cols.values))
+
+        # check for coerced column containing all NaN to warn user
+        for column in cont_data.columns[cont_data.count() == 0]:
+            self._non_continuous_warning(column)
+
+        return cont_data.to_numpy(dtype=float)
+
+    def _summarise_parallel(self, data):
         """
-        return np.nanstd(x.values, ddof=self._ddof)
+        Compute the summaries of the continuous and categorical columns in
+        blocks of columns, in a pool of n_jobs worker processes.
+
+        The continuous values and the group codes are passed to the workers
+        in shared memory, each worker only receives its own categorical
+        columns. The results of the blocks are merged in column order.
+        Kruskal-Wallis P-Values are computed alongside the summaries.
 
-    def _diptest(self, x):
+        Parameters
+        ----------
+            data : pandas DataFrame
+                The input dataset.
         """
-        Compute Hartigan Dip Test for modality.
+        n_groups = len(self._groupbylvls)
+        variables = sorted(self._categorical)
+        ranked = [j for j, v in enumerate(self._continuous)
+                  if self._pval and v in self._nonnormal]
+        cont_blocks = [b for b in np.array_split(
+            np.arange(len(self._continuous)), self._n_jobs) if len(b)]
+        cat_blocks = [b for b in np.array_split(
+            np.arange(len(variables)), self._n_jobs) if len(b)]
+
+        shape = self._cont_values.shape
+        values = shared_memory.SharedMemory(
+            create=True, size=max(self._cont_values.nbytes, 1))
+        codes = shared_memory.SharedMemory(
+            create=True, size=max(len(data) * np.dtype(np.intp).itemsize, 1))
+        try:
+            np.ndarray(shape, dtype=float,
+                       buffer=values.buf)[:] = self._cont_values
+            np.ndarray(len(data), dtype=np.intp,
+                       buffer=codes.buf)[:] = self._group_codes
+            with ProcessPoolExecutor(max_workers=self._n_jobs) as executor:
+                cont = executor.map(_describe_columns, [
+                    (values.name, shape, b, self._group_bounds, self._ddof,
+                     np.flatnonzero(np.isin(b, ranked)))
+                    for b in cont_blocks])
+                cat = executor.map(_count_columns, [
+                    (codes.name, len(data),
+                     data[[variables[j] for j in b]], n_groups)
+                    for b in cat_blocks])
+                cont, cat = list(cont), list(cat)
+        finally:
+            for shm in [values, codes]:
+                shm.close()
+                shm.unlink()
+
+        if cont:
+            self._cont_stats = [
+                dict((f, np.concatenate([d[g][f] for d, k in cont]))
+                     for f in cont[0][0][g])
+                for g in range(n_groups)]
+            for b, (d, kruskal) in zip(cont_blocks, cont):
+                for j, p in kruskal.items():
+                    self._cont_kruskal[b[j]] = p
+        else:
+            self._cont_stats = [self._describe_block(block, nan)
+                                for block, nan in self._group_blocks()]
+
+        if cat:
+            slot_var = np.concatenate([b[0] + slots for b, (slots, l, c)
+                                       in zip(cat_blocks, cat)])
+            slot_label = np.concatenate([l for slots, l, c in cat])
+            counts = np.concatenate([c for slots, l, c in cat], axis=1)
+            self._cat_counts = variables, slot_var, slot_label, counts
+        else:
+            self._cat_counts = self._count_categorical(data)
 
-        p < 0.05 suggests possible multimodality.
+    def _group_blocks(self):
         """
-        p = modality.hartigan_diptest(x.values)
-        # dropna=False argument in pivot_table does not function as expected
-        # https://github.com/pandas-dev/pandas/issues/22159
-        # return -1 instead of None
-        if pd.isnull(p):
-            return -1
-        return p
+        Yield the values and NaN mask of the continuous data of each group.
+        """
+        bounds = self._group_bounds
+        for i in range(len(self._groupbylvls)):
+            rows = slice(bounds[i], bounds[i + 1])
+            yield self._cont_values[rows], self._cont_nan[rows]
 
-    def _normaltest(self, x):
+    def _percentile_sorted(self, x_sort, n, q):
         """
-        Compute test for normal distribution.
+        Compute percentile of each column of a sorted block.
 
-        Null hypothesis: x comes from a normal distribution
-        p < alpha suggests the null hypothesis can be rejected.
+        Parameters
+        ----------
+            x_sort : numpy array
+                Columns sorted in ascending order, NaN last.
+            n : numpy array
+                Number of non-missing values in each column.
+            q : float
+                Percentile, between 0 and 100.
+
+        Returns
+        ----------
+            p : numpy array
+                Percentile of each column, interpolated linearly as in
+                np.nanpercentile. NaN for columns without values.
         """
-        if len(x.values[~np.isnan(x.values)]) > 10:
-            stat, p = stats.normaltest(x.values, nan_policy='omit')
-        else:
-            p = None
-        # dropna=False argument in pivot_table does not function as expected
-        # return -1 instead of None
-        if pd.isnull(p):
-            return -1
-        return p
+        pos = (np.maximum(n, 1) - 1) * (q / 100.)
+        lo = np.floor(pos).astype(int)
+        hi = np.minimum(lo + 1, np.maximum(n - 1, 0))
+        cols = np.arange(x_sort.shape[1])
+        a, b = x_sort[lo, cols], x_sort[hi, cols]
+        t = pos - lo
+        # same interpolation formula as numpy
+        diff = b - a
+        p = np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+        return np.where(n > 0, p, np.nan)
+
+    def _median_sorted(self, x_sort, n):
+        """
+        Compute median of each column of a sorted block, NaN last.
+        """
+        cols = np.arange(x_sort.shape[1])
+        a = x_sort[np.maximum(n - 1, 0) // 2, cols]
+        b = x_sort[n // 2, cols]
+        b = np.where(n % 2 == 1, a, b)
+        return np.where(n > 0, (a + b) / 2., np.nan)
 
-    def _tukey(self, x, threshold):
+    def _tukey(self, x_sort, n, q1, q3, threshold):
         """
         Count outliers according to Tukey's rule.
 
@@ -415,139 +1321,327 @@ class TableOne(object):
 
         k = 1.5 indicates an outlier
         k = 3.0 indicates an outlier that is "far out"
+
+        The bounds are located by binary search in each sorted column.
+        """
+        iqr = q3 - q1
+        low_bound = q1 - (iqr * threshold)
+        high_bound = q3 + (iqr * threshold)
+        counts = np.zeros(x_sort.shape[1], dtype=np.int64)
+        for j in np.flatnonzero(n):
+            vals = x_sort[:n[j], j]
+            counts[j] = (np.searchsorted(vals, low_bound[j], 'left') +
+                         n[j] - np.searchsorted(vals, high_bound[j], 'right'))
+        return counts
+
+    def _diptest(self, cont_data):
         """
-        vals = x.values[~np.isnan(x.values)]
+        Compute Hartigan Dip Test for modality for every continuous variable
+        and group in a single batched call.
 
-        try:
-            q1, q3 = np.percentile(vals, [25, 75])
-            iqr = q3 - q1
-            low_bound = q1 - (iqr * threshold)
-            high_bound = q3 + (iqr * threshold)
-            outliers = np.where((vals > high_bound) | (vals < low_bound))
-        except IndexError:
-            outliers = []
+        p < 0.05 suggests possible multimodality.
 
-        return outliers
+        Parameters
+        ----------
+            cont_data : pandas DataFrame
+                The continuous data, with the groupby column if grouped.
 
-    def _outliers(self, x):
-        """
-        Compute number of outliers
+        Returns
+        ----------
+            df_dip : pandas DataFrame
+                P-Values, indexed by variable with one column per group.
         """
-        outliers = self._tukey(x, threshold=1.5)
-        return np.size(outliers)
+        if self._groupby:
+            df_dip = modality.hartigan_diptest_frame(
+                cont_data[self._continuous], groups=cont_data[self._groupby])
+        else:
+            df_dip = modality.hartigan_diptest_frame(
+                cont_data[self._continuous])
+        df_dip = df_dip.pivot(index='variable', columns='group',
+                              values='pval')
+        # groups without rows are not tested
+        df_dip = df_dip.reindex(columns=self._groupbylvls)
+        # return -1 instead of None, consistent with the other tests
+        return df_dip.fillna(-1)
 
-    def _far_outliers(self, x):
+    def _normaltest(self, x):
         """
-        Compute number of "far out" outliers
+        Compute test for normal distribution.
+
+        Null hypothesis: x comes from a normal distribution
+        p < alpha suggests the null hypothesis can be rejected.
         """
-        outliers = self._tukey(x, threshold=3.0)
-        return np.size(outliers)
+        if len(x[~np.isnan(x)]) > 10:
+            stat, p = stats.normaltest(x, nan_policy='omit')
+        else:
+            p = None
+        # return -1 instead of None, consistent with the other tests
+        if pd.isnull(p):
+            return -1
+        return p
 
-    def _t1_summary(self, x):
+    def _decimals_of(self, variables, warn=True):
         """
-        Compute median [IQR] or mean (Std) for the input series.
+        Number of decimal places to display for each variable.
 
         Parameters
         ----------
-            x : pandas Series
-                Series of values to be summarised.
+            variables : list
+                Names of the variables.
+            warn : bool
+                Warn if the decimals arg is neither an int nor a dict.
+
+        Returns
+        ----------
+            decimals : numpy array
+                Decimal places of each variable.
         """
-        # set decimal places
         if isinstance(self._decimals, int):
-            n = self._decimals
+            return np.full(len(variables), self._decimals, dtype=int)
         elif isinstance(self._decimals, dict):
-            try:
-                n = self._decimals[x.name]
-            except KeyError:
-                n = 1
-        else:
-            n = 1
+            return np.array([self._decimals.get(v, 1) for v in variables],
+                            dtype=int)
+        if warn and len(variables):
             warnings.warn("The decimals arg must be an int or dict. " +
-                          "Defaulting to {} d.p.".format(n))
+                          "Defaulting to {} d.p.".format(1))
+        return np.ones(len(variables), dtype=int)
 
-        if x.name in self._nonnormal:
-            f = '{{:.{}f}} [{{:.{}f}},{{:.{}f}}]'.format(n, n, n)
-            return f.format(np.nanmedian(x.values),
-                            np.nanpercentile(x.values, 25),
-                            np.nanpercentile(x.values, 75))
-        else:
-            f = '{{:.{}f}} ({{:.{}f}})'.format(n, n)
-            return f.format(np.nanmean(x.values),
-                            np.nanstd(x.values, ddof=self._ddof))
+    def _format_fixed(self, values, decimals):
+        """
+        Format numbers with a fixed number of decimal places, one vectorised
+        call per number of places.
+
+        Parameters
+        ----------
+            values : numpy array
+                The numbers.
+            decimals : numpy array
+                Decimal places of each number.
 
-    def _create_cont_describe(self, data):
+        Returns
+        ----------
+            strings : numpy array
+                The formatted numbers.
         """
-        Describe the continuous data.
+        values = np.asarray(values, dtype=float)
+        strings = np.empty(len(values), dtype=object)
+        for n in np.unique(decimals):
+            bucket = decimals == n
+            strings[bucket] = np.char.mod('%.{}f'.format(n), values[bucket])
+        return strings
+
+    def _t1_summary(self, variables, describe):
+        """
+        Format median [IQR] or mean (Std) for each variable of a group.
 
         Parameters
         ----------
-            data : pandas DataFrame
-                The input dataset.
+            variables : list
+                Names of the variables.
+            describe : dict
+                Statistics of the variables in the group.
 
         Returns
         ----------
-            df_cont : pandas DataFrame
-                Summarise the continuous variables.
+            summary : numpy array
+                The summary of each variable.
         """
-        aggfuncs = [pd.Series.count, np.mean, np.median, self._std,
-                    self._q25, self._q75, min, max, self._t1_summary,
-                    self._diptest, self._outliers, self._far_outliers,
-                    self._normaltest]
+        decimals = self._decimals_of(variables)
+        mean, std, median, q25, q75 = [
+            self._format_fixed(describe[f], decimals)
+            for f in ['mean', 'std', 'median', 'q25', 'q75']]
+        nonnormal = np.array([v in self._nonnormal for v in variables],
+                             dtype=bool)
+        return np.where(nonnormal, median + ' [' + q25 + ',' + q75 + ']',
+                        mean + ' (' + std + ')')
+
+    def _describe_block(self, block, nan):
+        """
+        Summarise each column of a block of continuous data.
 
-        # coerce continuous data to numeric
-        cont_data = data[self._continuous].apply(pd.to_numeric,
-                                                 errors='coerce')
-        # check all data in each continuous column is numeric
-        bad_cols = cont_data.count() != data[self._continuous].count()
-        bad_cols = cont_data.columns[bad_cols]
-        if len(bad_cols) > 0:
-            raise InputError("The following continuous column(s) have " +
-                             "non-numeric values: {}. Either specify the " +
-                             "column(s) as categorical or remove the " +
-                             "non-numeric values.""".format(bad_cols.values))
+        Each column is sorted once. Order statistics and quartiles are read
+        from the sorted block, the mean and standard deviation come from
+        nan-aware reductions over the block.
 
-        # check for coerced column containing all NaN to warn user
-        for column in cont_data.columns[cont_data.count() == 0]:
-            self._non_continuous_warning(column)
+        Parameters
+        ----------
+            block : numpy array
+                Values of one group, one column per continuous variable.
+            nan : numpy array
+                NaN mask of the block.
+
+        Returns
+        ----------
+            describe : dict
+                Maps each statistic to an array with one entry per column.
+                'var' is the variance with one degree of freedom, used by
+                the significance tests.
+        """
+        n = np.sum(~nan, axis=0)
+        cols = np.arange(block.shape[1])
+        # as np.nanmean and np.nanvar, without their warnings for columns
+        # with too few values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(n > 0, np.where(nan, 0, block).sum(axis=0) / n,
+                            np.nan)
+            ss = np.sum(np.where(nan, 0, block - mean) ** 2, axis=0)
+            std = np.sqrt(np.where(n > self._ddof, ss / (n - self._ddof),
+                                   np.nan))
+            var = np.where(n > 1, ss / (n - 1), np.nan)
+        if len(block) == 0:
+            block = np.full((1, block.shape[1]), np.nan)
+        x_sort = np.sort(block, axis=0)
+        last = np.maximum(n - 1, 0)
+        return {'count': n,
+                'mean': mean,
+                'var': var,
+                'median': self._median_sorted(x_sort, n),
+                'std': std,
+                'q25': self._percentile_sorted(x_sort, n, 25),
+                'q75': self._percentile_sorted(x_sort, n, 75),
+                'min': np.where(n > 0, x_sort[0], np.nan),
+                'max': np.where(n > 0, x_sort[last, cols], np.nan)}
+
+    def _diagnose_block(self, block, nan):
+        """
+        Count outliers and test normality for each column of a block of
+        continuous data.
 
+        Parameters
+        ----------
+            block : numpy array
+                Values of one group, one column per continuous variable.
+            nan : numpy array
+                NaN mask of the block.
+
+        Returns
+        ----------
+            diagnose : dict
+                Maps each diagnostic to an array with one entry per column.
+        """
+        n = np.sum(~nan, axis=0)
+        cols = np.arange(block.shape[1])
+        if len(block) == 0:
+            block = np.full((1, block.shape[1]), np.nan)
+        x_sort = np.sort(block, axis=0)
+        q25 = self._percentile_sorted(x_sort, n, 25)
+        q75 = self._percentile_sorted(x_sort, n, 75)
+        return {'outliers': self._tukey(x_sort, n, q25, q75, 1.5),
+                'far_outliers': self._tukey(x_sort, n, q25, q75, 3.0),
+                'normaltest': np.array([self._normaltest(block[:, j])
+                                        for j in cols], dtype=float)}
+
+    def _create_diagnostics(self):
+        """
+        Compute the diagnostics of the continuous data.
+
+        Returns
+        ----------
+            df_diag : pandas DataFrame
+                Diagnostics of the continuous variables.
+        """
+        if self._cont_values is None:
+            raise InputError('The diagnostics need the values of the ' +
+                             'continuous variables, which this table ' +
+                             'does not keep.')
+        variables = self._continuous
+        bounds = self._group_bounds
+        diagnose = [self._diagnose_block(block, nan)
+                    for block, nan in self._group_blocks()]
+
+        # the dip test is computed for all cells at once, rows without a
+        # group come first and are left out
+        cont_data = pd.DataFrame(self._cont_values[bounds[0]:],
+                                 columns=variables)
+        if self._groupby:
+            cont_data[self._groupby] = np.repeat(self._groupbylvls,
+                                                 np.diff(bounds))
+        df_dip = self._diptest(cont_data)
+
+        df_diag = {}
+        for f in ['diptest', 'outliers', 'far_outliers', 'normaltest']:
+            for g, d in zip(self._groupbylvls, diagnose):
+                if f == 'diptest':
+                    df_diag[(f, g)] = df_dip.loc[variables, g].values
+                else:
+                    df_diag[(f, g)] = d[f]
+        df_diag = pd.DataFrame(df_diag, index=pd.Index(variables,
+                                                       name='variable'))
+        df_diag.columns.names = self._cont_describe.columns.names
+        return df_diag.loc[self._cont_describe.index]
+
+    def _create_cont_describe(self):
+        """
+        Describe the continuous data.
+
+        Returns
+        ----------
+            df_cont : pandas DataFrame
+                Summarise the continuous variables.
+        """
+        variables = self._continuous
+        describe = self._cont_stats
+
+        funcs = ['count', 'mean', 'median', 'std', 'q25', 'q75', 'min',
+                 'max', 't1_summary']
+        df_cont = {}
+        for f in funcs:
+            for g, d in zip(self._groupbylvls, describe):
+                if f == 't1_summary':
+                    df_cont[(f, g)] = self._t1_summary(variables, d)
+                else:
+                    df_cont[(f, g)] = d[f]
+        df_cont = pd.DataFrame(df_cont, index=pd.Index(variables,
+                                                       name='variable'))
         if self._groupby:
-            # add the groupby column back
-            cont_data = cont_data.merge(data[[self._groupby]],
-                                        left_index=True,
-                                        right_index=True)
-
-            # group and aggregate data
-            df_cont = pd.pivot_table(cont_data,
-                                     columns=[self._groupby],
-                                     aggfunc=aggfuncs)
+            df_cont.columns.names = [None, self._groupby]
+            # variables in sorted order, as from a pivot table
+            df_cont = df_cont.loc[sorted(variables)]
         else:
-            # if no groupby, just add single group column
-            df_cont = cont_data.apply(aggfuncs).T
-            df_cont.columns.name = 'Overall'
-            df_cont.columns = pd.MultiIndex.from_product([df_cont.columns,
-                                                         ['Overall']])
-
-        df_cont.index = df_cont.index.rename('variable')
-
-        # remove prefix underscore from column names (e.g. _std -> std)
-        agg_rename = df_cont.columns.levels[0]
-        agg_rename = [x[1:] if x[0] == '_' else x for x in agg_rename]
-        df_cont.columns = df_cont.columns.set_levels(agg_rename, level=0)
+            df_cont.columns.names = ['Overall', None]
 
         return df_cont
 
-    def _format_cat(self, row):
-        var = row.name[0]
-        if var in self._decimals:
-            n = self._decimals[var]
-        else:
-            n = 1
-        f = '{{:.{}f}}'.format(n)
-        return f.format(row.percent)
+    def _factorize_cat(self, values):
+        """
+        Encode a categorical column as integer codes.
+
+        Parameters
+        ----------
+            values : array-like
+                Values of the column.
 
-    def _create_cat_describe(self, data):
+        Returns
+        ----------
+            codes : numpy array
+                Index of the label of each value, -1 for null values.
+            labels : numpy array
+                Sorted string labels of the values.
         """
-        Describe the categorical data.
+        codes, uniques = pd.factorize(values)
+        if len(uniques) == 0:
+            # all values are null
+            return codes, np.zeros(0, dtype=object)
+        # values that hash equal but print differently (e.g. 1 and 1.0 in
+        # an object column) must keep separate labels
+        if values.dtype == object and not all(isinstance(u, str)
+                                              for u in uniques):
+            codes, uniques = pd.factorize(
+                np.array([str(v) if not pd.isnull(v) else None
+                          for v in values], dtype=object))
+        # convert to str to handle int converted to boolean
+        labels = np.array([str(u) for u in uniques], dtype=object)
+        labels, remap = np.unique(labels, return_inverse=True)
+        codes = np.where(codes >= 0, remap[np.maximum(codes, 0)], -1)
+        return codes, labels
+
+    def _count_categorical(self, data):
+        """
+        Count the levels of the categorical data in each group.
+
+        Each column is encoded once as integer codes. The frequencies of
+        all (group, variable, level) combinations, and the null counts,
+        come from a single np.bincount over the combined codes.
 
         Parameters
         ----------
@@ -556,66 +1650,109 @@ class TableOne(object):
 
         Returns
         ----------
-            df_cat : pandas DataFrame
-                Summarise the categorical variables.
+            variables : list
+                The categorical variables, sorted.
+            slot_var : numpy array
+                Index in variables of each slot.
+            slot_label : numpy array
+                Level of each slot, None for the null slot of a variable.
+            counts : numpy array
+                Number of rows of each group (rows) in each slot (columns).
         """
-        group_dict = {}
-
-        for g in self._groupbylvls:
-            if self._groupby:
-                d_slice = data.loc[data[self._groupby] == g, self._categorical]
-            else:
-                d_slice = data[self._categorical].copy()
-
-            # create a dataframe with freq, proportion
-            df = d_slice.copy()
+        variables = sorted(self._categorical)
+        slot_var, slot_label, counts = self._count_levels(
+            data[variables], self._group_codes, len(self._groupbylvls))
+        return variables, slot_var, slot_label, counts
 
-            # convert to str to handle int converted to boolean. Avoid nans.
-            for column in df.columns:
-                df[column] = [str(row) if not pd.isnull(row)
-                              else None for row in df[column].values]
+    def _count_levels(self, data, group_codes, n_groups):
+        """
+        Count the levels of each column of a frame of categorical data in
+        each group.
 
-            df = df.melt().groupby(['variable',
-                                    'value']).size().to_frame(name='freq')
+        Parameters
+        ----------
+            data : pandas DataFrame
+                The categorical columns.
+            group_codes : numpy array
+                Index of the group level of each row, -1 if missing.
+            n_groups : int
+                Number of group levels.
 
-            df['percent'] = df['freq'].div(df.freq.sum(level=0),
-                                           level=0).astype(float) * 100
+        Returns
+        ----------
+            slot_var : numpy array
+                Index in the columns of each slot.
+            slot_label : numpy array
+                Level of each slot, None for the null slot of a column.
+            counts : numpy array
+                Number of rows of each group (rows) in each slot (columns).
+        """
+        in_group = group_codes >= 0
+        variables = data.columns
+
+        # one slot per level of each variable, plus one for nulls
+        slot_var, slot_label = [np.zeros(0, dtype=int)], [np.zeros(0, object)]
+        combined, offset = [np.zeros(0, dtype=np.intp)], 0
+        for j in range(len(variables)):
+            codes, labels = self._factorize_cat(data.iloc[:, j].values)
+            codes = np.where(codes >= 0, codes, len(labels))
+            combined.append(offset + codes[in_group])
+            slot_var.append(np.full(len(labels) + 1, j))
+            slot_label.append(np.append(labels, None))
+            offset += len(labels) + 1
+        slot_var = np.concatenate(slot_var)
+        slot_label = np.concatenate(slot_label)
+        combined = (np.concatenate(combined) +
+                    offset * np.tile(group_codes[in_group].astype(np.intp),
+                                     len(variables)))
+        counts = np.bincount(combined, minlength=n_groups * offset)
+        counts = counts.reshape(n_groups, offset)
+        return slot_var, slot_label, counts
+
+    def _create_cat_describe(self):
+        """
+        Describe the categorical data.
 
-            # set number of decimal places for percent
-            if isinstance(self._decimals, int):
-                n = self._decimals
-                f = '{{:.{}f}}'.format(n)
-                df['percent'] = df['percent'].astype(float).map(f.format)
-            elif isinstance(self._decimals, dict):
-                df.loc[:, 'percent'] = df.apply(self._format_cat, axis=1)
-            else:
-                n = 1
-                f = '{{:.{}f}}'.format(n)
-                df['percent'] = df['percent'].astype(float).map(f.format)
+        Returns
+        ----------
+            df_cat : pandas DataFrame
+                Summarise the categorical variables.
+        """
+        variables, slot_var, slot_label, counts = self._cat_counts
+        group_size = self._group_sizes
+        is_null = pd.isnull(slot_label)
 
-            # add n column, listing total non-null values for each variable
-            ct = d_slice.count().to_frame(name='n')
-            ct.index.name = 'variable'
-            df = df.join(ct)
+        # set number of decimal places for percent
+        decimals = self._decimals_of(variables, warn=False)
 
-            # add null count
+        group_dict = {}
+        for i, g in enumerate(self._groupbylvls):
+            nulls = counts[i, is_null]
+            n = group_size[i] - nulls
             if self._reverse_missing:
-                nulls = len(d_slice) - d_slice.isnull().sum().to_frame(name=self._missing_string)
-            else:
-                nulls = d_slice.isnull().sum().to_frame(name=self._missing_string)
-            nulls.index.name = 'variable'
+                nulls = group_size[i] - nulls
+
+            keep = (counts[i] > 0) & ~is_null
+            var_idx = slot_var[keep]
+            freq = counts[i, keep]
+            percent = freq / n[var_idx] * 100
             # only save null count to the first category for each variable
-            # do this by extracting the first category from the df row index
-            levels = df.reset_index()[['variable',
-                                       'value']].groupby('variable').first()
-            # add this category to the nulls table
-            nulls = nulls.join(levels)
-            nulls = nulls.set_index('value', append=True)
-            # join nulls to categorical
-            df = df.join(nulls)
-
-            # add summary column
-            df['t1_summary'] = df.freq.map(str) + ' (' + df.percent.map(str) + ')'
+            first = np.r_[True, var_idx[1:] != var_idx[:-1]]
+            missing = np.where(first, nulls[var_idx], np.nan)
+
+            percent = self._format_fixed(percent, decimals[var_idx])
+            t1_summary = (freq.astype(str).astype(object) + ' (' + percent +
+                          ')')
+            # lists, so that the columns of a group with no rows stay float
+            df = pd.DataFrame(
+                {'freq': freq,
+                 'percent': list(percent),
+                 'n': n[var_idx],
+                 self._missing_string: missing,
+                 't1_summary': list(t1_summary)},
+                index=pd.MultiIndex.from_arrays(
+                    [[variables[j] for j in var_idx], slot_label[keep]],
+                    names=['variable', 'value']))
 
             # add to dictionary
             group_dict[g] = df
@@ -627,143 +1764,207 @@ class TableOne(object):
 
         return df_cat
 
-    def _create_significance_table(self, data):
+    def _create_significance_table(self):
         """
         Create a table containing P-Values for significance tests. Add features
         of the distributions and the P-Values to the dataframe.
 
-        Parameters
-        ----------
-            data : pandas DataFrame
-                The input dataset.
+        The tests are computed for all continuous variables at once from
+        per-group moments and ranks, and for all categorical variables from
+        the contingency tables of the level counts.
 
         Returns
         ----------
             df : pandas DataFrame
                 A table containing the P-Values, test name, etc.
         """
+        cont = self._cont_significance()
+        cat = self._cat_significance()
+
         # list features of the variable e.g. matched, paired, n_expected
-        df = pd.DataFrame(index=self._continuous+self._categorical,
-                          columns=['continuous', 'nonnormal',
-                                   'min_observed', 'P-Value', 'Test'])
-
-        df.index = df.index.rename('variable')
-        df['continuous'] = np.where(df.index.isin(self._continuous),
-                                    True, False)
-
-        df['nonnormal'] = np.where(df.index.isin(self._nonnormal),
-                                   True, False)
-
-        # list values for each variable, grouped by groupby levels
-        for v in df.index:
-            is_continuous = df.loc[v]['continuous']
-            is_categorical = ~df.loc[v]['continuous']
-            is_normal = ~df.loc[v]['nonnormal']
-
-            # if continuous, group data into list of lists
-            if is_continuous:
-                catlevels = None
-                grouped_data = []
-                for s in self._groupbylvls:
-                    lvl_data = data.loc[data[self._groupby] == s, v]
-                    # coerce to numeric and drop non-numeric data
-                    lvl_data = lvl_data.apply(pd.to_numeric,
-                                              errors='coerce').dropna()
-                    # append to overall group data
-                    grouped_data.append(lvl_data.values)
-                min_observed = len(min(grouped_data, key=len))
-            # if categorical, create contingency table
-            elif is_categorical:
-                catlevels = sorted(data[v].astype('category').cat.categories)
-                grouped_data = pd.crosstab(data[self._groupby].rename('_groupby_var_'),
-                                           data[v])
-                min_observed = grouped_data.sum(axis=1).min()
-
-            # minimum number of observations across all levels
-            df.loc[v, 'min_observed'] = min_observed
-
-            # compute pvalues
-            df.loc[v, 'P-Value'], df.loc[v, 'Test'] = self._p_test(v,
-                                                                   grouped_data,
-                                                                   is_continuous,
-                                                                   is_categorical,
-                                                                   is_normal,
-                                                                   min_observed,
-                                                                   catlevels)
+        variables = self._continuous + self._categorical
+        df = pd.DataFrame(
+            {'continuous': [v in self._continuous for v in variables],
+             'nonnormal': [v in self._nonnormal for v in variables],
+             'min_observed': np.concatenate([cont[0], cat[0]]),
+             'P-Value': np.concatenate([cont[1], cat[1]]),
+             'Test': np.concatenate([cont[2], cat[2]])},
+            index=pd.Index(variables, name='variable'))
+
+        for v, min_observed in zip(df.index, df['min_observed']):
+            # do not test if the variable has no observations in a level
+            if min_observed == 0:
+                warnings.warn("No P-Value was computed for {} due to the " +
+                              "low number of observations.".format(v))
 
         return df
 
-    def _p_test(self, v, grouped_data, is_continuous, is_categorical,
-                is_normal, min_observed, catlevels):
+    def _cont_significance(self):
+        """
+        Compare the groups for every continuous variable.
+
+        Normal variables are compared with Welch's t-test for two groups
+        and one-way ANOVA otherwise, both computed from the per-group
+        counts, means and variances of all columns at once. Non-normal
+        variables are compared with the Kruskal-Wallis test on the ranks of
+        each column.
+
+        Returns
+        ----------
+            min_observed : numpy array
+                Minimum number of values across groups for each variable.
+            pval : numpy array
+                The computed P-Values.
+            ptest : numpy array
+                The names of the tests used to compute the P-Values.
         """
-        Compute P-Values.
+        variables = self._continuous
+        n_groups = len(self._groupbylvls)
+        n, mean, var, vmin, vmax = [
+            np.array([d[f] for d in self._cont_stats])
+            for f in ['count', 'mean', 'var', 'min', 'max']]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if n_groups == 2:
+                # Welch's t-test
+                vn = var / n
+                df = vn.sum(axis=0)**2 / (vn**2 / (n - 1)).sum(axis=0)
+                df = np.where(np.isnan(df), 1, df)
+                t = (mean[0] - mean[1]) / np.sqrt(vn.sum(axis=0))
+                pval = 2 * stats.t.sf(np.abs(t), df)
+                ptest = 'Two Sample T-test'
+            else:
+                # one-way ANOVA
+                total = n.sum(axis=0)
+                grand = (n * mean).sum(axis=0) / total
+                ssbn = (n * (mean - grand)**2).sum(axis=0)
+                # a group with one value adds nothing within groups
+                sswn = np.where(n > 1, (n - 1) * var, 0).sum(axis=0)
+                f = ((ssbn / (n_groups - 1)) /
+                     (sswn / (total - n_groups)))
+                # constant groups, as in scipy.stats.f_oneway
+                const = (vmax == vmin).all(axis=0) & (total > n_groups)
+                same = vmax.max(axis=0) == vmin.min(axis=0)
+                f = np.where(const, np.where(same, np.nan, np.inf), f)
+                pval = special.fdtrc(n_groups - 1, total - n_groups, f)
+                ptest = 'One-way ANOVA'
+
+        min_observed = n.min(axis=0)
+        pval = np.array(pval, dtype=float)
+        ptest = np.array([ptest] * len(variables), dtype=object)
+
+        nonnormal = np.array([v in self._nonnormal for v in variables],
+                             dtype=bool)
+        if self._cont_values is not None:
+            codes = self._group_codes[self._group_order]
+            for j in np.flatnonzero(nonnormal & (min_observed > 0)):
+                if j in self._cont_kruskal:
+                    pval[j] = self._cont_kruskal[j]
+                else:
+                    pval[j] = self._kruskal(self._cont_values[:, j], codes,
+                                            n[:, j])
+            ptest[nonnormal] = 'Kruskal-Wallis'
+        elif nonnormal.any():
+            # ranks need all the values at once
+            pval[nonnormal] = np.nan
+            ptest[nonnormal] = 'Not tested'
+            warnings.warn("The Kruskal-Wallis test needs the full data " +
+                          "and was not computed for: {}.".format(
+                              ', '.join(np.array(variables)[nonnormal])))
+
+        not_tested = min_observed == 0
+        pval[not_tested] = np.nan
+        ptest[not_tested] = 'Not tested'
+        return min_observed, pval, ptest
+
+    def _kruskal(self, x, codes, n):
+        """
+        Compute the Kruskal-Wallis P-Value from the ranks of a column.
 
         Parameters
         ----------
-            v : str
-                Name of the variable to be tested.
-            grouped_data : list
-                List of lists of values to be tested.
-            is_continuous : bool
-                True if the variable is continuous.
-            is_categorical : bool
-                True if the variable is categorical.
-            is_normal : bool
-                True if the variable is normally distributed.
-            min_observed : int
-                Minimum number of values across groups for the variable.
-            catlevels : list
-                Sorted list of levels for categorical variables.
+            x : numpy array
+                Values of the column.
+            codes : numpy array
+                Index of the group level of each value, -1 if missing.
+            n : numpy array
+                Number of values in each group.
+        """
+        valid = ~np.isnan(x) & (codes >= 0)
+        ranked = stats.rankdata(x[valid])
+        ties = stats.tiecorrect(ranked)
+        if ties == 0:
+            raise ValueError('All numbers are identical in kruskal')
+        rank_sum = np.bincount(codes[valid], weights=ranked, minlength=len(n))
+        total = n.sum()
+        h = 12.0 / (total * (total + 1)) * np.sum(rank_sum**2 / n)
+        h = (h - 3 * (total + 1)) / ties
+        return stats.chi2.sf(h, len(n) - 1)
+
+    def _cat_significance(self):
+        """
+        Compare the groups for every categorical variable.
+
+        The contingency tables of all variables are read from the level
+        counts of each group. Chi-squared tests are computed per table,
+        Fisher's exact tests are run in a batch.
 
         Returns
         ----------
-            pval : float
-                The computed P-Value.
-            ptest : str
-                The name of the test used to compute the P-Value.
-        """
-
-        # no test by default
-        pval = np.nan
-        ptest = 'Not tested'
-
-        # do not test if the variable has no observations in a level
-        if min_observed == 0:
-            warnings.warn("No P-Value was computed for {} due to the low " +
-                          "number of observations.".format(v))
-            return pval, ptest
-
-        # continuous
-        if is_continuous and is_normal and len(grouped_data) == 2:
-            ptest = 'Two Sample T-test'
-            test_stat, pval = stats.ttest_ind(*grouped_data, equal_var=False)
-        elif is_continuous and is_normal:
-            # normally distributed
-            ptest = 'One-way ANOVA'
-            test_stat, pval = stats.f_oneway(*grouped_data)
-        elif is_continuous and not is_normal:
-            # non-normally distributed
-            ptest = 'Kruskal-Wallis'
-            test_stat, pval = stats.kruskal(*grouped_data)
-        # categorical
-        elif is_categorical:
-            # default to chi-squared
-            ptest = 'Chi-squared'
-            chi2, pval, dof, expected = stats.chi2_contingency(grouped_data)
+            min_observed : numpy array
+                Minimum number of values across groups for each variable.
+            pval : numpy array
+                The computed P-Values.
+            ptest : numpy array
+                The names of the tests used to compute the P-Values.
+        """
+        variables = self._categorical
+        counted, slot_var, slot_label, counts = self._cat_counts
+        # nulls are dropped
+        slot_var = np.where(pd.isnull(slot_label), -1, slot_var)
+
+        min_observed = np.zeros(len(variables), dtype=np.int64)
+        pval = np.full(len(variables), np.nan)
+        ptest = np.array(['Chi-squared'] * len(variables), dtype=object)
+        exact = []
+        for j, v in enumerate(variables):
+            table = counts[:, slot_var == counted.index(v)]
+            # as pd.crosstab, only keep observed levels and groups
+            table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+            if table.size == 0:
+                ptest[j] = 'Not tested'
+                continue
+            min_observed[j] = table.sum(axis=1).min()
+            chi2, pval[j], dof, expected = stats.chi2_contingency(table)
             # if any expected cell counts are < 5, chi2 may not be valid
             # if this is a 2x2, switch to fisher exact
             if expected.min() < 5:
-                if grouped_data.shape == (2, 2):
-                    ptest = "Fisher's exact"
-                    oddsratio, pval = stats.fisher_exact(grouped_data)
+                if table.shape == (2, 2):
+                    ptest[j] = "Fisher's exact"
+                    exact.append((j, table))
                 else:
-                    ptest = 'Chi-squared (warning: expected count < 5)'
+                    ptest[j] = 'Chi-squared (warning: expected count < 5)'
                     warnings.warn("Chi-squared test for {} may be invalid " +
                                   "(expected cell counts are < 5).".format(v))
 
-        return pval, ptest
+        if exact:
+            pval[[j for j, _ in exact]] = self._fisher_exact(
+                [table for _, table in exact])
+        return min_observed, pval, ptest
 
-    def _create_cont_table(self, data):
+    def _fisher_exact(self, tables):
+        """
+        Compute Fisher's exact test P-Values for 2x2 tables, in a pool of
+        n_jobs worker processes when there are many tables.
+        """
+        if self._n_jobs == 1 or len(tables) < self._exact_pool_min:
+            results = map(stats.fisher_exact, tables)
+            return [p for oddsratio, p in results]
+        with ProcessPoolExecutor(max_workers=self._n_jobs) as executor:
+            results = executor.map(stats.fisher_exact, tables,
+                                   chunksize=16)
+            return [p for oddsratio, p in results]
+
+    def _create_cont_table(self):
         """
         Create tableone for continuous data.
 
@@ -773,14 +1974,13 @@ class TableOne(object):
             A table summarising the continuous variables.
         """
         # remove the t1_summary level
-        table = self.cont_describe[['t1_summary']].copy()
+        table = self._cont_describe[['t1_summary']].copy()
         table.columns = table.columns.droplevel(level=0)
 
         # add a column of null counts as 1-count() from previous function
+        nulltable = self._missing[self._continuous].to_frame(name=self._missing_string)
         if self._reverse_missing:
-            nulltable = len(data) - data[self._continuous].isnull().sum().to_frame(name=self._missing_string)
-        else:
-            nulltable = data[self._continuous].isnull().sum().to_frame(name=self._missing_string)
+            nulltable = self._n_rows - nulltable
         try:
             table = table.join(nulltable)
         # if columns form a CategoricalIndex, need to convert to string first
@@ -801,7 +2001,7 @@ class TableOne(object):
 
         return table
 
-    def _create_cat_table(self, data):
+    def _create_cat_table(self):
         """
         Create table one for categorical data.
 
@@ -812,11 +2012,9 @@ class TableOne(object):
         """
         table = self.cat_describe['t1_summary'].copy()
         # add the total count of null values across all levels
+        isnull = self._missing[self._categorical].to_frame(name=self._missing_string)
         if self._reverse_missing:
-            isnull = len(data) - data[self._categorical].isnull().sum().to_frame(name=self._missing_string)
-        else:
-            isnull = data[self._categorical].isnull().sum().to_frame(name=self._missing_string)
-        isnull.index = isnull.index.rename('variable')
+            isnull = self._n_rows - isnull
         try:
             table = table.join(isnull)
         # if columns form a CategoricalIndex, need to convert to string first
@@ -833,75 +2031,71 @@ class TableOne(object):
 
         return table
 
-    def _create_tableone(self, data):
+    def _plan_rows(self, table):
         """
-        Create table 1 by combining the continuous and categorical tables.
+        Plan the row order of table 1 in a single pass.
+
+        The rows are sorted, then the levels of each variable in order are
+        rearranged, then the levels of each variable over the limit are
+        ranked by frequency and cut. Rows only move within the slots of
+        their own variable, so the plan is kept as the label of each slot.
+
+        Parameters
+        ----------
+            table : pandas DataFrame
+                The combined table, indexed by variable and value.
 
         Returns
         ----------
-        table : pandas DataFrame
-            The complete table one.
+            positions : numpy array
+                Positions of the rows of table 1 in table.
         """
-        if self._continuous and self._categorical:
-
-            # support pandas<=0.22
-            try:
-                table = pd.concat([self.cont_table, self.cat_table],
-                                  sort=False)
-            except TypeError:
-                table = pd.concat([self.cont_table, self.cat_table])
-        elif self._continuous:
-            table = self.cont_table
-        elif self._categorical:
-            table = self.cat_table
-
-        # ensure column headers are strings before reindexing
-        table = table.reset_index().set_index(['variable', 'value'])
-        table.columns = table.columns.values.astype(str)
+        labels = table.index.values
+        variables = table.index.get_level_values(0)
 
         # sort the table rows
-        sort_columns = [self._missing_string, 'P-Value', 'P-Value (adjusted)', 'Test']
+        rank = dict((c, i) for i, c in enumerate(self._columns))
+        by_column = [rank[v] for v in variables]
+        sort_columns = [self._missing_string, 'P-Value', 'P-Value (adjusted)',
+                        'Test']
         if self._sort and isinstance(self._sort, bool):
-            new_index = sorted(table.index.values, key=lambda x: x[0].lower())
+            keys = [v.lower() for v in variables]
+            perm = sorted(range(len(keys)), key=keys.__getitem__)
         elif self._sort and isinstance(self._sort, str) and (self._sort in
                                                              sort_columns):
             try:
-                new_index = table.sort_values(self._sort).index
+                # stable, so the levels of a variable keep their order
+                perm = table.index.get_indexer(
+                    table.sort_values(self._sort, kind='mergesort').index)
             except KeyError:
-                new_index = sorted(table.index.values,
-                                   key=lambda x: self._columns.index(x[0]))
+                perm = sorted(range(len(by_column)),
+                              key=by_column.__getitem__)
                 warnings.warn('Sort variable not found: {}'.format(self._sort))
         elif self._sort and isinstance(self._sort, str) and (self._sort not in
                                                              sort_columns):
-            new_index = sorted(table.index.values,
-                               key=lambda x: self._columns.index(x[0]))
+            perm = sorted(range(len(by_column)), key=by_column.__getitem__)
             warnings.warn('Sort must be in the following ' +
                           'list: {}.'.format(self._sort))
         else:
             # sort by the columns argument
-            new_index = sorted(table.index.values,
-                               key=lambda x: self._columns.index(x[0]))
-        table = table.reindex(new_index)
+            perm = sorted(range(len(by_column)), key=by_column.__getitem__)
+        rows = [labels[i] for i in perm]
 
-        # round pval column and convert to string
-        if self._pval and self._pval_adjust:
-            table['P-Value (adjusted)'] = table['P-Value (adjusted)'].apply('{:.3f}'.format).astype(str)
-            table.loc[table['P-Value (adjusted)'] == '0.000',
-                      'P-Value (adjusted)'] = '<0.001'
-        elif self._pval:
-            table['P-Value'] = table['P-Value'].apply('{:.3f}'.format).astype(str)
-            table.loc[table['P-Value'] == '0.000', 'P-Value'] = '<0.001'
+        # slots of each variable in the sorted rows
+        slots = {}
+        for i, (variable, value) in enumerate(rows):
+            slots.setdefault(variable, []).append(i)
+        keep = np.ones(len(rows), dtype=bool)
 
         # if an order is specified, apply it
         if self._order:
             for k in self._order:
 
                 # Skip if the variable isn't present
-                try:
-                    all_var = table.loc[k].index.unique(level='value')
-                except KeyError:
+                if k not in slots:
                     warnings.warn('Order variable not found: {}'.format(k))
                     continue
+                all_var = [rows[i][1] for i in slots[k]]
 
                 # Remove value from order if it is not present
                 if [i for i in self._order[k] if i not in all_var]:
@@ -914,48 +2108,73 @@ class TableOne(object):
                 new_seq = [(k, '{}'.format(v)) for v in self._order[k]]
                 new_seq += [(k, '{}'.format(v)) for v in all_var
                             if v not in self._order[k]]
-
-                # restructure to match the original idx
-                new_idx_array = np.empty((len(new_seq),), dtype=object)
-                new_idx_array[:] = [tuple(i) for i in new_seq]
-                orig_idx = table.index.values.copy()
-                orig_idx[table.index.get_loc(k)] = new_idx_array
-                table = table.reindex(orig_idx)
+                for i, label in zip(slots[k], new_seq):
+                    rows[i] = label
 
         # set the limit on the number of categorical variables
         if self._limit:
-            levelcounts = data[self._categorical].nunique()
-            for k, _ in levelcounts.iteritems():
+            for k, count in self._value_counts.items():
 
                 # set the limit for the variable
                 if (isinstance(self._limit, int)
-                        and levelcounts[k] >= self._limit):
+                        and len(count) >= self._limit):
                     limit = self._limit
                 elif isinstance(self._limit, dict) and k in self._limit:
                     limit = self._limit[k]
                 else:
                     continue
 
-                if not self._order or (self._order and k not in self._order):
-                    # re-order the variables by frequency
-                    count = data[k].value_counts().sort_values(ascending=False)
+                # the order is already applied, otherwise rank by frequency
+                if not self._order or k not in self._order:
                     new_idx = [(k, '{}'.format(i)) for i in count.index]
-                else:
-                    # apply order
-                    all_var = table.loc[k].index.unique(level='value')
-                    new_idx = [(k, '{}'.format(v)) for v in self._order[k]]
-                    new_idx += [(k, '{}'.format(v)) for v in all_var
-                                if v not in self._order[k]]
-
-                # restructure to match the original idx
-                new_idx_array = np.empty((len(new_idx),), dtype=object)
-                new_idx_array[:] = [tuple(i) for i in new_idx]
-                orig_idx = table.index.values.copy()
-                orig_idx[table.index.get_loc(k)] = new_idx_array
-                table = table.reindex(orig_idx)
+                    for i, label in zip(slots.get(k, []), new_idx):
+                        rows[i] = label
 
                 # drop the rows > the limit
-                table = table.drop(new_idx_array[limit:])
+                keep[slots.get(k, [])[limit:]] = False
+
+        rows = [row for row, kept in zip(rows, keep) if kept]
+        return table.index.get_indexer(
+            pd.MultiIndex.from_tuples(rows, names=table.index.names)
+            if rows else table.index[:0])
+
+    def _create_tableone(self):
+        """
+        Create table 1 by combining the continuous and categorical tables.
+
+        Returns
+        ----------
+        table : pandas DataFrame
+            The complete table one.
+        """
+        if self._continuous and self._categorical:
+
+            # support pandas<=0.22
+            try:
+                table = pd.concat([self.cont_table, self.cat_table],
+                                  sort=False)
+            except TypeError:
+                table = pd.concat([self.cont_table, self.cat_table])
+        elif self._continuous:
+            table = self.cont_table
+        elif self._categorical:
+            table = self.cat_table
+
+        # ensure column headers are strings before reindexing
+        table = table.reset_index().set_index(['variable', 'value'])
+        table.columns = table.columns.values.astype(str)
+
+        # plan the row order, then take the rows once
+        table = table.take(self._plan_rows(table))
+
+        # round pval column and convert to string
+        if self._pval and self._pval_adjust:
+            table['P-Value (adjusted)'] = table['P-Value (adjusted)'].apply('{:.3f}'.format).astype(str)
+            table.loc[table['P-Value (adjusted)'] == '0.000',
+                      'P-Value (adjusted)'] = '<0.001'
+        elif self._pval:
+            table['P-Value'] = table['P-Value'].apply('{:.3f}'.format).astype(str)
+            table.loc[table['P-Value'] == '0.000', 'P-Value'] = '<0.001'
 
         # insert n row
         n_row = pd.DataFrame(columns=['variable', 'value', self._missing_string])
@@ -969,10 +2188,9 @@ class TableOne(object):
             table = pd.concat([n_row, table])
 
         if self._groupbylvls == ['Overall']:
-            table.loc['n', 'Overall'] = len(data.index)
+            table.loc['n', 'Overall'] = self._n_rows
         else:
-            for g in self._groupbylvls:
-                ct = data[self._groupby][data[self._groupby] == g].count()
+            for g, ct in zip(self._groupbylvls, self._group_sizes):
                 table.loc['n', '{}'.format(g)] = ct
 
         # only display data in first level row
@@ -1079,3 +2297,518 @@ class TableOne(object):
         warnings.warn('"{}" has all non-numeric values. Consider including ' +
                       'it in the list of categorical ' +
                       'variables.'.format(c), RuntimeWarning, stacklevel=2)
+
+
+class TableOneSpec(object):
+    """
+    The arguments of TableOne, checked and compiled once, for creating the
+    same table from many datasets.
+
+    A spec is immutable: its dicts are read-only copies, and each table
+    takes its own copy, so one spec can be shared between threads. Only
+    the checks that need the data are repeated for each dataset: that the
+    columns exist and are not duplicated, and the detection of categorical
+    columns if categorical is not specified.
+
+    Parameters
+    ----------
+        The parameters are as for TableOne, without data and cache.
+
+    Examples
+    ----------
+        spec = TableOneSpec(columns=columns, categorical=categorical,
+                            groupby='death')
+        tables = spec.run_many({'icu': icu, 'ward': ward})
+    """
+
+    __slots__ = ['columns', 'categorical', 'groupby', 'nonnormal', 'pval',
+                 'pval_adjust', 'missing', 'ddof', 'rename', 'sort', 'limit',
+                 'order', 'remarks', 'label_suffix', 'decimals',
+                 'reverse_missing', 'n_jobs']
+
+    def __init__(self, columns=None, categorical=None, groupby=None,
+                 nonnormal=None, pval=False, pval_adjust=None, isnull=None,
+                 missing=True, ddof=1, labels=None, rename=None, sort=False,
+                 limit=None, order=None, remarks=True, label_suffix=False,
+                 decimals=1, reverse_missing=False, n_jobs=1):
+
+        # labels is now rename
+        if labels is not None and rename is not None:
+            raise TypeError("TableOne received both labels and rename.")
+        elif labels is not None:
+            warnings.warn("The labels argument is deprecated; use " +
+                          "rename instead.", DeprecationWarning)
+            rename = labels
+
+        # isnull is now missing
+        if isnull is not None:
+            warnings.warn("The isnull argument is deprecated; use " +
+                          "missing instead.", DeprecationWarning)
+            missing = isnull
+
+        # groupby should be a string
+        if not groupby:
+            groupby = ''
+        elif groupby and type(groupby) == list:
+            groupby = groupby[0]
+
+        # nonnormal should be a string
+        if not nonnormal:
+            nonnormal = []
+        elif nonnormal and type(nonnormal) == str:
+            nonnormal = [nonnormal]
+
+        # None if categorical columns are to be detected
+        if not categorical and type(categorical) != list:
+            categorical = None
+        else:
+            categorical = tuple(categorical)
+
+        # ensure that values to order are strings
+        if order:
+            order = dict((k, ["{}".format(v) for v in order[k]])
+                         for k in order)
+
+        if pval and not groupby:
+            raise InputError("If pval=True then groupby must be specified.")
+
+        values = dict(
+            columns=tuple(columns) if columns is not None and len(columns)
+            else None,
+            categorical=categorical, groupby=groupby,
+            nonnormal=tuple(nonnormal), pval=pval, pval_adjust=pval_adjust,
+            missing=missing, ddof=ddof, rename=_frozen(rename), sort=sort,
+            limit=_frozen(limit), order=_frozen(order), remarks=remarks,
+            label_suffix=label_suffix, decimals=_frozen(decimals),
+            reverse_missing=reverse_missing,
+            n_jobs=os.cpu_count() if n_jobs == -1 else max(n_jobs, 1))
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('TableOneSpec is immutable.')
+
+    def __delattr__(self, name):
+        raise AttributeError('TableOneSpec is immutable.')
+
+    def run(self, data):
+        """
+        Create TableOne for a dataset.
+
+        Parameters
+        ----------
+            data : pandas DataFrame
+                The input dataset.
+
+        Returns
+        ----------
+            table : TableOne
+                The table, as TableOne(data, ...) with the same arguments.
+        """
+        table = TableOne.__new__(TableOne)
+        table._apply_spec(data, self)
+        table._create(data)
+        return table
+
+    def run_many(self, frames, max_workers=None):
+        """
+        Create TableOne for several datasets in a pool of threads.
+
+        Parameters
+        ----------
+            frames : iterable or dict of pandas DataFrame
+                The input datasets.
+            max_workers : int, optional
+                Number of threads, as for ThreadPoolExecutor.
+
+        Returns
+        ----------
+            tables : list or dict
+                The TableOne of each dataset, in the same order, or with the
+                same keys if frames is a dict.
+        """
+        with ThreadPoolExecutor(max_workers) as pool:
+            if isinstance(frames, dict):
+                return dict(zip(frames, pool.map(self.run, frames.values())))
+            return list(pool.map(self.run, frames))
+
+
+class CohortIndex(object):
+    """
+    Index of a cohort, for creating TableOne for many subsets of its rows.
+
+    The data is encoded once: the continuous columns as a float64 matrix
+    with the sorted order of each column, and the categorical and groupby
+    columns as the level code of each row, with a bitmap of the rows of
+    each level. A filter such as "death == 0 and Age >= 65" is evaluated
+    on the bitmaps, and the tables are summarised from the selected rows
+    of the encoded data, without a filtered copy of the DataFrame.
+
+    Parameters
+    ----------
+        data : pandas DataFrame
+            The cohort. It must not be changed while the index is used.
+        columns : list, optional
+            The columns that tables may show and filters may use (default:
+            all columns).
+        categorical : list, optional
+            List of columns that contain categorical variables, detected as
+            for TableOne if not specified.
+        groupby : str or list, optional
+            Other columns to stratify or filter by.
+
+    Examples
+    ----------
+        cohort = CohortIndex(data, columns=columns, categorical=categorical)
+        table = cohort.table_one("death == 0 and ICU in ['SICU', 'MICU']",
+                                 groupby='death', pval=True)
+    """
+
+    # comparisons of a filter, and the same with the operands swapped
+    _operators = {ast.Eq: (operator.eq, ast.Eq),
+                  ast.NotEq: (operator.ne, ast.NotEq),
+                  ast.Lt: (operator.lt, ast.Gt),
+                  ast.LtE: (operator.le, ast.GtE),
+                  ast.Gt: (operator.gt, ast.Lt),
+                  ast.GtE: (operator.ge, ast.LtE)}
+    _logical = {'&': 'and', '|': 'or', '~': 'not'}
+
+    def __init__(self, data, columns=None, categorical=None, groupby=None):
+        if isinstance(groupby, str):
+            groupby = [groupby]
+        template = TableOne.__new__(TableOne)
+        template._set_options(data, columns=columns, categorical=categorical)
+        self._columns = template._columns
+        self._categorical = template._categorical
+        self._continuous = template._continuous
+        extra = [c for c in groupby or [] if c not in self._columns]
+        if not set(extra).issubset(data.columns):
+            raise InputError("Columns not found in " +
+                             "dataset: {}".format(set(extra) - set(data.columns)))
+        self._n_rows = len(data)
+        # the column checks of each table only need the columns
+        self._head = data.iloc[:1]
+
+        # continuous columns, and the rows in the order of each, nulls last
+        self._values = template._coerce_continuous(data, self._continuous)
+        self._sorted = np.argsort(self._values, axis=0, kind='stable')
+        self._sorted_values = np.take_along_axis(self._values, self._sorted,
+                                                 axis=0)
+        self._valid = np.count_nonzero(~np.isnan(self._values), axis=0)
+
+        # level code of each row, -1 if null, and the rows of each level
+        self._levels = {}
+        for c in self._categorical + extra:
+            column = data[c]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                codes = np.asarray(column.cat.codes, dtype=np.intp)
+                levels = np.asarray(column.cat.categories, dtype=object)
+                categories = True
+            else:
+                codes, levels = pd.factorize(column.values)
+                levels = np.asarray(levels, dtype=object)
+                categories = False
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(levels) + 1))
+            self._levels[c] = (codes, levels, categories, order, bounds)
+        self._bitmaps = {}
+        self._all = np.packbits(np.ones(self._n_rows, dtype=bool))
+
+        # slots of the level counts of the tables, as for _count_levels
+        variables = sorted(self._categorical)
+        slot_var, slot_label = [np.zeros(0, dtype=int)], [np.zeros(0, object)]
+        self._slot_codes = np.zeros((self._n_rows, len(variables)),
+                                    dtype=np.intp)
+        offset = 0
+        for j, v in enumerate(variables):
+            codes, labels = template._factorize_cat(data[v].values)
+            self._slot_codes[:, j] = offset + np.where(codes >= 0, codes,
+                                                       len(labels))
+            slot_var.append(np.full(len(labels) + 1, j))
+            slot_label.append(np.append(labels, None))
+            offset += len(labels) + 1
+        self._slots = (variables, np.concatenate(slot_var),
+                       np.concatenate(slot_label))
+
+    def table_one(self, filter_expr=None, groupby=None, columns=None,
+                  **options):
+        """
+        Create TableOne for the rows of the cohort that match a filter.
+
+        The filter is a Python expression of comparisons of a column with
+        values, as for DataFrame.query: ==, !=, <, <=, >, >=, in and not
+        in, combined with and, or, not, &, | and ~. Columns that are not
+        identifiers are quoted in backticks. Values are compared with the
+        values in the data, so a null never matches, except for != and not
+        in, as for pandas. The diagnostics of remarks=True take most of
+        the time of a table of many rows; remarks=False skips them.
+
+        Parameters
+        ----------
+            filter_expr : str, optional
+                The rows to summarise (default: None, all rows).
+            groupby : str, optional
+                A categorical or groupby column of the index to stratify
+                by.
+            columns : list, optional
+                The indexed columns to show (default: all columns).
+
+        The other parameters are as for TableOne, without data, categorical
+        and cache.
+
+        Returns
+        ----------
+            table : TableOne
+                The table, as for TableOne of the filtered rows.
+        """
+        if columns is None:
+            columns = self._columns
+        elif not set(columns).issubset(self._columns):
+            raise InputError("Columns not in the index: " +
+                             "{}".format(set(columns) - set(self._columns)))
+        if isinstance(groupby, list):
+            groupby = groupby[0] if groupby else None
+        if groupby and groupby not in self._levels:
+            raise InputError("groupby must be a categorical or groupby " +
+                             "column of the index: {}".format(groupby))
+        rows = self._select(filter_expr)
+        if not len(rows):
+            raise InputError('No rows match the filter: ' +
+                             '{}'.format(filter_expr))
+
+        table = TableOne.__new__(TableOne)
+        table._apply_spec(self._head, TableOneSpec(
+            columns=columns, groupby=groupby,
+            categorical=[c for c in self._categorical if c in columns],
+            **options))
+        if table._groupby:
+            table._groupbylvls, group_codes = self._group(table._groupby, rows)
+        else:
+            table._groupbylvls = ['Overall']
+            group_codes = np.zeros(len(rows), dtype=np.intp)
+        table._check_group_levels()
+
+        # the numeric block of _create_numeric_block, from the encoded rows
+        table._encode_groups(group_codes)
+        cont = [self._continuous.index(c) for c in table._continuous]
+        table._cont_values = self._values[np.ix_(rows[table._group_order],
+                                                 cont)]
+        table._cont_nan = np.isnan(table._cont_values)
+        nulls = list(table._cont_nan.sum(axis=0))
+        nulls += [np.count_nonzero(self._levels[c][0][rows] < 0)
+                  for c in table._categorical]
+        table._missing = pd.Series(np.array(nulls, dtype=np.int64),
+                                   index=pd.Index(table._continuous +
+                                                  table._categorical,
+                                                  name='variable'))
+        table._n_rows = len(rows)
+        table._cont_kruskal = {}
+        table._cont_stats = [table._describe_block(block, nan)
+                             for block, nan in table._group_blocks()]
+        table._cat_counts = self._count_levels(
+            table._categorical, rows, group_codes, len(table._groupbylvls))
+        if table._limit:
+            table._value_counts = dict((k, self._value_counts(k, rows))
+                                       for k in table._categorical)
+        table._create_tables()
+        return table
+
+    def _select(self, filter_expr):
+        """
+        Positions of the rows that match a filter.
+        """
+        if filter_expr is None:
+            return np.arange(self._n_rows)
+
+        # replace the quoted columns with names
+        quoted = {}
+
+        def quote(match):
+            name = '_quoted_{}'.format(len(quoted))
+            quoted[name] = match.group(1)
+            return name
+        expr = re.sub('`([^`]*)`', quote, filter_expr)
+        try:
+            # &, | and ~ bind less tightly than comparisons, as in query
+            tokens = [(tokenize.NAME, self._logical[t.string])
+                      if t.type == tokenize.OP and t.string in self._logical
+                      else (t.type, t.string)
+                      for t in tokenize.generate_tokens(
+                          io.StringIO(expr).readline)]
+            tree = ast.parse(tokenize.untokenize(tokens).strip(),
+                             mode='eval')
+        except (SyntaxError, tokenize.TokenError):
+            raise InputError('Invalid filter: {}'.format(filter_expr))
+        bits = self._evaluate(tree.body, quoted)
+        return np.flatnonzero(np.unpackbits(bits, count=self._n_rows))
+
+    def _evaluate(self, node, quoted):
+        """
+        Bitmap of the rows that match a node of a filter.
+        """
+        if isinstance(node, ast.BoolOp):
+            combine = (np.bitwise_and if isinstance(node.op, ast.And)
+                       else np.bitwise_or)
+            bits = self._evaluate(node.values[0], quoted)
+            for value in node.values[1:]:
+                bits = combine(bits, self._evaluate(value, quoted))
+            return bits
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return self._all & ~self._evaluate(node.operand, quoted)
+        if isinstance(node, ast.Compare):
+            # a chain such as 18 <= Age < 65 is a conjunction of pairs
+            bits = self._all
+            operands = [node.left] + node.comparators
+            for left, op, right in zip(operands, node.ops, operands[1:]):
+                bits = bits & self._compare(left, op, right, quoted)
+            return bits
+        if isinstance(node, ast.Name):
+            # a boolean column on its own
+            return self._compare_column(quoted.get(node.id, node.id),
+                                        ast.Eq(), True)
+        raise InputError('Unsupported filter: {}'.format(ast.dump(node)))
+
+    def _compare(self, left, op, right, quoted):
+        """
+        Bitmap of the rows where a column compares true with a value.
+        """
+        if not isinstance(left, ast.Name):
+            if type(op) not in self._operators:
+                raise InputError('The column must be on the left of ' +
+                                 '"in" in a filter.')
+            left, op, right = right, self._operators[type(op)][1](), left
+        if not isinstance(left, ast.Name):
+            raise InputError('A filter must compare a column with values.')
+        column = quoted.get(left.id, left.id)
+        try:
+            value = ast.literal_eval(right)
+        except ValueError:
+            raise InputError('Filter values must be literals: ' +
+                             '{}'.format(ast.dump(right)))
+
+        # != and not in are the complements of == and in
+        if isinstance(op, (ast.NotEq, ast.NotIn)):
+            op = ast.Eq() if isinstance(op, ast.NotEq) else ast.In()
+            return self._all & ~self._compare_column(column, op, value)
+        return self._compare_column(column, op, value)
+
+    def _compare_column(self, column, op, value):
+        """
+        Bitmap of the rows where a column compares true with a value, for
+        ==, in, <, <=, > and >=.
+        """
+        if isinstance(op, ast.In):
+            try:
+                values = list(value)
+            except TypeError:
+                raise InputError('"in" needs a list of values: ' +
+                                 '{}'.format(value))
+            op = ast.Eq()
+        else:
+            values = [value]
+        compare = self._operators[type(op)][0]
+
+        bits = np.zeros_like(self._all)
+        if column in self._levels:
+            # the union of the bitmaps of the matching levels
+            levels = self._levels[column][1]
+            for i, level in enumerate(levels):
+                try:
+                    match = any(bool(compare(level, v)) for v in values)
+                except TypeError:
+                    raise InputError('Cannot compare {} with {}.'.format(
+                        column, value))
+                if match:
+                    bits |= self._level_bits(column, i)
+        elif column in self._continuous:
+            j = self._continuous.index(column)
+            ranked = self._sorted_values[:self._valid[j], j]
+            for v in values:
+                try:
+                    lo = np.searchsorted(ranked, v, side='left')
+                    hi = np.searchsorted(ranked, v, side='right')
+                except TypeError:
+                    raise InputError('Cannot compare {} with {}.'.format(
+                        column, value))
+                start, stop = {operator.eq: (lo, hi), operator.lt: (0, lo),
+                               operator.le: (0, hi),
+                               operator.gt: (hi, len(ranked)),
+                               operator.ge: (lo, len(ranked))}[compare]
+                bits |= self._bits(self._sorted[start:stop, j])
+        else:
+            raise InputError('Filter column not in the index: ' +
+                             '{}'.format(column))
+        return bits
+
+    def _bits(self, rows):
+        """
+        Bitmap of a set of rows.
+        """
+        mask = np.zeros(self._n_rows, dtype=bool)
+        mask[rows] = True
+        return np.packbits(mask)
+
+    def _level_bits(self, column, i):
+        """
+        Bitmap of the rows of a level of a column, made when first used.
+        """
+        key = (column, i)
+        if key not in self._bitmaps:
+            codes, levels, categories, order, bounds = self._levels[column]
+            self._bitmaps[key] = self._bits(order[bounds[i]:bounds[i + 1]])
+        return self._bitmaps[key]
+
+    def _group(self, groupby, rows):
+        """
+        Group levels of the selected rows, as _group_levels, and the group
+        code of each row.
+        """
+        codes, levels, categories, order, bounds = self._levels[groupby]
+        codes = codes[rows]
+        if categories:
+            # unused categories are kept as (empty) levels
+            present = np.arange(len(levels))
+        else:
+            present = np.flatnonzero(np.bincount(codes[codes >= 0],
+                                                 minlength=len(levels)))
+        present = sorted(present, key=lambda i: levels[i])
+        rank = np.full(len(levels) + 1, -1, dtype=np.intp)
+        rank[present] = np.arange(len(present))
+        return [levels[i] for i in present], rank[codes]
+
+    def _count_levels(self, categorical, rows, group_codes, n_groups):
+        """
+        Level counts of the selected rows in each group, as
+        _count_categorical.
+        """
+        variables, slot_var, slot_label = self._slots
+        counted = sorted(categorical)
+        columns = [variables.index(v) for v in counted]
+        in_group = group_codes >= 0
+        width = len(slot_var)
+        combined = (self._slot_codes[rows[in_group]][:, columns] + width *
+                    group_codes[in_group, None].astype(np.intp))
+        counts = np.bincount(combined.ravel(), minlength=n_groups * width)
+        counts = counts.reshape(n_groups, width)
+
+        keep = np.isin(slot_var, columns)
+        remap = np.full(len(variables), -1)
+        remap[columns] = np.arange(len(columns))
+        return counted, remap[slot_var[keep]], slot_label[keep], counts[:, keep]
+
+    def _value_counts(self, column, rows):
+        """
+        Frequencies of the levels of the selected rows, as value_counts.
+        """
+        codes, levels, categories, order, bounds = self._levels[column]
+        codes = codes[rows]
+        codes = codes[codes >= 0]
+        counts = np.bincount(codes, minlength=len(levels))
+        if categories:
+            seen = np.arange(len(levels))
+        else:
+            # levels in order of appearance, as value_counts
+            seen, first = np.unique(codes, return_index=True)
+            seen = seen[np.argsort(first)]
+        return pd.Series(counts[seen], index=levels[seen],
+                         name=column).sort_values(ascending=False)
@@ -1,10 +1,14 @@
+import os
 import random
+import shutil
+import tempfile
 import warnings
 
 from nose.tools import with_setup, assert_raises, assert_equal
 import numpy as np
 import modality
 import pandas as pd
+from scipy import stats
 
 import tableone
 from tableone import TableOne
@@ -22,6 +26,7 @@ class TestTableOne(object):
         """
         seed = 12345
         np.random.seed(seed)
+        self.rng = np.random.default_rng(seed)
         self.data_pn = self.create_pn_dataset()
         self.data_sample = self.create_sample_dataset(n=10000)
         self.data_small = self.create_small_dataset()
@@ -283,18 +288,724 @@ class TestTableOne(object):
         Ensure that the package runs Fisher exact if cell counts are <=5
         and it is a 2x2
         """
-        dist_1_peak = modality.generate_data(peaks=1, n=[10000])
+        dist_1_peak = modality.generate_data(peaks=1, n=[10000], rng=self.rng)
         t1 = modality.hartigan_diptest(dist_1_peak)
         assert t1 > 0.95
 
-        dist_2_peak = modality.generate_data(peaks=2, n=[10000, 10000])
+        dist_2_peak = modality.generate_data(peaks=2, n=[10000, 10000],
+                                             mu=[0, 10], rng=self.rng)
         t2 = modality.hartigan_diptest(dist_2_peak)
         assert t2 < 0.05
 
-        dist_3_peak = modality.generate_data(peaks=3, n=[10000, 10000, 10000])
+        dist_3_peak = modality.generate_data(peaks=3,
+                                             n=[10000, 10000, 10000],
+                                             mu=[0, 10, 20], rng=self.rng)
         t3 = modality.hartigan_diptest(dist_3_peak)
         assert t3 < 0.05
 
+    @with_setup(setup, teardown)
+    def test_dip_pval_tabinterpol_matches_tabulated_values(self):
+        """
+        Ensure the p-value interpolation, scalar and vectorized, gives the
+        values of the original table lookup, including N below and above
+        the tabulated sample sizes
+        """
+        dips = np.array([0.001, 0.01, 0.03, 0.05, 0.1])
+        expected = {
+            10: [1.0, 1.0, 1.0, 1.0, 0.44957525137160326],
+            15: [1.0, 1.0, 1.0, 0.992258801595317, 0.19682704132733908],
+            50: [1.0, 1.0, 0.9915023101286458, 0.45842692447920785,
+                 0.0003429483089272267],
+            100: [1.0, 1.0, 0.7903844111329357, 0.06418740391979927, 0.0],
+            999: [1.0, 0.7834898334371461, 4.71751889530303e-06, 0.0, 0.0],
+            5000: [1.0, 0.0018376472437371394, 0.0, 0.0, 0.0],
+            72000: [0.961572623219975, 0.0, 0.0, 0.0, 0.0],
+            100000: [0.8111910613977766, 0.0, 0.0, 0.0, 0.0]}
+        for N, pvals in expected.items():
+            many = modality.dip_pval_tabinterpol_many(dips, np.full(5, N))
+            np.testing.assert_allclose(many, pvals, rtol=1e-12, atol=0)
+            for dip, p in zip(dips, pvals):
+                np.testing.assert_allclose(
+                    modality.dip_pval_tabinterpol(dip, N), p, rtol=1e-12,
+                    atol=0)
+
+        # too few observations
+        for N in [5, 9, np.nan]:
+            assert np.isnan(modality.dip_pval_tabinterpol(0.05, N))
+            assert np.isnan(modality.dip_pval_tabinterpol_many(
+                np.array([0.05]), np.array([N]))[0])
+
+    @with_setup(setup, teardown)
+    def test_least_concave_majorant_of_tied_data(self):
+        """
+        Ensure the concave majorant of an empirical distribution function
+        with tied values lies above every point and is concave
+        """
+        data = np.round(np.random.normal(0, 3, 2000))
+        xF, yF = modality.cum_distr(data)
+        i = modality.least_concave_majorant_sorted(xF, yF)
+
+        # the majorant starts with a vertical step at the first value
+        assert i[0] == 0 and i[-1] == len(xF) - 1
+        assert xF[i[0]] == xF[i[1]] and (np.diff(xF[i[1:]]) > 0).all()
+        slopes = np.diff(yF[i[1:]])/np.diff(xF[i[1:]])
+        assert (np.diff(slopes) <= 1e-12).all()
+        assert (np.interp(xF, xF[i[1:]], yF[i[1:]]) >= yF - 1e-12).all()
+
+        # the minorant ends with a vertical step at the last value
+        j = modality.greatest_convex_minorant_sorted(xF, yF)
+        assert xF[j[-2]] == xF[j[-1]] and (np.diff(xF[j[:-1]]) > 0).all()
+        assert (np.interp(xF, xF[j[:-1]], yF[j[:-1]]) <= yF + 1e-12).all()
+
+    @with_setup(setup, teardown)
+    def test_dip_only_engine_matches_closest_unimodal(self):
+        """
+        Ensure the dip-only fast path returns the same dip as the closest
+        unimodal construction
+        """
+        data = modality.generate_data(peaks=2, n=[500, 700], rng=self.rng)
+        xF, yF = modality.cum_distr(data)
+        dip, (xU, yU) = modality.dip_and_closest_unimodal_from_cdf(xF, yF)
+
+        assert modality.dip_from_cdf(xF, yF) == dip
+        dip_opt_in, _ = modality.dip_from_cdf(xF, yF, closest_unimodal=True)
+        assert dip_opt_in == dip
+        assert yU[0] == 0 and yU[-1] == 1
+
+    @with_setup(setup, teardown)
+    def test_cum_distr_many_matches_cum_distr(self):
+        """
+        Ensure the batched empirical distribution functions match cum_distr
+        row by row, with and without tied values
+        """
+        for data in [np.random.normal(size=(20, 100)),
+                     np.random.randint(0, 5, size=(20, 100))]:
+            x, y, lengths = modality.cum_distr_many(data)
+            for row, xr, yr, n in zip(data, x, y, lengths):
+                xF, yF = modality.cum_distr(row.astype(float))
+                assert n == len(xF)
+                assert np.array_equal(xr[:n], xF)
+                assert np.allclose(yr[:n], yF)
+
+    @with_setup(setup, teardown)
+    def test_unique_chains_near_duplicates(self):
+        """
+        Ensure a value is only dropped if it is within eps of the last value
+        that was kept
+        """
+        data = np.array([0, 0.6, 1.2, 1.5, 3.0])
+        data_unique, ind = modality.unique(data, return_index=True, eps=1)
+        assert list(ind) == [0, 2, 4]
+
+    @with_setup(setup, teardown)
+    def test_calibrated_dip_test_reproducible_across_n_jobs(self):
+        """
+        Ensure a seeded calibrated dip test gives the same p-value
+        regardless of the number of worker processes
+        """
+        data = modality.generate_data(peaks=2, n=[200, 200], rng=self.rng)
+        p1 = modality.calibrated_dip_test(data, N_bootstrap=60, seed=7,
+                                          chunk_size=25)
+        p2 = modality.calibrated_dip_test(data, N_bootstrap=60, seed=7,
+                                          n_jobs=2, chunk_size=25)
+        assert p1 == p2
+        assert 0 <= p1 <= 1
+
+    @with_setup(setup, teardown)
+    def test_dip_null_cache_reuses_and_evicts_entries(self):
+        """
+        Ensure cached null distributions are reused across calls and the
+        least recently used entries are evicted
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            cache = modality.DipNullCache(directory, max_entries=2)
+            data = modality.generate_data(peaks=1, n=[300], rng=self.rng)
+            p1 = modality.calibrated_dip_test(data, N_bootstrap=50, seed=3,
+                                              cache=cache)
+            assert len(os.listdir(directory)) == 1
+            p2 = modality.calibrated_dip_test(data, N_bootstrap=50, seed=3,
+                                              cache=cache)
+            assert p1 == p2
+
+            # n in the same bucket share an entry
+            assert cache.key(modality.RefBeta(2.0), 1000) == \
+                cache.key(modality.RefBeta(2.0), 1020)
+
+            for beta in [2.0, 5.0, 10.0]:
+                cache.ref_dips(modality.RefBeta(beta), 100, N_bootstrap=20)
+            assert len(os.listdir(directory)) == 2
+
+            # the p-value compares with the dips rescaled to n
+            dips = cache.ref_dips(modality.RefBeta(10.0), 90, N_bootstrap=20)
+            for dip in [0.02, np.median(dips), 0.2]:
+                assert cache.pval(dip, modality.RefBeta(10.0), 90,
+                                  N_bootstrap=20) == np.mean(dips > dip)
+
+            # an entry removed by another process is still served
+            for fname in os.listdir(directory):
+                os.remove(os.path.join(directory, fname))
+            cache.ref_dips(modality.RefBeta(10.0), 100, N_bootstrap=20)
+        finally:
+            shutil.rmtree(directory)
+
+    @with_setup(setup, teardown)
+    def test_spec_tables_match_tables_and_spec_is_not_changed(self):
+        """
+        Ensure a TableOneSpec gives the same tables as TableOne for each
+        dataset, and neither changes its arguments
+        """
+        order = {'bear': ['Winnie', 'Pooh']}
+        kwargs = dict(columns=['normal', 'height', 'likesmarmalade', 'bear'],
+                      categorical=['likesmarmalade', 'bear'],
+                      groupby='likesmarmalade', pval=True, order=order)
+        spec = tableone.TableOneSpec(**kwargs)
+        frames = {'all': self.data_sample,
+                  'first': self.data_sample.iloc[:5000],
+                  'last': self.data_sample.iloc[5000:]}
+        tables = spec.run_many(frames, max_workers=3)
+
+        assert list(tables) == ['all', 'first', 'last']
+        for name, data in frames.items():
+            t = TableOne(data, **kwargs)
+            pd.testing.assert_frame_equal(tables[name].tableone, t.tableone)
+            pd.testing.assert_frame_equal(spec.run(data).tableone,
+                                          t.tableone)
+        assert order == {'bear': ['Winnie', 'Pooh']}
+        assert spec.order['bear'] == ('Winnie', 'Pooh')
+        assert_raises(AttributeError, setattr, spec, 'pval', False)
+        with assert_raises(TypeError):
+            spec.order['bear'] = []
+
+    @with_setup(setup, teardown)
+    def test_cohort_index_tables_match_tables_of_filtered_data(self):
+        """
+        Ensure tables of a filtered cohort index match the tables of the
+        filtered DataFrame
+        """
+        data = self.data_sample.copy()
+        data.loc[::7, 'normal'] = np.nan
+        columns = ['normal', 'nonnormal', 'likeshoney', 'likesmarmalade',
+                   'bear']
+        categorical = ['likeshoney', 'likesmarmalade', 'bear']
+        cohort = tableone.CohortIndex(data, columns=columns,
+                                      categorical=categorical)
+
+        queries = [
+            (None, 'bear', dict(pval=True)),
+            ("likesmarmalade == 0", 'bear',
+             dict(pval=True, nonnormal=['nonnormal'])),
+            ("bear in ['Winnie', 'Baloo'] and normal >= 9.5", 'bear', {}),
+            ("9 < normal <= 11 & ~(bear == 'Winnie')", 'likesmarmalade',
+             dict(pval=True, limit=2)),
+            ("bear != 'Blossom' or nonnormal > 30", None,
+             dict(order={'bear': ['Baloo']}))]
+        for query, groupby, kwargs in queries:
+            if query is None:
+                subset = data
+            else:
+                subset = data.query(query, engine='python')
+            t1 = TableOne(subset, columns=columns, categorical=categorical,
+                          groupby=groupby, **kwargs)
+            t2 = cohort.table_one(query, groupby=groupby, **kwargs)
+            pd.testing.assert_frame_equal(t1.tableone, t2.tableone)
+            pd.testing.assert_frame_equal(t1.cont_describe, t2.cont_describe)
+            pd.testing.assert_frame_equal(t1.cat_describe, t2.cat_describe)
+
+        assert_raises(InputError, cohort.table_one, "height > 1")
+        assert_raises(InputError, cohort.table_one, "normal > 100")
+
+    @with_setup(setup, teardown)
+    def test_result_cache_reuses_tables_and_evicts_entries(self):
+        """
+        Ensure a cached table is read back unchanged, a change of the data
+        or arguments misses, and entries over the size limit are evicted
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            df = self.data_sample
+            kwargs = dict(columns=['normal', 'nonnormal', 'bear'],
+                          groupby='bear', pval=True, cache=directory)
+            t1 = TableOne(df, **kwargs)
+            t2 = TableOne(df, **kwargs)
+            assert len(os.listdir(directory)) == 1
+            pd.testing.assert_frame_equal(t1.tableone, t2.tableone)
+            pd.testing.assert_frame_equal(t1.cont_describe, t2.cont_describe)
+            assert_equal(str(t1), str(t2))
+
+            TableOne(df, decimals=2, **kwargs)
+            df2 = df.copy()
+            df2.loc[0, 'normal'] += 1
+            TableOne(df2, **kwargs)
+            assert len(os.listdir(directory)) == 3
+
+            kwargs['cache'] = tableone.ResultCache(directory, max_bytes=1)
+            TableOne(df, decimals=3, **kwargs)
+            assert len(os.listdir(directory)) == 0
+        finally:
+            shutil.rmtree(directory)
+
+    @with_setup(setup, teardown)
+    def test_binned_kernel_density_matches_exact(self):
+        """
+        Ensure the binned kernel density estimate and its second derivative
+        agree with exact evaluation within the requested tolerance
+        """
+        data = modality.generate_data(peaks=2, n=[1000, 1000], rng=self.rng)
+        x = np.linspace(np.min(data), np.max(data), 512)
+        for deriv_order in [0, 2]:
+            exact = modality.KernelDensityDerivative(data, deriv_order)
+            binned = modality.KernelDensityDerivative(data, deriv_order,
+                                                      tol=1e-4)
+            f_exact = exact.evaluate(x)
+            f_binned = binned.evaluate(x)
+            assert np.max(np.abs(f_binned - f_exact)) <= \
+                1e-4*np.max(np.abs(f_exact))
+
+    @with_setup(setup, teardown)
+    def test_hartigan_diptest_frame_matches_per_cell_test(self):
+        """
+        Ensure the batched dip test gives the same p-values as calling
+        hartigan_diptest on every (variable, group) cell
+        """
+        df = self.data_sample[['normal', 'nonnormal', 'likeshoney']]
+        groups = self.data_sample['bear']
+        res = modality.hartigan_diptest_frame(df, groups=groups, n_jobs=2)
+
+        assert len(res) == 3 * groups.nunique()
+        for _, row in res.iterrows():
+            x = df.loc[groups == row['group'], row['variable']].values
+            p = modality.hartigan_diptest(x)
+            assert (np.isnan(p) and np.isnan(row['pval'])) or p == row['pval']
+
+    @with_setup(setup, teardown)
+    def test_dip_from_merged_sketches_within_error_bound(self):
+        """
+        Ensure the dip from merged, serialized shard sketches stays within
+        the documented error bound of the exact dip
+        """
+        data = modality.generate_data(peaks=2, n=[10000, 10000], rng=self.rng)
+        np.random.shuffle(data)
+        shards = np.array_split(data, 4)
+
+        sketch = modality.QuantileSketch(k=1024, seed=0)
+        for shard in shards:
+            shard_sketch = modality.QuantileSketch(k=1024, seed=1)
+            for chunk in np.array_split(shard, 5):
+                shard_sketch.update(chunk)
+            shard_sketch = modality.QuantileSketch.from_bytes(
+                shard_sketch.to_bytes())
+            sketch.merge(shard_sketch)
+
+        assert sketch.count == len(data)
+        dip_exact = modality.dip_from_cdf(*modality.cum_distr(data))
+        dip_sketch = modality.dip_from_sketch(sketch)
+        bound = sketch.rank_error_bound() / sketch.count
+        assert 0 < bound < 0.05
+        assert abs(dip_sketch - dip_exact) <= bound
+
+    @with_setup(setup, teardown)
+    def test_modality_sampling_uses_explicit_streams(self):
+        """
+        Ensure sampling in modality is driven by explicit seeds and leaves
+        the global numpy random state alone
+        """
+        state = np.random.get_state()[1].copy()
+        d1 = modality.generate_data(peaks=2, n=[100, 100], rng=5)
+        d2 = modality.generate_data(peaks=2, n=[100, 100], rng=5)
+        assert np.array_equal(d1, d2)
+        for ref in [modality.RefGaussian(), modality.RefBeta(2.0),
+                    modality.RefStudentt(2.0)]:
+            assert np.array_equal(ref.sample(50, rng=1), ref.sample(50, rng=1))
+        assert np.array_equal(np.random.get_state()[1], state)
+
+        s1 = [rng.random() for rng in modality.spawn_rngs(11, 4)]
+        s2 = [rng.random() for rng in modality.spawn_rngs(11, 4)]
+        assert s1 == s2
+        assert len(set(s1)) == 4
+        rng = np.random.default_rng(11)
+        assert not np.array_equal(modality.bootstrap_ref_dips(
+                                      modality.RefGaussian(), 50, 20, rng),
+                                  modality.bootstrap_ref_dips(
+                                      modality.RefGaussian(), 50, 20, rng))
+
+    @with_setup(setup, teardown)
+    def test_cont_describe_matches_per_cell_statistics(self):
+        """
+        Ensure the sort-once summary of continuous data matches numpy
+        statistics computed separately for every variable and group
+        """
+        df = self.data_sample[['normal', 'nonnormal', 'height']].copy()
+        df['group'] = np.random.choice(['a', 'b', 'c'], len(df))
+        df.loc[df.index[:500], 'normal'] = np.nan
+        df.loc[df['group'] == 'c', 'height'] = np.nan
+        df.loc[df.index[:20], 'nonnormal'] = 1e4
+
+        t = TableOne(df, groupby='group', nonnormal=['nonnormal'],
+                     categorical=[])
+        desc = t.cont_describe
+        assert list(desc.index) == ['height', 'nonnormal', 'normal']
+
+        for v in desc.index:
+            for g in ['a', 'b', 'c']:
+                x = df.loc[df['group'] == g, v].values
+                x = x[~np.isnan(x)]
+                if len(x) == 0:
+                    assert desc.loc[v, ('count', g)] == 0
+                    assert np.isnan(desc.loc[v, ('median', g)])
+                    assert desc.loc[v, ('outliers', g)] == 0
+                    continue
+                q1, q3 = np.percentile(x, [25, 75])
+                far = ((x < q1 - 3 * (q3 - q1)) |
+                       (x > q3 + 3 * (q3 - q1))).sum()
+                assert desc.loc[v, ('count', g)] == len(x)
+                assert np.isclose(desc.loc[v, ('mean', g)], np.mean(x))
+                assert np.isclose(desc.loc[v, ('std', g)], np.std(x, ddof=1))
+                assert desc.loc[v, ('median', g)] == np.median(x)
+                assert desc.loc[v, ('q25', g)] == q1
+                assert desc.loc[v, ('q75', g)] == q3
+                assert desc.loc[v, ('min', g)] == np.min(x)
+                assert desc.loc[v, ('max', g)] == np.max(x)
+                assert desc.loc[v, ('far_outliers', g)] == far
+
+    @with_setup(setup, teardown)
+    def test_diagnostics_are_computed_on_demand(self):
+        """
+        Ensure the diagnostics are only computed on access, and match the
+        columns of the table with remarks
+        """
+        columns = ['normal', 'nonnormal', 'height', 'bear']
+        t1 = TableOne(self.data_sample, columns=columns, groupby='bear',
+                      remarks=False)
+        assert t1._diagnostics is None
+        assert 'diptest' not in t1.cont_describe.columns.levels[0]
+
+        t2 = TableOne(self.data_sample, columns=columns, groupby='bear')
+        assert t2._diagnostics is None
+        # the printed table ends with the remarks either way
+        assert str(t1) == str(t2)
+        assert str(t1).startswith(t1.tableone.to_string() + '\n[1] ')
+        diag_cols = ['diptest', 'outliers', 'far_outliers', 'normaltest']
+        assert_equal(list(pd.unique(t2.cont_describe.columns.get_level_values(
+            0)))[-4:], diag_cols)
+        pd.testing.assert_frame_equal(t1.diagnostics,
+                                      t2.cont_describe[diag_cols])
+        assert t1.diagnostics is t1._diagnostics
+
+        # rows without a group are left out of the diagnostics
+        df = self.data_sample[columns].copy()
+        df.loc[df.index[:100], 'bear'] = np.nan
+        t3 = TableOne(df, columns=columns, groupby='bear', remarks=False)
+        assert_equal(list(t3.diagnostics[('outliers', 'Winnie')]),
+                     list(TableOne(df.dropna(subset=['bear']),
+                                   columns=columns, groupby='bear')
+                          .cont_describe[('outliers', 'Winnie')]))
+
+    @with_setup(setup, teardown)
+    def test_cont_describe_can_be_changed_in_place(self):
+        """
+        Ensure cont_describe with remarks is one frame that keeps changes
+        made in place, until it is set or the table is rendered again
+        """
+        columns = ['normal', 'nonnormal', 'height', 'bear']
+        t = TableOne(self.data_sample, columns=columns, groupby='bear')
+        assert t.cont_describe is t.cont_describe
+        t.cont_describe.loc['normal', ('mean', 'Winnie')] = -1.0
+        assert_equal(t.cont_describe.loc['normal', ('mean', 'Winnie')], -1.0)
+        assert 'diptest' in t.cont_describe.columns.levels[0]
+
+        # setting the combined frame back does not repeat the diagnostics
+        n_columns = len(t.cont_describe.columns)
+        t.cont_describe = t.cont_describe.copy()
+        assert_equal(len(t.cont_describe.columns), n_columns)
+        assert_equal(t.cont_describe.loc['normal', ('mean', 'Winnie')], -1.0)
+
+        t.render(decimals=2)
+        assert t.cont_describe.loc['normal', ('mean', 'Winnie')] != -1.0
+        assert 'diptest' in t.cont_describe.columns.levels[0]
+
+    @with_setup(setup, teardown)
+    def test_categorical_column_with_only_null_values(self):
+        """
+        Ensure a categorical column with no values is left out of the table,
+        with and without groupby
+        """
+        df = self.data_groups.copy()
+        df['empty'] = np.nan
+        t1 = TableOne(df, columns=['age', 'empty'], categorical=['empty'])
+        t2 = TableOne(df, columns=['age'])
+        pd.testing.assert_frame_equal(t1.tableone, t2.tableone)
+        assert t1.cat_describe.empty
+
+        t3 = TableOne(df, columns=['age', 'empty', 'group'],
+                      categorical=['empty', 'group'], groupby='group')
+        t4 = TableOne(df, columns=['age', 'group'], categorical=['group'],
+                      groupby='group')
+        pd.testing.assert_frame_equal(t3.tableone, t4.tableone)
+
+    @with_setup(setup, teardown)
+    def test_cat_describe_matches_value_counts(self):
+        """
+        Ensure the integer-coded categorical summary matches value counts
+        of the string labels for every group
+        """
+        n = 2000
+        df = pd.DataFrame({'group': np.random.randint(0, 40, n),
+                           'level': np.random.randint(0, 30, n),
+                           'mixed': np.random.choice([1, '1', 1.0, None], n)})
+        t = TableOne(df, columns=['level', 'mixed'], groupby='group',
+                     categorical=['level', 'mixed'])
+        desc = t.cat_describe
+
+        for g in t._groupbylvls:
+            d = df[df['group'] == g]
+            for v in ['level', 'mixed']:
+                counts = d[v].dropna().map(str).value_counts()
+                freq = desc[('freq', g)].loc[v].dropna()
+                assert_equal(dict(freq.astype(int)), dict(counts))
+                assert (desc[('n', g)].loc[v].dropna() == len(
+                    d[v].dropna())).all()
+                first = freq.sort_index().index[0]
+                assert (desc[('Missing', g)].loc[(v, first)] ==
+                        d[v].isnull().sum())
+
+    @with_setup(setup, teardown)
+    def test_batched_significance_tests_match_scipy(self):
+        """
+        Ensure the batched significance tests match the scipy tests run
+        separately for every variable
+        """
+        n = 150
+        for n_groups in [2, 3]:
+            df = pd.DataFrame({'group': np.random.randint(0, n_groups, n),
+                               'normal': np.random.normal(size=n),
+                               'skewed': np.random.gamma(2, size=n),
+                               'rare': np.where(np.random.rand(n) < 0.05,
+                                                'a', 'b'),
+                               'level': np.random.choice(list('pqr'), n)})
+            df.loc[df.index[:10], 'normal'] = np.nan
+            t = TableOne(df, groupby='group', nonnormal=['skewed'],
+                         categorical=['rare', 'level'], pval=True)
+            sig = t._significance_table
+
+            grouped = {v: [df.loc[df['group'] == g, v].dropna().values
+                           for g in range(n_groups)]
+                       for v in ['normal', 'skewed']}
+            if n_groups == 2:
+                p = stats.ttest_ind(*grouped['normal'], equal_var=False)[1]
+            else:
+                p = stats.f_oneway(*grouped['normal'])[1]
+            assert np.isclose(sig.loc['normal', 'P-Value'], p)
+            assert np.isclose(sig.loc['skewed', 'P-Value'],
+                              stats.kruskal(*grouped['skewed'])[1])
+            assert_equal(sig.loc['skewed', 'Test'], 'Kruskal-Wallis')
+            assert_equal(sig.loc['normal', 'min_observed'],
+                         min(len(x) for x in grouped['normal']))
+
+            for v in ['rare', 'level']:
+                table = pd.crosstab(df['group'], df[v])
+                chi2, p, dof, expected = stats.chi2_contingency(table)
+                if table.shape == (2, 2) and expected.min() < 5:
+                    assert_equal(sig.loc[v, 'Test'], "Fisher's exact")
+                    p = stats.fisher_exact(table)[1]
+                assert np.isclose(sig.loc[v, 'P-Value'], p)
+
+    @with_setup(setup, teardown)
+    def test_anova_with_single_value_group_matches_scipy(self):
+        """
+        Ensure a group with a single value does not prevent the one-way
+        ANOVA, as in scipy
+        """
+        df = pd.DataFrame({'x': [1.0, 2.0, 5.0, 3.0, np.nan],
+                           'group': ['a', 'a', 'b', 'c', 'c']})
+        p = stats.f_oneway([1.0, 2.0], [5.0], [3.0])[1]
+        t1 = TableOne(df, columns=['x'], groupby='group', pval=True)
+        t2 = TableOne.from_chunks([df.iloc[:2], df.iloc[2:]], columns=['x'],
+                                  groupby='group', pval=True)
+        for t in [t1, t2]:
+            sig = t._significance_table
+            assert_equal(sig.loc['x', 'Test'], 'One-way ANOVA')
+            assert np.isclose(sig.loc['x', 'P-Value'], p)
+
+    @with_setup(setup, teardown)
+    def test_group_levels_include_unused_categories(self):
+        """
+        Ensure unused categories of a categorical groupby column are shown
+        as empty groups, and rows without a group are left out
+        """
+        df = self.data_sample[['normal', 'likeshoney', 'bear']].copy()
+        df['bear'] = pd.Categorical(df['bear'],
+                                    categories=['Baloo', 'Blossom', 'Pooh',
+                                                'Paddington', 'Winnie'])
+        df.loc[df.index[:50], 'bear'] = np.nan
+        t = TableOne(df, groupby='bear', categorical=['likeshoney'])
+
+        assert_equal(t._groupbylvls, ['Baloo', 'Blossom', 'Paddington',
+                                      'Pooh', 'Winnie'])
+        assert_equal(t.cont_describe.loc['normal', ('count', 'Pooh')], 0)
+        assert_equal(t.diagnostics.loc['normal', ('diptest', 'Pooh')], -1)
+        for g in ['Baloo', 'Blossom', 'Paddington', 'Winnie']:
+            assert_equal(t.cont_describe.loc['normal', ('count', g)],
+                         df.loc[df['bear'] == g, 'normal'].count())
+        assert_equal(str(t.tableone.loc[('n', ''),
+                                        ('Grouped by bear', 'Pooh')]), '0')
+
+    @with_setup(setup, teardown)
+    def test_table_from_chunks_matches_table_from_data(self):
+        """
+        Ensure a table built from chunks of the data matches the table
+        built from the whole data, while the quantile sketches are exact
+        """
+        df = self.data_sample.copy()
+        df.loc[df.index[::7], 'normal'] = np.nan
+        df.loc[df.index[::11], 'likeshoney'] = np.nan
+        columns = ['normal', 'nonnormal', 'height', 'likeshoney', 'bear']
+        kwargs = dict(columns=columns, categorical=['likeshoney'],
+                      groupby='bear', pval=True, limit={'likeshoney': 1})
+        t1 = TableOne(df, remarks=False, **kwargs)
+        chunks = (df.iloc[i:i + 1500] for i in range(0, len(df), 1500))
+        t2 = TableOne.from_chunks(chunks, **kwargs)
+
+        pd.testing.assert_frame_equal(t1.tableone, t2.tableone)
+        pd.testing.assert_frame_equal(t1.cont_describe, t2.cont_describe,
+                                      check_dtype=False)
+        pd.testing.assert_frame_equal(t1.cat_describe, t2.cat_describe)
+
+    @with_setup(setup, teardown)
+    def test_stratified_tables_match_separate_tables(self):
+        """
+        Ensure the tables of several stratifications computed in one pass
+        match the tables computed one at a time
+        """
+        df = self.data_sample.copy()
+        df.loc[df.index[::13], 'fictional'] = np.nan
+        columns = ['normal', 'nonnormal', 'likesmarmalade', 'fictional',
+                   'bear']
+        kwargs = dict(columns=columns, nonnormal=['nonnormal'],
+                      categorical=['likesmarmalade', 'fictional', 'bear'])
+        tables = TableOne.stratified(df, [None, 'bear', 'fictional',
+                                          ('bear', 'likesmarmalade')],
+                                     pval=True, **kwargs)
+
+        for groupby in [None, 'bear', 'fictional']:
+            t = TableOne(df, groupby=groupby, pval=groupby is not None,
+                         **kwargs)
+            pd.testing.assert_frame_equal(t.tableone, tables[groupby].tableone)
+            pd.testing.assert_frame_equal(t.cont_describe,
+                                          tables[groupby].cont_describe)
+
+        crossed = tables[('bear', 'likesmarmalade')]
+        assert_equal(crossed._groupbylvls, ['Baloo, 0', 'Blossom, 0',
+                                            'Paddington, 1', 'Winnie, 0'])
+        assert_equal(list(crossed.cont_describe['count', 'Paddington, 1']),
+                     list(tables['bear'].cont_describe['count',
+                                                       'Paddington']))
+
+        combined = TableOne.stratified(df, [None, 'bear'], combine=True,
+                                       **kwargs)
+        assert_equal(combined[('Overall', 'Overall')]['n', ''], 10000)
+
+    @with_setup(setup, teardown)
+    def test_render_matches_table_created_with_display_options(self):
+        """
+        Ensure rendering a table with other decimals and label suffix
+        gives the table created with those options
+        """
+        columns = ['normal', 'nonnormal', 'likesmarmalade', 'bear']
+        kwargs = dict(columns=columns, categorical=['likesmarmalade'],
+                      groupby='bear', nonnormal=['nonnormal'], pval=True)
+        t1 = TableOne(self.data_sample, **kwargs)
+        for decimals, label_suffix in [(3, True),
+                                       ({'normal': 0,
+                                         'likesmarmalade': 2}, False)]:
+            t1.render(decimals=decimals, label_suffix=label_suffix)
+            t2 = TableOne(self.data_sample, decimals=decimals,
+                          label_suffix=label_suffix, **kwargs)
+            pd.testing.assert_frame_equal(t1.tableone, t2.tableone)
+            pd.testing.assert_frame_equal(t1.cont_describe, t2.cont_describe)
+            pd.testing.assert_frame_equal(t1.cat_describe, t2.cat_describe)
+
+    @with_setup(setup, teardown)
+    def test_updated_table_matches_table_from_all_rows(self):
+        """
+        Ensure adding rows with update gives the table of all the rows
+        """
+        df = self.data_sample
+        columns = ['normal', 'nonnormal', 'likesmarmalade', 'bear']
+        kwargs = dict(columns=columns, categorical=['likesmarmalade'],
+                      groupby='bear', nonnormal=['nonnormal'], pval=True)
+        t1 = TableOne(df, remarks=False, **kwargs)
+        t2 = TableOne.from_chunks([df.iloc[:4000]], quantiles='exact',
+                                  **kwargs)
+        t2.update(df.iloc[4000:7000])
+        t2.update(df.iloc[7000:])
+
+        pd.testing.assert_frame_equal(t1.tableone, t2.tableone)
+        pd.testing.assert_frame_equal(t1.diagnostics, t2.diagnostics)
+
+        t3 = TableOne.from_chunks([df.iloc[:4000]], **kwargs)
+        assert_raises(InputError, lambda: t3.diagnostics)
+        t3.update(df.iloc[4000:])
+        pd.testing.assert_frame_equal(t1.cont_describe, t3.cont_describe,
+                                      check_dtype=False)
+        assert_equal(t3._significance_table.loc['nonnormal', 'Test'],
+                     'Not tested')
+        assert_raises(InputError, t1.update, df)
+
+    @with_setup(setup, teardown)
+    def test_chunked_mean_matches_mean_of_all_rows(self):
+        """
+        Ensure the mean of a table read in chunks is rounded as the mean of
+        all the rows, also when it lies halfway between two decimals
+        """
+        rs = np.random.RandomState(0)
+        df = pd.DataFrame({'k': rs.randint(0, 12, 40).astype(float)})
+        # a mean of 5.85
+        df.loc[0, 'k'] += 234 - df['k'].sum()
+        t1 = TableOne(df, columns=['k'], remarks=False)
+        t2 = TableOne.from_chunks([df.iloc[i:i + 7] for i in range(0, 40, 7)],
+                                  columns=['k'])
+        pd.testing.assert_frame_equal(t1.tableone, t2.tableone)
+        assert_equal(t1._cont_stats[0]['mean'][0],
+                     t2._cont_stats[0]['mean'][0])
+
+    @with_setup(setup, teardown)
+    def test_chunk_with_only_null_categorical_values(self):
+        """
+        Ensure a chunk in which a categorical column has no values is
+        counted, whether it is read by from_chunks or by update
+        """
+        df = pd.DataFrame({'x': ['a', 'b', np.nan, np.nan],
+                           'g': ['u', 'v', 'u', 'v']})
+        kwargs = dict(columns=['x'], categorical=['x'], groupby='g')
+        t1 = TableOne(df, **kwargs)
+        t2 = TableOne.from_chunks([df.iloc[:2], df.iloc[2:]], **kwargs)
+        pd.testing.assert_frame_equal(t1.tableone, t2.tableone)
+
+        for first, second in [(df.iloc[:2], df.iloc[2:]),
+                              (df.iloc[2:], df.iloc[:2])]:
+            t3 = TableOne.from_chunks([first], **kwargs)
+            t3.update(second)
+            pd.testing.assert_frame_equal(t1.tableone, t3.tableone)
+
+    @with_setup(setup, teardown)
+    def test_parallel_column_blocks_match_serial_table(self):
+        """
+        Ensure summarising blocks of columns in worker processes gives the
+        same table as a single process
+        """
+        columns = ['normal', 'nonnormal', 'height', 'likeshoney',
+                   'likesmarmalade', 'fictional', 'bear']
+        kwargs = dict(columns=columns, groupby='bear', pval=True,
+                      categorical=['likeshoney', 'likesmarmalade',
+                                   'fictional'], nonnormal=['nonnormal'])
+        t1 = TableOne(self.data_sample, **kwargs)
+        t2 = TableOne(self.data_sample, n_jobs=2, **kwargs)
+
+        pd.testing.assert_frame_equal(t1.tableone, t2.tableone)
+        pd.testing.assert_frame_equal(t1.cont_describe, t2.cont_describe)
+        pd.testing.assert_frame_equal(t1.cat_describe, t2.cat_describe)
+
     @with_setup(setup, teardown)
     def test_limit_of_categorical_data_pn(self):
         """
@@ -318,6 +1029,30 @@ class TestTableOne(object):
         # test other categories are not affected if limit > num categories
         assert table.tableone.loc['death', :].shape[0] == 2
 
+    @with_setup(setup, teardown)
+    def test_limit_with_order_of_categorical_data(self):
+        """
+        Ensure the limit keeps the most frequent levels, or the first levels
+        of the order when one is given
+        """
+        columns = ['normal', 'bear', 'likesmarmalade']
+        categorical = ['bear', 'likesmarmalade']
+
+        table = TableOne(self.data_sample, columns=columns,
+                         categorical=categorical, limit={'bear': 2})
+        values = table.tableone.loc['bear', :].index.get_level_values(0)
+        assert list(values) == ['Winnie', 'Blossom']
+
+        table = TableOne(self.data_sample, columns=columns,
+                         categorical=categorical, limit={'bear': 2},
+                         order={'bear': ['Baloo'], 'likesmarmalade': [1]})
+        values = table.tableone.loc['bear', :].index.get_level_values(0)
+        assert list(values) == ['Baloo', 'Blossom']
+        values = table.tableone.loc['likesmarmalade', :].index.get_level_values(0)
+        assert list(values) == ['1', '0']
+        assert list(table.tableone.index.get_level_values(0)) == [
+            'n', 'normal', 'bear', 'bear', 'likesmarmalade', 'likesmarmalade']
+
     def test_input_data_not_modified(self):
         """
         Check the input dataframe is not modified by the package
@@ -484,6 +1219,28 @@ class TestTableOne(object):
             # i+1 because we skip the first row, 'n'
             assert tableone_rows[i+1] == c
 
+    @with_setup(setup, teardown)
+    def test_sort_by_pvalue_keeps_level_order(self):
+        """
+        Ensure sorting by P-Value keeps the levels of each categorical
+        variable in order
+        """
+        for seed in [0, 1, 4]:
+            rs = np.random.RandomState(seed)
+            n = 300
+            df = pd.DataFrame({'age': rs.normal(60, 10, n),
+                               'small': rs.randint(1, 7, n),
+                               'sex': rs.choice(['F', 'M'], n),
+                               'group': rs.choice(['a', 'b'], n)})
+            table = TableOne(df, columns=['age', 'small', 'sex', 'group'],
+                             categorical=['small', 'sex'], groupby='group',
+                             pval=True, sort='P-Value')
+            rows = table.tableone.index.values
+            assert_equal([level for v, level in rows if v == 'small'],
+                         ['1', '2', '3', '4', '5', '6'])
+            assert_equal([level for v, level in rows if v == 'sex'],
+                         ['F', 'M'])
+
     @with_setup(setup, teardown)
     def test_string_data_as_continuous_error(self):
         """